@@ -2,40 +2,56 @@
 智慧图书馆 (E-Librarian) - Flask 后端主程序
 轻量级图书馆管理系统 - React Version
 """
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, abort, jsonify
 from flask_cors import CORS
-from models import init_db, insert_sample_books
+from models import init_db, insert_sample_books, migrate_db
 from routes.auth import auth_bp
-from routes.books import books_bp
+from routes.books import books_bp, notify_stock_changed
 from routes.admin import admin_bp
+import change_log
+import db_pool
+import metrics
+import compression
+import json_provider
+import fuzzy_index
+import scheduler
+import static_assets
 import os
 
-# 创建 Flask 应用（配置静态文件目录为 React build）
-app = Flask(__name__, static_folder='../frontend/dist', static_url_path='')
+# 创建 Flask 应用（前端静态文件由 serve_react 按启动时生成的清单提供，不使用 Flask 默认的静态路由）
+app = Flask(__name__, static_folder=None)
+json_provider.init_app(app)  # orjson 编码（未安装时使用标准库）
 CORS(app)  # 启用跨域支持
+db_pool.init_app(app)  # 请求结束时归还未关闭的数据库连接
+metrics.init_app(app)  # 请求 / SQL 耗时统计（/api/metrics）
+change_log.init_app(app)  # 处理 API 请求前同步其他进程的图书变更
+compression.init_app(app)  # 较大的 JSON 响应按 Accept-Encoding 压缩
 
 # 注册蓝图（路由模块）
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(books_bp, url_prefix='/api/books')
 app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
-# Serve React App
+# Serve React App（React build 的文件清单在启动时生成一次，请求时不再访问文件系统）
+FRONTEND_DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../frontend/dist')
+frontend_assets = static_assets.build_manifest(FRONTEND_DIST)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve_react(path):
     """Serve React frontend"""
-    dist_dir = os.path.join(os.path.dirname(__file__), '../frontend/dist')
-
     # If it's an API request, let it fall through
     if path.startswith('api/'):
         return jsonify({'error': 'Not found'}), 404
 
-    # If file exists, serve it
-    if path and os.path.exists(os.path.join(dist_dir, path)):
-        return send_from_directory(dist_dir, path)
-
-    # Otherwise serve index.html (for client-side routing)
-    return send_from_directory(dist_dir, 'index.html')
+    # If file exists, serve it; otherwise serve index.html (for client-side routing)
+    # 旧版本的构建产物（assets/ 下已不存在的文件）返回 404，避免把 index.html 当作脚本缓存
+    asset = frontend_assets.get(path)
+    if asset is None and not path.startswith('assets/'):
+        asset = frontend_assets.get('index.html')
+    if asset is None:
+        abort(404)
+    return static_assets.serve(asset)
 
 @app.route('/api')
 def api_index():
@@ -75,12 +91,8 @@ def internal_error(error):
         'message': '服务器内部错误'
     }), 500
 
-def initialize_system():
-    """初始化系统"""
-    print("=" * 50)
-    print("智慧图书馆 (E-Librarian) 系统启动中...")
-    print("=" * 50)
-
+def prepare_database():
+    """首次启动时建库并导入示例数据，否则执行未应用的迁移（每次部署只需执行一次）"""
     # 检查数据库是否存在
     db_exists = os.path.exists('library.db')
 
@@ -95,6 +107,27 @@ def initialize_system():
         print("  密码: admin123")
     else:
         print("\n数据库已存在，跳过初始化")
+        if migrate_db():
+            print("✓ 数据库结构已升级")
+
+def start_background_tasks():
+    """启动本进程的后台任务（多进程部署时每个 worker 各自调用）"""
+    # 记下变更日志的当前位置，之后按日志同步其他进程的写入
+    change_log.sync()
+    change_log.start_poller()
+    # 后台构建模糊检索索引
+    fuzzy_index.warm_up()
+    # 后台定时任务：逾期检测、清理超期未领取的预约
+    scheduler.start(on_stock_released=notify_stock_changed)
+
+def initialize_system():
+    """初始化系统"""
+    print("=" * 50)
+    print("智慧图书馆 (E-Librarian) 系统启动中...")
+    print("=" * 50)
+
+    prepare_database()
+    start_background_tasks()
 
     print("\n" + "=" * 50)
     print("系统启动成功!")
@@ -105,12 +138,12 @@ def initialize_system():
     print("=" * 50 + "\n")
 
 if __name__ == '__main__':
-    # 初始化系统
+    # 开发服务器（单进程）；生产环境使用 python serve.py
     initialize_system()
 
-    # 启动 Flask 服务器
+    # 启动 Flask 服务器；FLASK_DEBUG=1 时开启调试与自动重载
     app.run(
         host='0.0.0.0',  # 允许外部访问
         port=5000,
-        debug=True  # 开发模式，自动重载
-    )
\ No newline at end of file
+        debug=os.environ.get('FLASK_DEBUG') == '1'
+    )
@@ -0,0 +1,248 @@
+"""
+搜索框前缀联想索引（内存）
+把书名（及书名中每个词开头的后缀）、作者、ISBN、拼音规范化为小写键，
+按键排序存放在平行数组中：键列表 + array('I') 图书ID + array('B') 字段类型。
+前缀查询用二分定位连续区间，按借阅热度（book_borrow_stats）排序返回。
+索引在首次使用时构建，之后按变更日志（change_log.py）标记的图书增量刷新（见 lazy_index.py）。
+"""
+import heapq
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from lazy_index import LazyIndex, load_rows, with_cursor
+
+# 字段类型（array('B') 中保存编号）
+FIELDS = ('title', 'author', 'isbn', 'pinyin')
+TITLE, AUTHOR, ISBN, PINYIN = range(len(FIELDS))
+
+WORD_PATTERN = re.compile(r'[0-9a-z]+|[一-鿿]+')
+# 书名中最多为前几个词建立后缀键
+MAX_TITLE_WORDS = 6
+# 单次查询最多扫描的区间长度（前缀很短时区间可能很大）
+MAX_SCAN = 5000
+# 借阅热度刷新间隔（秒）
+POPULARITY_TTL = 60
+
+
+def normalize(text):
+    return ' '.join(WORD_PATTERN.findall(text.lower())) if text else ''
+
+
+def compact(text):
+    return re.sub(r'[\s-]', '', text).lower()
+
+
+def book_keys(title, author, isbn, pinyin):
+    """生成一本书的 (键, 字段) 集合"""
+    keys = set()
+    title = normalize(title)
+    if title:
+        keys.add((title, TITLE))
+        for match in list(WORD_PATTERN.finditer(title))[1:MAX_TITLE_WORDS]:
+            keys.add((title[match.start():], TITLE))
+    author = normalize(author)
+    if author:
+        keys.add((author, AUTHOR))
+    if isbn:
+        keys.add((compact(isbn), ISBN))
+    for part in (pinyin or '').split():
+        keys.add((part, PINYIN))
+    return keys
+
+
+class PrefixIndex:
+    """排序键数组上的前缀检索"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []                 # 已排序的键
+        self._book_ids = array('I')     # 与 _keys 平行
+        self._fields = array('B')       # 与 _keys 平行
+        self._books = {}                # book_id -> (书名, 作者, ISBN, 拼音)
+        self._popularity = {}           # book_id -> 借阅次数
+        self._popularity_loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._books)
+
+    def load(self, rows):
+        """从 (id, title, author, isbn, pinyin) 行全量构建"""
+        entries = []
+        books = {}
+        for book_id, title, author, isbn, pinyin in rows:
+            books[book_id] = (title, author, isbn, pinyin)
+            entries.extend((key, book_id, field) for key, field in book_keys(title, author, isbn, pinyin))
+        entries.sort()
+        with self._lock:
+            self._keys = [entry[0] for entry in entries]
+            self._book_ids = array('I', (entry[1] for entry in entries))
+            self._fields = array('B', (entry[2] for entry in entries))
+            self._books = books
+
+    def add(self, book_id, title, author, isbn, pinyin):
+        """加入或替换一本书"""
+        with self._lock:
+            self._remove(book_id)
+            for key, field in book_keys(title, author, isbn, pinyin):
+                position = bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._book_ids.insert(position, book_id)
+                self._fields.insert(position, field)
+            self._books[book_id] = (title, author, isbn, pinyin)
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        for key, _ in book_keys(*book):
+            position = bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._book_ids[position] == book_id:
+                    del self._keys[position]
+                    del self._book_ids[position]
+                    del self._fields[position]
+                    break
+                position += 1
+
+    def set_popularity(self, popularity):
+        self._popularity = popularity
+        self._popularity_loaded_at = time.monotonic()
+
+    def popularity_expired(self):
+        return time.monotonic() - self._popularity_loaded_at > POPULARITY_TTL
+
+    def search(self, prefix, limit=8):
+        """返回 [(book_id, 字段, 借阅次数)]，借阅次数高的在前，其次是书名较短的"""
+        # 规范化后的前缀；含连字符的 ISBN 另按去掉分隔符的形式查找
+        prefixes = {normalize(prefix), compact(prefix or '')} - {''}
+        if not prefixes:
+            return []
+
+        matched = {}
+        with self._lock:
+            for key in prefixes:
+                start = bisect_left(self._keys, key)
+                end = min(bisect_left(self._keys, key + '\uffff'), start + MAX_SCAN)
+                for position in range(start, end):
+                    book_id = self._book_ids[position]
+                    field = self._fields[position]
+                    # 同一本书多个键命中时保留优先级最高的字段（书名 > 作者 > ISBN > 拼音）
+                    if field < matched.get(book_id, len(FIELDS)):
+                        matched[book_id] = field
+
+            popularity = self._popularity
+            ranked = heapq.nsmallest(
+                limit,
+                matched,
+                key=lambda book_id: (-popularity.get(book_id, 0), len(self._books[book_id][0]), book_id)
+            )
+        return [(book_id, FIELDS[matched[book_id]], popularity.get(book_id, 0)) for book_id in ranked]
+
+    def book(self, book_id):
+        return self._books.get(book_id)
+
+    def memory_usage(self):
+        """估算索引占用的字节数（容器本身 + 其中的字符串 / 元组）"""
+        with self._lock:
+            size = sys.getsizeof(self._keys) + sum(sys.getsizeof(key) for key in self._keys)
+            size += sys.getsizeof(self._book_ids) + sys.getsizeof(self._fields)
+            size += sys.getsizeof(self._books)
+            for book in self._books.values():
+                size += sys.getsizeof(book) + sum(sys.getsizeof(value) for value in book if value)
+            size += sys.getsizeof(self._popularity)
+            return size
+
+    def stats(self):
+        memory = self.memory_usage()
+        return {
+            'books': len(self._books),
+            'keys': len(self._keys),
+            'memory_bytes': memory,
+            'bytes_per_book': round(memory / len(self._books), 1) if self._books else 0,
+        }
+
+
+_popularity_lock = threading.Lock()
+
+
+def load_popularity(cursor):
+    cursor.execute('SELECT book_id, borrow_count FROM book_borrow_stats WHERE borrow_count > 0')
+    return {row['book_id']: row['borrow_count'] for row in cursor.fetchall()}
+
+
+def build_index(cursor):
+    """从 books 表全量构建索引"""
+    index = PrefixIndex()
+    cursor.execute('SELECT id, title, author, isbn, pinyin FROM books')
+    index.load(tuple(row) for row in cursor.fetchall())
+    index.set_popularity(load_popularity(cursor))
+    return index
+
+
+def refresh_books(index, cursor, book_ids):
+    rows = load_rows(cursor, 'id, title, author, isbn, pinyin', book_ids)
+    for book_id in book_ids:
+        row = rows.get(book_id)
+        if row is None:
+            index.remove(book_id)
+        else:
+            index.add(*row)
+
+
+_lazy = LazyIndex(build_index, refresh_books)
+
+
+def get_index(cursor=None):
+    """获取索引，首次调用（或失效后）时构建；借阅热度过期时由一个请求负责刷新"""
+    index = _lazy.get(cursor)
+    if index.popularity_expired() and _popularity_lock.acquire(blocking=False):
+        try:
+            index.set_popularity(with_cursor(cursor, load_popularity))
+        finally:
+            _popularity_lock.release()
+    return index
+
+
+def suggest(prefix, limit=8):
+    """返回联想结果字典列表"""
+    index = get_index()
+    suggestions = []
+    for book_id, field, borrow_count in index.search(prefix, limit):
+        book = index.book(book_id)
+        if book is None:
+            continue
+        title, author, isbn, _ = book
+        suggestions.append({
+            'book_id': book_id,
+            'title': title,
+            'author': author,
+            'isbn': isbn,
+            'matched': field,
+            'borrow_count': borrow_count,
+        })
+    return suggestions
+
+
+def on_books_changed(*book_ids):
+    """书名 / 作者 / ISBN 变化或图书删除后调用（不等待正在进行的构建）"""
+    _lazy.mark_dirty(book_ids)
+
+
+def invalidate():
+    """批量导入等大范围修改后丢弃索引，下次使用时重建"""
+    _lazy.invalidate()
+
+
+def stats():
+    index = _lazy.current
+    if index is None:
+        return {'loaded': False}
+    return dict(index.stats(), loaded=True)
@@ -0,0 +1,202 @@
+"""
+图书可借数量实时推送（Server-Sent Events）
+变更日志（change_log.py）同步到图书行变化时，把变化的图书库存发布到进程内消息代理，
+代理为每个订阅的客户端维护一个有界队列，SSE 连接从队列取事件写给客户端：
+- 事件ID 取该书在变更日志中的序号（book_changes.seq），所有进程一致，客户端重连到任一 worker 都能续传；
+- 客户端处理过慢导致队列写满时断开该连接，客户端重连后按 Last-Event-ID 补发；
+- 最近 HISTORY_SIZE 条事件保存在内存中用于补发，更早的（或本进程启动前的）从变更日志补发各书的当前库存；
+  变更日志已清理到该位置之后，或事件ID 未知（数据库被替换）时发送 reset 事件，客户端应重新拉取完整列表；
+- 空闲时每 HEARTBEAT_INTERVAL 秒发送注释行作为心跳，保持代理和负载均衡的连接。
+
+多进程部署时每个进程都推送全部写入（包括其他进程与命令行脚本），延迟不超过 CHANGE_POLL_INTERVAL 秒。
+"""
+import json
+import os
+import queue
+import threading
+from collections import deque
+
+from lazy_index import load_rows
+from models import get_db
+
+QUEUE_SIZE = 256
+HISTORY_SIZE = 1024
+HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT_INTERVAL', 15))
+MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', 100))
+# 客户端重连等待时间（毫秒）
+RETRY_MS = 3000
+STOCK_COLUMNS = 'id, available_quantity, total_quantity'
+
+
+class Subscription:
+    def __init__(self, book_ids=None):
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.book_ids = book_ids
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.book_ids is None or event[1] == 'reset' or event[2].get('book_id') in self.book_ids
+
+
+class Broker:
+    """进程内发布 / 订阅，事件为 (事件ID, 事件类型, 数据)，事件ID 递增"""
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        # 已处理到的事件ID，及内存历史完整覆盖的起点（此ID之后的事件都在历史中）
+        self.position = 0
+        self._history_floor = 0
+        self.published = 0
+        self.dropped_subscribers = 0
+        self.log_replays = 0
+
+    def publish(self, event_id, event_type, data):
+        with self._lock:
+            event = (event_id, event_type, data)
+            if len(self._history) == self._history.maxlen:
+                self._history_floor = self._history[0][0]
+            self._history.append(event)
+            self.position = max(self.position, event_id)
+            self.published += 1
+            for subscription in list(self._subscribers):
+                if not subscription.wants(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except queue.Full:
+                    # 慢客户端：断开，由客户端带 Last-Event-ID 重连补发
+                    subscription.overflowed = True
+                    self._subscribers.discard(subscription)
+                    self.dropped_subscribers += 1
+
+    def restart(self, event_id):
+        """从 event_id 开始（启动或换库时取变更日志的当前位置），丢弃内存历史"""
+        with self._lock:
+            self._history.clear()
+            self.position = self._history_floor = event_id
+
+    def subscribe(self, last_event_id=None, book_ids=None):
+        """
+        返回 (订阅, 需补发的事件列表, reset 事件ID)；无需 reset 时 reset 事件ID 为 None。
+        reset 事件以当前最新事件ID发出，客户端之后重连会从该位置继续。
+        补发与注册在同一把锁内完成，期间发布的事件不会遗漏或重复。
+        """
+        subscription = Subscription(book_ids)
+        with self._lock:
+            if len(self._subscribers) >= MAX_SUBSCRIBERS:
+                return None, [], None
+            replay, reset_id = [], None
+            if last_event_id is not None:
+                if last_event_id > self.position:
+                    # 数据库被替换等：事件ID 不是本库产生的
+                    reset_id = self.position
+                elif last_event_id >= self._history_floor:
+                    replay = [e for e in self._history if e[0] > last_event_id and subscription.wants(e)]
+                else:
+                    events = replay_from_log(last_event_id, self.position, book_ids)
+                    if events is None:
+                        reset_id = self.position
+                    else:
+                        self.log_replays += 1
+                        replay = events
+            self._subscribers.add(subscription)
+        return subscription, replay, reset_id
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'published': self.published,
+                'dropped_subscribers': self.dropped_subscribers,
+                'history': len(self._history),
+                'position': self.position,
+                'log_replays': self.log_replays,
+            }
+
+
+broker = Broker()
+
+
+def format_event(event_id, event_type, data):
+    payload = json.dumps(data, ensure_ascii=False)
+    return f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n'
+
+
+def _availability(book_id, row):
+    if row is None:
+        return {'book_id': book_id, 'deleted': True}
+    return {
+        'book_id': book_id,
+        'available_quantity': row['available_quantity'],
+        'total_quantity': row['total_quantity'],
+    }
+
+
+def publish_availability(cursor, latest_seqs):
+    """
+    变更日志同步时调用（使用同步所用的连接）：latest_seqs 为 {图书ID: 该书最新的变更序号}，
+    读取图书当前库存，以变更序号为事件ID 按序发布；图书已删除时发布 deleted
+    """
+    if not latest_seqs:
+        return
+    rows = load_rows(cursor, STOCK_COLUMNS, list(latest_seqs))
+    for book_id, seq in sorted(latest_seqs.items(), key=lambda item: item[1]):
+        broker.publish(seq, 'availability', _availability(book_id, rows.get(book_id)))
+
+
+def replay_from_log(after, until, book_ids=None):
+    """
+    内存历史之外的补发：按变更日志中 (after, until] 之间变化过的图书，发送各书的当前库存。
+    日志已清理到 after 之后，或涉及的图书超过 HISTORY_SIZE 本时返回 None（改发 reset）
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT MIN(seq) FROM book_changes')
+        oldest = cursor.fetchone()[0]
+        if oldest is None or oldest > after + 1:
+            return None
+        cursor.execute(
+            '''SELECT book_id, MAX(seq) FROM book_changes
+               WHERE seq > ? AND seq <= ?
+               GROUP BY book_id
+               ORDER BY MAX(seq)
+               LIMIT ?''',
+            (after, until, HISTORY_SIZE + 1)
+        )
+        changes = cursor.fetchall()
+        if len(changes) > HISTORY_SIZE:
+            return None
+        changes = [(row[0], row[1]) for row in changes if book_ids is None or row[0] in book_ids]
+        rows = load_rows(cursor, STOCK_COLUMNS, [book_id for book_id, _ in changes])
+    finally:
+        conn.close()
+    return [(seq, 'availability', _availability(book_id, rows.get(book_id))) for book_id, seq in changes]
+
+
+def stream(subscription, replay, reset_id=None):
+    """SSE 响应生成器；客户端断开时 GeneratorExit 触发退订"""
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        if reset_id is not None:
+            yield format_event(reset_id, 'reset', {})
+        for event in replay:
+            yield format_event(*event)
+        while True:
+            try:
+                # 队列写满被断开后，发完已排队的事件即结束
+                event = subscription.queue.get(block=not subscription.overflowed, timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                if subscription.overflowed:
+                    break
+                yield ': heartbeat\n\n'
+                continue
+            yield format_event(*event)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,512 @@
+"""
+接口压测与性能基线
+在指定规模的合成数据库（datagen.py 生成）上，用多个线程按权重混合调用真实接口（默认通过 Flask test client
+在进程内调用；--url 时请求本地运行的服务），统计每个接口的 p50 / p95 / p99 延迟与吞吐量，
+以 JSON 输出；指定基线文件时逐个接口比较 p95，变慢超过容忍比例的接口视为性能回退，退出码为 1。
+
+    python benchmark.py seed --db bench.db --books 20000 --users 2000 --years 3
+    python benchmark.py run --books 5000 --threads 8 --duration 30 --output result.json
+    python benchmark.py run --db bench.db --baseline baseline.json
+    python benchmark.py run --db library.db --url http://127.0.0.1:5000
+    python benchmark.py serialize --db bench.db --rows 200
+    python benchmark.py fuzzy --books 500000 --target-ms 10
+
+serialize 子命令单独比较列表响应的序列化方式（原 dict + 标准库 jsonify、orjson、SQLite 行直出 JSON）
+以及 gzip / zstd 压缩的耗时与字节数。
+fuzzy 子命令在指定规模的书名上（默认按 datagen 的词频合成，--db 时读取该库）构建模糊检索索引，
+用带拼写错误的查询测 search() 的延迟分位数；p95 超过 --target-ms 时退出码为 1。
+
+同样的参数与 --seed 得到同样的数据和请求序列；延迟本身受机器负载影响，
+比较基线时应在同一台机器上运行，并用 --min-delta-ms 忽略亚毫秒级的抖动。
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib import error as urlerror
+from urllib import request as urlrequest
+
+import compression
+import fuzzy_index
+import models
+from datagen import (CATEGORIES, CHINESE_WORDS, ENGLISH_LAST, ENGLISH_WORDS, TITLE_WORDS, generate,
+                     make_author, make_title, zipf_cum_weights)
+from json_provider import FastJSONProvider, RawJSON, orjson, row_json, table_columns
+
+# (名称, 权重)；名称对应 Workload 中的同名方法
+DEFAULT_MIX = {
+    'search': 30,
+    'list': 10,
+    'detail': 15,
+    'suggest': 15,
+    'categories': 5,
+    'top_rated': 5,
+    'my_borrowings': 10,
+    'borrow_return': 8,
+    'renew': 2,
+}
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_MIN_DELTA_MS = 1.0
+DEFAULT_FUZZY_TARGET_MS = 10.0
+
+
+def seed_database(database, books=2000, users=500, years=2, loans_per_book=5, seed=42):
+    """用 datagen 生成合成数据库，返回各表写入的行数"""
+    return generate(database, books, users, books * loans_per_book, years, seed=seed, verbose=False)
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class TestClientTransport:
+    """进程内通过 Flask test client 调用接口"""
+
+    def __init__(self):
+        from app import app
+        self._app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTransport:
+    """通过 HTTP 请求运行中的服务"""
+
+    def __init__(self, base_url):
+        self._base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        req = urlrequest.Request(self._base_url + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+        try:
+            with urlrequest.urlopen(req, timeout=30) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urlerror.HTTPError as e:
+            return e.code, None
+
+
+class Workload:
+    """一个压测线程：按权重选择操作，记录 (操作名, 耗时秒, 状态码)"""
+
+    def __init__(self, transport, book_ids, user_ids, mix, rng):
+        self.transport = transport
+        self.book_ids = book_ids
+        self.user_ids = user_ids
+        self.rng = rng
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.samples = []
+
+    def timed(self, name, method, path, body=None):
+        started = time.perf_counter()
+        status, payload = self.transport.request(method, path, body)
+        self.samples.append((name, time.perf_counter() - started, status))
+        return status, payload
+
+    def term(self):
+        return self.rng.choice(TITLE_WORDS)
+
+    def search(self):
+        self.timed('search', 'GET', f'/api/books/search?query={urlrequest.quote(self.term())}&limit=20')
+
+    def list(self):
+        self.timed('list', 'GET', '/api/books/list?limit=20')
+
+    def detail(self):
+        self.timed('detail', 'GET', f'/api/books/detail/{self.rng.choice(self.book_ids)}')
+
+    def suggest(self):
+        prefix = self.term()[:self.rng.randint(1, 3)]
+        self.timed('suggest', 'GET', f'/api/books/suggest?prefix={urlrequest.quote(prefix)}')
+
+    def categories(self):
+        self.timed('categories', 'GET', '/api/books/categories')
+
+    def top_rated(self):
+        category = urlrequest.quote(self.rng.choice(CATEGORIES))
+        self.timed('top_rated', 'GET', f'/api/books/top-rated?category={category}')
+
+    def my_borrowings(self):
+        self.timed('my_borrowings', 'GET', f'/api/books/my-borrowings/{self.rng.choice(self.user_ids)}?limit=20')
+
+    def borrow_return(self):
+        body = {'user_id': self.rng.choice(self.user_ids), 'book_id': self.rng.choice(self.book_ids)}
+        status, payload = self.timed('borrow', 'POST', '/api/books/borrow', body)
+        if status == 201 and payload:
+            self.timed('return', 'POST', '/api/books/return', {'record_id': payload['record_id']})
+
+    def renew(self):
+        body = {'user_id': self.rng.choice(self.user_ids), 'book_id': self.rng.choice(self.book_ids)}
+        status, payload = self.transport.request('POST', '/api/books/borrow', body)
+        if status == 201 and payload:
+            self.timed('renew', 'POST', '/api/books/renew', {'record_id': payload['record_id']})
+            self.transport.request('POST', '/api/books/return', {'record_id': payload['record_id']})
+
+    def run(self, deadline, max_requests):
+        while time.monotonic() < deadline and len(self.samples) < max_requests:
+            getattr(self, self.rng.choices(self.names, self.weights)[0])()
+
+
+def summarize(samples, elapsed):
+    by_endpoint = {}
+    for name, seconds, status in samples:
+        by_endpoint.setdefault(name, []).append((seconds, status))
+
+    def describe(entries):
+        latencies = sorted(seconds * 1000 for seconds, _ in entries)
+        statuses = {}
+        for _, status in entries:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            'count': len(entries),
+            'errors': sum(count for status, count in statuses.items() if int(status) >= 500),
+            'statuses': statuses,
+            'throughput_rps': round(len(entries) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(latencies[-1], 3),
+        }
+
+    endpoints = {name: describe(entries) for name, entries in sorted(by_endpoint.items())}
+    overall = describe([(seconds, status) for _, seconds, status in samples]) if samples else None
+    return endpoints, overall
+
+
+def compare(result, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """逐个接口比较 p95，返回回退列表"""
+    regressions = []
+    for name, current in result['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        delta = current['p95_ms'] - previous['p95_ms']
+        if delta > min_delta_ms and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append({
+                'endpoint': name,
+                'baseline_p95_ms': previous['p95_ms'],
+                'p95_ms': current['p95_ms'],
+                'change': f"{delta / previous['p95_ms']:+.0%}" if previous['p95_ms'] else None,
+            })
+    return regressions
+
+
+def load_ids(database):
+    conn = models.get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM books')
+        book_ids = [row['id'] for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM users WHERE role = 'reader'")
+        user_ids = [row['id'] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    if not book_ids or not user_ids:
+        raise SystemExit(f'{database} 中没有图书或读者，请先运行 python benchmark.py seed')
+    return book_ids, user_ids
+
+
+def run_benchmark(database, threads=4, duration=10.0, max_requests=None, mix=None, url=None, seed=42):
+    models.DATABASE = database
+    book_ids, user_ids = load_ids(database)
+    transport = HttpTransport(url) if url else TestClientTransport()
+    mix = mix or DEFAULT_MIX
+    per_thread = max_requests // threads if max_requests else float('inf')
+
+    workloads = [
+        Workload(transport, book_ids, user_ids, mix, random.Random(seed + i))
+        for i in range(threads)
+    ]
+    started = time.monotonic()
+    deadline = started + duration
+    workers = [threading.Thread(target=w.run, args=(deadline, per_thread)) for w in workloads]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    samples = [sample for workload in workloads for sample in workload.samples]
+    endpoints, overall = summarize(samples, elapsed)
+    return {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'database': os.path.abspath(database),
+            'transport': url or 'test_client',
+            'threads': threads,
+            'duration_s': round(elapsed, 3),
+            'seed': seed,
+            'mix': mix,
+            'books': len(book_ids),
+            'users': len(user_ids),
+        },
+        'endpoints': endpoints,
+        'overall': overall,
+    }
+
+
+def _time_ms(function, repeat):
+    """多次调用取中位数耗时（毫秒）与最后一次的结果"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return round(percentile(timings, 0.50), 4), result
+
+
+def run_serialization(database, rows=200, repeat=200):
+    """列表接口的序列化方式与压缩对比（查询 + 编码，不含 HTTP 开销）"""
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+
+    app = Flask(__name__)
+    stdlib = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    fast_stdlib = FastJSONProvider(app)
+    fast_stdlib.use_orjson = False
+    conn = models.get_db()
+    cursor = conn.cursor()
+    payloads = {
+        'books': ('SELECT * FROM books ORDER BY created_at DESC, id DESC LIMIT ?',
+                  f"SELECT {row_json(table_columns(cursor, 'books'))} FROM books "
+                  'ORDER BY created_at DESC, id DESC LIMIT ?'),
+        'feedback': ('SELECT f.*, u.username FROM feedback f JOIN users u ON f.user_id = u.id '
+                     'ORDER BY f.created_at DESC, f.id DESC LIMIT ?',
+                     f"SELECT {row_json(table_columns(cursor, 'feedback', 'f') + ['u.username'])} "
+                     'FROM feedback f JOIN users u ON f.user_id = u.id '
+                     'ORDER BY f.created_at DESC, f.id DESC LIMIT ?'),
+    }
+
+    def dict_rows(dumps, sql):
+        def encode():
+            cursor.execute(sql, (rows,))
+            items = [dict(row) for row in cursor.fetchall()]
+            return dumps({'success': True, 'items': items, 'next_cursor': None})
+        return encode
+
+    def raw_rows(provider, sql):
+        def encode():
+            cursor.execute(sql, (rows,))
+            items = RawJSON('[' + ','.join(row[0] for row in cursor.fetchall()) + ']')
+            return provider.encode({'success': True, 'items': items, 'next_cursor': None})
+        return encode
+
+    results = {}
+    try:
+        for name, (dict_sql, json_sql) in payloads.items():
+            paths = {
+                'stdlib_jsonify': dict_rows(lambda obj: stdlib.dumps(obj, separators=(',', ':')).encode(), dict_sql),
+                'fast_stdlib': dict_rows(fast_stdlib.encode, dict_sql),
+            }
+            if orjson is not None:
+                paths['orjson'] = dict_rows(fast.encode, dict_sql)
+            paths['row_json'] = raw_rows(fast, json_sql)
+
+            encoded = {}
+            for path, encode in paths.items():
+                elapsed, body = _time_ms(encode, repeat)
+                encoded[path] = body
+                results.setdefault(name, {})[path] = {'ms': elapsed, 'bytes': len(body)}
+            # 压缩对比：以原方式的输出为输入
+            body = encoded['stdlib_jsonify']
+            encoders = {f'gzip{compression.GZIP_LEVEL}': lambda: gzip.compress(body, compression.GZIP_LEVEL, mtime=0)}
+            if compression.zstandard is not None:
+                encoders[f'zstd{compression.ZSTD_LEVEL}'] = lambda: compression._zstd_compress(body)
+            for encoding, compress in encoders.items():
+                elapsed, compressed = _time_ms(compress, repeat)
+                results[name][encoding] = {'ms': elapsed, 'bytes': len(compressed)}
+            results[name]['rows'] = len(json.loads(body)['items'])
+    finally:
+        conn.close()
+    return results
+
+
+def misspell(rng, word):
+    """随机删除、替换、交换或插入一个字符（单字和短词保持不变）"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    edit = rng.randrange(4)
+    if edit == 0:
+        return word[:i] + word[i + 1:]
+    if edit == 1:
+        return word[:i] + rng.choice('aeioustnr') + word[i + 1:]
+    if edit == 2:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice('aeioustnr') + word[i:]
+
+
+def fuzzy_queries(rng, count):
+    """书名词 / 作者姓组成的 1~3 词查询，每个词都可能带拼写错误"""
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.2:
+            words = [rng.choice(ENGLISH_LAST)]
+        elif rng.random() < 0.2:
+            words = rng.sample(CHINESE_WORDS, rng.randint(1, 2))
+        else:
+            words = rng.sample(ENGLISH_WORDS, rng.randint(1, 3))
+        queries.append(' '.join(misspell(rng, word.lower()) for word in words))
+    return queries
+
+
+def run_fuzzy(database=None, books=500000, queries=200, limit=20, seed=42):
+    """模糊检索索引的构建耗时与单次查询延迟（不含 HTTP 与数据库访问）"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    if database:
+        models.DATABASE = database
+        conn = models.get_db()
+        try:
+            index = fuzzy_index.build_index(conn.cursor())
+        finally:
+            conn.close()
+    else:
+        index = fuzzy_index.FuzzyIndex()
+        word_weights = (zipf_cum_weights(len(CHINESE_WORDS), 1.1), zipf_cum_weights(len(ENGLISH_WORDS), 1.1))
+        for book_id in range(1, books + 1):
+            index.add(book_id, make_title(rng, word_weights), make_author(rng))
+    build_s = time.perf_counter() - started
+
+    samples = fuzzy_queries(rng, queries)
+    for query in samples[:10]:
+        index.search(query, limit)      # 预热
+    latencies = []
+    for query in samples:
+        elapsed, _ = _time_ms(lambda: index.search(query, limit), 1)
+        latencies.append(elapsed)
+    latencies.sort()
+    return {
+        'config': {'database': os.path.abspath(database) if database else None, 'queries': queries,
+                   'limit': limit, 'seed': seed},
+        'index': index.stats(),
+        'build_s': round(build_s, 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(latencies[-1], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='接口压测与性能基线比较')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_seed_arguments(command):
+        command.add_argument('--books', type=int, default=2000)
+        command.add_argument('--users', type=int, default=500)
+        command.add_argument('--years', type=int, default=2, help='借阅记录覆盖的年数')
+        command.add_argument('--loans-per-book', type=int, default=5)
+        command.add_argument('--seed', type=int, default=42)
+
+    seed_command = commands.add_parser('seed', help='生成合成数据库')
+    seed_command.add_argument('--db', required=True, help='数据库文件（不存在时创建）')
+    add_seed_arguments(seed_command)
+
+    run_command = commands.add_parser('run', help='运行压测')
+    run_command.add_argument('--db', help='已有数据库；不指定时在临时目录生成')
+    add_seed_arguments(run_command)
+    run_command.add_argument('--url', help='请求运行中的服务（如 http://127.0.0.1:5000），--db 须为该服务使用的数据库')
+    run_command.add_argument('--threads', type=int, default=4)
+    run_command.add_argument('--duration', type=float, default=10.0, help='运行秒数')
+    run_command.add_argument('--requests', type=int, help='总请求数上限')
+    run_command.add_argument('--mix', help='操作权重 JSON，如 {"search": 5, "borrow_return": 1}')
+    run_command.add_argument('--output', help='结果 JSON 写入的文件（默认输出到标准输出）')
+    run_command.add_argument('--save-baseline', help='把本次结果保存为基线文件')
+    run_command.add_argument('--baseline', help='与基线文件比较 p95 延迟')
+    run_command.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许变慢的比例')
+    run_command.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS)
+
+    serialize_command = commands.add_parser('serialize', help='比较列表响应的序列化与压缩方式')
+    serialize_command.add_argument('--db', required=True, help='已有数据库')
+    serialize_command.add_argument('--rows', type=int, default=200, help='每个响应的行数')
+    serialize_command.add_argument('--repeat', type=int, default=200, help='每种方式的重复次数（取中位数）')
+
+    fuzzy_command = commands.add_parser('fuzzy', help='模糊检索索引的查询延迟')
+    fuzzy_command.add_argument('--db', help='从已有数据库构建索引；不指定时按 --books 合成书名')
+    fuzzy_command.add_argument('--books', type=int, default=500000)
+    fuzzy_command.add_argument('--queries', type=int, default=200)
+    fuzzy_command.add_argument('--limit', type=int, default=20)
+    fuzzy_command.add_argument('--seed', type=int, default=42)
+    fuzzy_command.add_argument('--target-ms', type=float, default=DEFAULT_FUZZY_TARGET_MS,
+                               help='p95 延迟上限（毫秒），超过时退出码为 1')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        counts = seed_database(args.db, args.books, args.users, args.years, args.loans_per_book, args.seed)
+        print(json.dumps(counts, ensure_ascii=False))
+        return 0
+
+    if args.command == 'serialize':
+        models.DATABASE = args.db
+        print(json.dumps(run_serialization(args.db, args.rows, args.repeat), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == 'fuzzy':
+        result = run_fuzzy(args.db, args.books, args.queries, args.limit, args.seed)
+        result['target_p95_ms'] = args.target_ms
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        if result['p95_ms'] > args.target_ms:
+            print(f"模糊检索 p95 {result['p95_ms']}ms 超过目标 {args.target_ms}ms", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.url and not args.db:
+        parser.error('--url 需要同时指定服务使用的 --db')
+    mix = json.loads(args.mix) if args.mix else None
+    if mix and set(mix) - set(DEFAULT_MIX):
+        parser.error(f'未知操作: {", ".join(sorted(set(mix) - set(DEFAULT_MIX)))}')
+    database = args.db
+    if database is None:
+        database = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    if not os.path.exists(database):
+        seed_database(database, args.books, args.users, args.years, args.loans_per_book, args.seed)
+
+    result = run_benchmark(database, args.threads, args.duration, args.requests, mix, args.url, args.seed)
+    status = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        result['regressions'] = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        status = 1 if result['regressions'] else 0
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    for regression in result.get('regressions', []):
+        print(f"性能回退: {regression['endpoint']} p95 {regression['baseline_p95_ms']}ms -> "
+              f"{regression['p95_ms']}ms", file=sys.stderr)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+图书批量导入（CSV / JSONL）
+逐行流式读取文件，不把整个文件读入内存；按 ISBN 校验去重后，
+以 executemany 分块 upsert，每块一个事务。
+导入时 books 表上的触发器照常执行，全文索引、数据版本、统计与变更日志随每块事务提交，
+正在运行的服务（包括命令行导入时）经由变更日志同步缓存与检索索引。
+
+更新已有图书时，新的总数量少于已借出及预约保留的册数的行作为错误行拒绝；
+总数量增加时新增的册数先保留给排队的预约读者。
+
+命令行：python bulk_import.py books.csv [--format csv|jsonl] [--chunk-size 5000]
+"""
+import csv
+import io
+import json
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+import holds
+from pinyin_search import pinyin_key
+from transactions import run_immediate
+
+CHUNK_SIZE = 5000
+# 响应中最多列出的错误行数（错误总数照常统计）
+MAX_REPORTED_ERRORS = 100
+
+UPSERT_SQL = '''
+    INSERT INTO books (title, author, isbn, category, publisher, total_quantity, available_quantity,
+                       description, pinyin)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (isbn) DO UPDATE SET
+        title = excluded.title,
+        author = excluded.author,
+        category = excluded.category,
+        publisher = excluded.publisher,
+        available_quantity = books.available_quantity + excluded.total_quantity - books.total_quantity,
+        total_quantity = excluded.total_quantity,
+        description = excluded.description,
+        pinyin = excluded.pinyin
+    WHERE excluded.total_quantity >= books.total_quantity - books.available_quantity
+'''
+
+ISBN_PATTERN = re.compile(r'^(\d{9}[\dX]|\d{13})$')
+
+
+def iter_records(stream, fmt):
+    """从二进制流逐行产出 (行号, 字典)；无法解析的行产出 (行号, 错误信息字符串)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f'JSON 解析失败: {e}'
+                continue
+            if not isinstance(record, dict):
+                yield line_no, '每行必须是 JSON 对象'
+                continue
+            yield line_no, record
+    else:
+        raise ValueError(f'不支持的导入格式: {fmt}')
+
+
+def normalize_isbn(value):
+    if value is None:
+        return None
+    isbn = re.sub(r'[\s-]', '', str(value)).upper()
+    return isbn or None
+
+
+def validate(record):
+    """校验并规范化一行，返回插入参数元组；不合法时抛出 ValueError"""
+    def text(field):
+        value = record.get(field)
+        if value is None:
+            return None
+        # JSONL 中的数字、布尔、对象等不是合法的文本字段
+        if not isinstance(value, str):
+            raise ValueError(f'{field} 必须是字符串: {value!r}')
+        return value.strip() or None
+
+    title = text('title')
+    if not title:
+        raise ValueError('图书标题不能为空')
+
+    isbn = normalize_isbn(record.get('isbn'))
+    if isbn and not ISBN_PATTERN.match(isbn):
+        raise ValueError(f'ISBN 格式不正确: {record.get("isbn")}')
+
+    quantity = record.get('total_quantity')
+    if quantity in (None, ''):
+        quantity = 1
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f'total_quantity 必须是整数: {quantity}')
+    if quantity < 0:
+        raise ValueError('total_quantity 不能为负数')
+
+    author = text('author')
+    return (title, author, isbn, text('category'), text('publisher'),
+            quantity, quantity, text('description') or '', pinyin_key(title, author))
+
+
+def _in_use_by_isbn(cursor, isbns):
+    """已有图书 ISBN -> 已借出及预约保留的册数"""
+    in_use = {}
+    # 分批查询（受 SQLite 变量个数限制）
+    for i in range(0, len(isbns), 500):
+        part = isbns[i:i + 500]
+        placeholders = ', '.join('?' for _ in part)
+        cursor.execute(
+            f'SELECT isbn, total_quantity - available_quantity FROM books WHERE isbn IN ({placeholders})',
+            part
+        )
+        in_use.update((row[0], row[1]) for row in cursor.fetchall())
+    return in_use
+
+
+def _assign_added_copies(cursor, isbns):
+    """增加总数量后，有人排队的图书把可借的册数依次保留给队首读者"""
+    for i in range(0, len(isbns), 500):
+        part = isbns[i:i + 500]
+        placeholders = ', '.join('?' for _ in part)
+        cursor.execute(
+            f'''SELECT b.id, b.available_quantity FROM books b
+                WHERE b.isbn IN ({placeholders}) AND b.available_quantity > 0
+                  AND EXISTS (SELECT 1 FROM holds h WHERE h.book_id = b.id AND h.status = 'waiting')''',
+            part
+        )
+        for book_id, available in cursor.fetchall():
+            for _ in range(available):
+                if holds.assign_next(cursor, book_id, datetime.now()) is None:
+                    break
+                cursor.execute(
+                    'UPDATE books SET available_quantity = available_quantity - 1 WHERE id = ?',
+                    (book_id,)
+                )
+
+
+def import_books(conn, stream, fmt, chunk_size=CHUNK_SIZE):
+    """流式导入图书，返回导入报告"""
+    started = time.perf_counter()
+    report = {
+        'rows': 0,
+        'inserted': 0,
+        'updated': 0,
+        'duplicates': 0,
+        'error_count': 0,
+        'errors': [],
+    }
+    seen_isbns = set()
+    chunk = []
+
+    def add_error(line_no, message):
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line_no, 'message': message})
+
+    def flush(rows):
+        def work(cursor):
+            in_use = _in_use_by_isbn(cursor, [row[2] for _, row in rows if row[2]])
+            accepted, rejected = [], []
+            for line_no, row in rows:
+                if row[2] in in_use and row[5] < in_use[row[2]]:
+                    rejected.append((line_no, in_use[row[2]]))
+                else:
+                    accepted.append(row)
+            cursor.executemany(UPSERT_SQL, accepted)
+            updated = [row[2] for row in accepted if row[2] in in_use]
+            _assign_added_copies(cursor, updated)
+            return len(updated), len(accepted) - len(updated), rejected
+        updated, inserted, rejected = run_immediate(conn, work)
+        report['updated'] += updated
+        report['inserted'] += inserted
+        for line_no, count in rejected:
+            add_error(line_no, f'total_quantity 不能少于已借出及预约保留的 {count} 本')
+
+    for line_no, record in iter_records(stream, fmt):
+        report['rows'] += 1
+        if isinstance(record, str):
+            add_error(line_no, record)
+            continue
+        try:
+            row = validate(record)
+        except ValueError as e:
+            add_error(line_no, str(e))
+            continue
+
+        isbn = row[2]
+        if isbn:
+            if isbn in seen_isbns:
+                report['duplicates'] += 1
+                continue
+            seen_isbns.add(isbn)
+
+        chunk.append((line_no, row))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed, 1) if elapsed > 0 else None
+    return report
+
+
+def detect_format(filename, explicit=None):
+    """根据显式参数或文件扩展名确定导入格式"""
+    if explicit:
+        return explicit.lower()
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from models import get_db
+
+    parser = argparse.ArgumentParser(description='批量导入图书（CSV / JSONL）')
+    parser.add_argument('path', help='导入文件路径')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='文件格式，默认按扩展名判断')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每个事务写入的行数')
+    args = parser.parse_args()
+
+    conn = get_db()
+    try:
+        with open(args.path, 'rb') as f:
+            result = import_books(conn, f, detect_format(args.path, args.format), args.chunk_size)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"导入失败: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,119 @@
+"""
+进程内图书目录缓存
+有界 LRU + TTL 缓存图书详情与分类列表，按变更日志（change_log.py，含其他进程的写入）
+精确失效；提供命中 / 未命中 / 淘汰计数。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+BOOK_CACHE_SIZE = int(os.environ.get('BOOK_CACHE_SIZE', 2048))
+CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+
+class LRUCache:
+    """线程安全的 LRU + TTL 缓存"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效递增；加载期间发生过失效的结果不写入缓存，避免旧数据回填
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """返回 (是否命中, 值)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """命中则返回缓存值，否则调用 loader() 加载；loader 返回 None 时不缓存"""
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self._generation
+        value = loader()
+        if value is not None:
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# 图书详情（按图书ID）与分类列表
+book_cache = LRUCache(BOOK_CACHE_SIZE, CACHE_TTL)
+category_cache = LRUCache(1, CACHE_TTL)
+
+CATEGORIES_KEY = 'categories'
+
+
+def invalidate_books(*book_ids):
+    """图书行变化（库存、信息、删除）后调用"""
+    book_cache.invalidate(*book_ids)
+
+
+def invalidate_categories():
+    """图书新增、删除或分类修改后调用"""
+    category_cache.clear()
+
+
+def clear_catalog():
+    """批量导入等大范围修改后清空全部目录缓存"""
+    book_cache.clear()
+    category_cache.clear()
+
+
+def cache_stats():
+    return {
+        'books': book_cache.stats(),
+        'categories': category_cache.stats(),
+    }
@@ -0,0 +1,159 @@
+"""
+图书变更日志：在多个进程之间同步进程内的目录结构
+books 表上的触发器把每次新增 / 修改 / 删除写入 book_changes（自增序号 seq、图书ID、是否涉及书目字段）。
+每个进程记录已处理到的 seq，处理 API 请求前（以及后台线程每 CHANGE_POLL_INTERVAL 秒）读取之后的记录，
+对变化的图书统一更新进程内结构：失效图书详情 / 分类缓存，在模糊检索、联想索引与分面位图中标记这些图书
+（下次使用索引时刷新，同步本身不等待索引构建），并推送库存变化。
+其他 worker、命令行导入等进程外的写入都经由这里生效；本进程的写入提交后调用 sync() 立即生效。
+
+一次待处理的记录超过 MAX_INCREMENTAL 条，或本进程位置之后的记录已被清理（长时间未同步、数据库被替换）时，
+不逐条处理，直接丢弃全部进程内结构，下次使用时重建。
+日志只保留最近 CHANGE_LOG_RETENTION 条（定时任务清理）。
+"""
+import os
+import threading
+
+from flask import request
+
+import autocomplete
+import availability
+import facets
+import fuzzy_index
+from cache import clear_catalog, invalidate_books, invalidate_categories
+from models import get_db
+from transactions import run_immediate
+
+CHANGE_POLL_INTERVAL = float(os.environ.get('CHANGE_POLL_INTERVAL', 1))
+CHANGE_LOG_RETENTION = int(os.environ.get('CHANGE_LOG_RETENTION', 100000))
+PRUNE_INTERVAL = float(os.environ.get('CHANGE_LOG_PRUNE_INTERVAL', 3600))
+MAX_INCREMENTAL = 1000
+
+_lock = threading.Lock()
+_last_seq = None        # 本进程已处理到的序号；None 表示尚未同步（下次同步时全部重建）
+_poller = None
+_stop = threading.Event()
+_counters = {'syncs': 0, 'changes': 0, 'full_resets': 0}
+
+
+def _apply(cursor, changes):
+    # 每本书最新的变更序号，作为推送事件ID
+    latest_seqs = {change['book_id']: change['seq'] for change in changes}
+    book_ids = list(latest_seqs)
+    catalog_ids = sorted({change['book_id'] for change in changes if change['catalog']})
+
+    # 各进程内索引只记下变化的图书，下次使用时刷新；不等待正在进行的索引构建
+    invalidate_books(*book_ids)
+    facets.on_books_changed(*book_ids)
+    if catalog_ids:
+        invalidate_categories()
+        fuzzy_index.on_books_changed(*catalog_ids)
+        autocomplete.on_books_changed(*catalog_ids)
+    availability.publish_availability(cursor, latest_seqs)
+
+
+def _reset_all(initial, regressed, latest):
+    clear_catalog()
+    fuzzy_index.invalidate()
+    autocomplete.invalidate()
+    facets.invalidate()
+    if initial or regressed:
+        # 启动或数据库被替换：推送从日志当前位置重新开始
+        availability.broker.restart(latest)
+    if not initial:
+        # 无法逐条推送时通知推送客户端重新拉取
+        availability.broker.publish(latest, 'reset', {})
+
+
+def sync():
+    """读取本进程上次同步之后的变更并应用，返回处理的变更数"""
+    # 先借出连接再加锁：持锁期间只在这一个连接上读取，并做内存中的标记与推送
+    conn = get_db()
+    try:
+        with _lock:
+            return _sync(conn.cursor())
+    finally:
+        conn.close()
+
+
+def _sync(cursor):
+    global _last_seq
+    cursor.execute('SELECT MIN(seq), MAX(seq) FROM book_changes')
+    oldest, latest = cursor.fetchone()
+    latest = latest or 0
+    _counters['syncs'] += 1
+    if latest == _last_seq:
+        return 0
+
+    initial = _last_seq is None
+    regressed = not initial and latest < _last_seq
+    if (
+        initial
+        or regressed
+        or (oldest is not None and oldest > _last_seq + 1)
+        or latest - _last_seq > MAX_INCREMENTAL
+    ):
+        _reset_all(initial, regressed, latest)
+        _counters['full_resets'] += 1
+        _last_seq = latest
+        return 0
+
+    cursor.execute(
+        'SELECT seq, book_id, catalog FROM book_changes WHERE seq > ? AND seq <= ? ORDER BY seq',
+        (_last_seq, latest)
+    )
+    changes = cursor.fetchall()
+    if changes:
+        _apply(cursor, changes)
+    _last_seq = latest
+    _counters['changes'] += len(changes)
+    return len(changes)
+
+
+def reset():
+    """切换数据库（测试）后调用：下次同步时丢弃全部进程内结构"""
+    global _last_seq
+    with _lock:
+        _last_seq = None
+
+
+def prune(conn):
+    """只保留最近 CHANGE_LOG_RETENTION 条记录，返回删除的条数"""
+    def work(cursor):
+        cursor.execute(
+            'DELETE FROM book_changes WHERE seq <= (SELECT MAX(seq) FROM book_changes) - ?',
+            (CHANGE_LOG_RETENTION,)
+        )
+        return cursor.rowcount
+    return run_immediate(conn, work)
+
+
+def _poll():
+    while True:
+        try:
+            sync()
+        except Exception as e:
+            print(f"变更日志同步失败: {e}")
+        _stop.wait(CHANGE_POLL_INTERVAL)
+
+
+def start_poller():
+    """后台定期同步：没有请求时也能推送其他进程的库存变化"""
+    global _poller
+    if _poller is not None:
+        return
+    _poller = threading.Thread(target=_poll, name='change-log-poller', daemon=True)
+    _poller.start()
+
+
+def _before_request():
+    if request.path.startswith('/api/'):
+        sync()
+
+
+def init_app(app):
+    """处理 API 请求前先同步其他进程的变更，保证读到的缓存 / 索引不早于请求开始时的数据库"""
+    app.before_request(_before_request)
+
+
+def stats():
+    return dict(_counters, last_seq=_last_seq, poller=_poller is not None and _poller.is_alive())
@@ -0,0 +1,383 @@
+"""
+大规模合成数据生成
+向空数据库写入图书、读者、多年借阅记录（含续借、逾期、评分）和反馈，用于在接近生产的
+数据量上发现性能问题。同一组参数和 --seed 生成完全相同的数据。
+
+- 图书借阅热度、书名用词频率服从 Zipf 分布（第 k 名的权重为 1/k^s），热门书的借阅量以馆藏上限封顶、
+  超出部分分给其余图书；读者活跃度、作者作品数用 Zipf–Mandelbrot 形式 1/(k+q)^s（q 为总数的
+  ZIPF_OFFSET），头部不会集中到个别读者或作者；
+- 每本书按馆藏册数模拟借还时间线：读者到达时取最早空出的一册，无空闲册时顺延到归还之后，
+  任一时刻在借数不超过 total_quantity；模拟结束时仍未归还的记录决定 available_quantity，
+  已过应还日期的由 overdue.mark_overdue 标记为逾期并生成提醒；
+- 写入前删除这几张表上的索引与触发器，按表顺序批量插入后再重建索引，
+  并重算触发器维护的派生数据（全文索引、借阅统计、数据版本号；评分聚合在生成时直接计算）。
+
+    python datagen.py --db library.db --books 1000000 --users 200000 --loans 10000000 --years 5
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import models
+from fts import rebuild_fts
+from models import hash_password
+from overdue import mark_overdue
+from pinyin_search import pinyin_key
+from stats import rebuild_statistics
+
+# 写入期间删除索引与触发器的表
+BULK_TABLES = ('books', 'users', 'borrowing_records', 'feedback')
+BATCH_SIZE = 50000
+
+LOAN_DAYS = 30
+RENEW_RATE = 0.15
+LATE_RATE = 0.08
+RATING_RATE = 0.3
+REPLY_RATE = 0.6
+SPECIAL_READERS = (('elderly', 0.03), ('disabled', 0.01))
+# 平均借阅天数（含续借与逾期）；馆藏册数按预计借阅量估算时的目标利用率，以及单本书的册数上限
+MEAN_LOAN_DAYS = 18
+TARGET_UTILIZATION = 0.6
+MAX_COPIES = 20
+# 读者活跃度、作者作品数分布的偏移量 q（占总数的比例）
+ZIPF_OFFSET = 0.01
+
+CATEGORIES = ['编程', '计算机科学', '算法', '人工智能', '数据库', '软件工程', '网络', '操作系统',
+              '文学', '历史', '哲学', '经济', '艺术', '科普', '小说', '传记', '教育', '医学']
+PUBLISHERS = ['人民邮电出版社', '机械工业出版社', '清华大学出版社', '电子工业出版社', '人民文学出版社',
+              '中华书局', '商务印书馆', '上海译文出版社', '北京大学出版社', '中信出版社',
+              "O'Reilly Media", 'Springer', 'Addison-Wesley', 'Penguin Books', 'MIT Press']
+# 按常见程度排列，Zipf 抽样时排在前面的词出现得更多
+CHINESE_WORDS = ['中国', '数据', '系统', '历史', '设计', '世界', '算法', '原理', '实践', '现代', '分析',
+                 '网络', '科学', '文学', '经济', '思想', '计算机', '艺术', '哲学', '管理', '社会',
+                 '编程', '智能', '结构', '方法', '理论', '文化', '人生', '故事', '简史', '导论', '教程',
+                 '城市', '自然', '心理', '工程', '语言', '时间', '未来', '传统']
+ENGLISH_WORDS = ['The', 'Introduction', 'Systems', 'Data', 'Design', 'Learning', 'Modern', 'History',
+                 'Python', 'Principles', 'Practice', 'Advanced', 'Distributed', 'Patterns', 'Java',
+                 'Theory', 'Networks', 'Art', 'Guide', 'Mind', 'World', 'Science', 'Structures',
+                 'Analysis', 'Programming', 'Economics', 'Philosophy', 'Language', 'Machine', 'City']
+TITLE_WORDS = CHINESE_WORDS + ENGLISH_WORDS
+CHINESE_SURNAMES = '王李张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗梁宋郑谢韩唐冯于董萧程曹袁邓许傅沈曾彭吕'
+CHINESE_GIVEN = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉兰红建文辉力晓云峰宇浩'
+ENGLISH_FIRST = ['John', 'Mary', 'James', 'Linda', 'Robert', 'Susan', 'Michael', 'Karen', 'David',
+                 'Grace', 'Donald', 'Alice', 'Thomas', 'Emma', 'Daniel', 'Laura']
+ENGLISH_LAST = ['Smith', 'Johnson', 'Brown', 'Knuth', 'Lee', 'Miller', 'Davis', 'Wilson', 'Moore',
+                'Taylor', 'Clark', 'Hall', 'Young', 'King', 'Wright', 'Hopper']
+FEEDBACK_TYPES = ('suggestion', 'complaint', 'request')
+FEEDBACK_TEMPLATES = {
+    'suggestion': ['希望增加{category}类图书', '建议延长借阅期限', '自助借还机可以再多几台'],
+    'complaint': ['《{title}》一直借不到', '检索结果不够准确', '还书后库存没有及时更新'],
+    'request': ['请采购《{title}》的新版', '希望开放{category}专区', '能否提供电子版借阅'],
+}
+
+
+def zipf_cum_weights(n, exponent, offset=0.0):
+    """前 n 名的 Zipf（offset > 0 时为 Zipf–Mandelbrot）累积权重，供 random.choices(cum_weights=...) 使用"""
+    total, weights = 0.0, []
+    for rank in range(1, n + 1):
+        total += 1.0 / (rank + offset) ** exponent
+        weights.append(total)
+    return weights
+
+
+def allocate_loans(count, total, exponent, cap):
+    """
+    按 Zipf 权重把 total 次借阅分给 count 本书（按热度降序），单本不超过 cap：
+    超出部分按权重分给其余图书。权重降序，某一本未超出时其后的也都不会超出。
+    """
+    weights = [1.0 / rank ** exponent for rank in range(1, count + 1)]
+    remaining_weight = sum(weights)
+    remaining, allocation = float(total), []
+    for weight in weights:
+        share = remaining * weight / remaining_weight if remaining_weight else 0.0
+        share = min(share, cap)
+        allocation.append(share)
+        remaining -= share
+        remaining_weight -= weight
+    return allocation
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def make_title(rng, word_weights):
+    count = rng.randint(2, 4)
+    if rng.random() < 0.6:
+        words = rng.choices(CHINESE_WORDS, cum_weights=word_weights[0], k=count)
+        return ''.join(dict.fromkeys(words))
+    words = rng.choices(ENGLISH_WORDS, cum_weights=word_weights[1], k=count)
+    return ' '.join(dict.fromkeys(words))
+
+
+def make_author(rng):
+    if rng.random() < 0.7:
+        return rng.choice(CHINESE_SURNAMES) + ''.join(rng.choices(CHINESE_GIVEN, k=rng.randint(1, 2)))
+    return f'{rng.choice(ENGLISH_FIRST)} {chr(rng.randint(65, 90))}. {rng.choice(ENGLISH_LAST)}'
+
+
+def simulate_loans(rng, book_id, copies, loan_count, start, end, user_ids, user_weights, active_pairs):
+    """
+    模拟一本书在 [start, end] 内的借还，返回 (借阅记录行列表, 在借册数, 评分和, 评分数)。
+    free_at 堆保存每一册空出的时间；到达时间按泊松过程生成，无空闲册时借阅顺延到最早归还的时间。
+    """
+    day = 86400.0
+    quality = rng.uniform(2.5, 4.8)
+    free_at = [start] * copies
+    records, active, rating_sum, rating_count = [], 0, 0, 0
+    arrival = start
+    mean_gap = (end - start) / max(loan_count, 1)
+    users = rng.choices(user_ids, cum_weights=user_weights, k=loan_count)
+
+    for user_id in users:
+        arrival += rng.expovariate(1.0 / mean_gap)
+        borrowed = max(arrival, heapq.heappop(free_at))
+        if borrowed >= end:
+            heapq.heappush(free_at, borrowed)
+            break
+        due = borrowed + LOAN_DAYS * day
+        if rng.random() < RENEW_RATE:
+            due += LOAN_DAYS * day
+        if rng.random() < LATE_RATE:
+            returned = due + rng.uniform(1, 20) * day
+        else:
+            returned = borrowed + rng.uniform(1, (due - borrowed) / day) * day
+
+        if returned > end:
+            # 模拟结束时仍在借：同一读者不能同时借两本同样的书
+            if (user_id, book_id) in active_pairs:
+                heapq.heappush(free_at, borrowed)
+                continue
+            active_pairs.add((user_id, book_id))
+            active += 1
+            heapq.heappush(free_at, float('inf'))
+            records.append((user_id, book_id, iso(borrowed), iso(due), None, 'borrowed', None))
+            continue
+
+        heapq.heappush(free_at, returned)
+        rating = None
+        if rng.random() < RATING_RATE:
+            rating = min(5, max(1, round(rng.gauss(quality, 1.0))))
+            rating_sum += rating
+            rating_count += 1
+        records.append((user_id, book_id, iso(borrowed), iso(due), iso(returned), 'returned', rating))
+    return records, active, rating_sum, rating_count
+
+
+class BulkLoad:
+    """删除批量写入表上的索引与触发器，结束（包括出错）时按原定义重建"""
+
+    def __init__(self, conn, tables=BULK_TABLES):
+        self.conn = conn
+        self.tables = tables
+        self.saved = []
+
+    def __enter__(self):
+        placeholders = ', '.join('?' for _ in self.tables)
+        self.saved = self.conn.execute(
+            f'''SELECT type, name, sql FROM sqlite_master
+                WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({placeholders})''',
+            self.tables
+        ).fetchall()
+        for object_type, name, _ in self.saved:
+            self.conn.execute(f'DROP {object_type.upper()} IF EXISTS {name}')
+        self.conn.commit()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.rollback()
+        # 先建索引：触发器重建后不再有批量写入
+        for object_type, _, sql in sorted(self.saved, key=lambda item: item[0] != 'index'):
+            self.conn.execute(sql)
+        self.conn.commit()
+        return False
+
+
+def generate(database, books=10000, users=2000, loans=100000, years=3, feedback=None,
+             exponent=1.1, seed=42, verbose=True):
+    """向空数据库写入合成数据，返回各表写入的行数"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    def progress(message):
+        if verbose:
+            print(f"[{time.perf_counter() - started:7.1f}s] {message}")
+
+    models.DATABASE = database
+    models.init_db()
+    conn = sqlite3.connect(database)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -200000')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    if conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]:
+        conn.close()
+        raise ValueError(f'{database} 中已有图书，请使用空数据库')
+
+    end = time.time()
+    start = end - years * 365 * 86400
+    counts = {}
+    try:
+        with BulkLoad(conn):
+            # 读者：活跃度排名随机打乱
+            password = hash_password('reader123')
+            first_user = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+            user_rows = []
+            for i in range(users):
+                reader_type, roll = None, rng.random()
+                for candidate, rate in SPECIAL_READERS:
+                    if roll < rate:
+                        reader_type = candidate
+                        break
+                    roll -= rate
+                user_rows.append((
+                    f'reader{i:07d}', password, f'reader{i:07d}@example.com', f'1{i:010d}',
+                    'reader', reader_type, iso(start - rng.uniform(0, 365 * 86400)),
+                ))
+            conn.executemany(
+                '''INSERT INTO users (username, password, email, phone, role, special_reader_type, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                user_rows
+            )
+            conn.commit()
+            counts['users'] = users
+            user_ids = list(range(first_user, first_user + users))
+            rng.shuffle(user_ids)
+            user_weights = zipf_cum_weights(users, exponent, users * ZIPF_OFFSET)
+            progress(f"读者 {users} 人")
+
+            # 作者作品数、书名用词、借阅热度
+            authors = [make_author(rng) for _ in range(max(1, books // 3))]
+            author_weights = zipf_cum_weights(len(authors), exponent, len(authors) * ZIPF_OFFSET)
+            word_weights = (zipf_cum_weights(len(CHINESE_WORDS), exponent),
+                            zipf_cum_weights(len(ENGLISH_WORDS), exponent))
+            span_days = (end - start) / 86400
+            per_copy = span_days / MEAN_LOAN_DAYS * TARGET_UTILIZATION
+            popularity = allocate_loans(books, loans, exponent, MAX_COPIES * per_copy)
+            rng.shuffle(popularity)
+
+            # 书名由有限词表组合而成、作者也会重复，拼音按文本缓存后拼接（与 pinyin_key(书名, 作者) 相同）
+            text_pinyin = lru_cache(maxsize=None)(pinyin_key)
+
+            def book_pinyin(title, author):
+                return ' '.join(filter(None, (text_pinyin(title), text_pinyin(author)))) or None
+
+            active_pairs = set()
+            book_rows, loan_rows = [], []
+            counts['borrowing_records'] = counts['active_loans'] = 0
+
+            def flush():
+                conn.executemany(
+                    '''INSERT INTO books (id, title, author, isbn, category, publisher, total_quantity,
+                                          available_quantity, description, pinyin, rating_sum, rating_count,
+                                          created_at)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    book_rows
+                )
+                conn.executemany(
+                    '''INSERT INTO borrowing_records (user_id, book_id, borrow_date, due_date, return_date,
+                                                      status, rating)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                    loan_rows
+                )
+                conn.commit()
+                book_rows.clear()
+                loan_rows.clear()
+
+            for book_id in range(1, books + 1):
+                expected = popularity[book_id - 1]
+                loan_count = int(expected) + (rng.random() < expected - int(expected))
+                # 热门书多备几册：按平均借期估算达到目标利用率所需的册数
+                copies = min(MAX_COPIES, math.ceil(loan_count / per_copy) + rng.randint(0, 2)) or 1
+                records, active, rating_sum, rating_count = simulate_loans(
+                    rng, book_id, copies, loan_count, start, end, user_ids, user_weights, active_pairs
+                )
+                title = make_title(rng, word_weights)
+                author = rng.choices(authors, cum_weights=author_weights)[0]
+                category = rng.choice(CATEGORIES)
+                book_rows.append((
+                    book_id, title, author, f'978{book_id:010d}', category, rng.choice(PUBLISHERS),
+                    copies, copies - active, f'{category} · {title}', book_pinyin(title, author),
+                    rating_sum, rating_count, iso(start - rng.uniform(0, 365 * 86400)),
+                ))
+                loan_rows.extend(records)
+                counts['borrowing_records'] += len(records)
+                counts['active_loans'] += active
+                if len(loan_rows) >= BATCH_SIZE or len(book_rows) >= BATCH_SIZE:
+                    flush()
+                    progress(f"图书 {book_id}/{books}，借阅记录 {counts['borrowing_records']}")
+            flush()
+            counts['books'] = books
+            progress(f"图书 {books} 本，借阅记录 {counts['borrowing_records']} 条")
+
+            feedback = users // 10 if feedback is None else feedback
+            feedback_rows = []
+            for _ in range(feedback):
+                feedback_type = rng.choice(FEEDBACK_TYPES)
+                content = rng.choice(FEEDBACK_TEMPLATES[feedback_type]).format(
+                    category=rng.choice(CATEGORIES), title=make_title(rng, word_weights)
+                )
+                replied = rng.random() < REPLY_RATE
+                feedback_rows.append((
+                    rng.choices(user_ids, cum_weights=user_weights)[0], feedback_type, content,
+                    'replied' if replied else 'pending', '感谢您的反馈，我们会尽快处理' if replied else None,
+                    iso(rng.uniform(start, end)),
+                ))
+            conn.executemany(
+                '''INSERT INTO feedback (user_id, type, content, status, admin_reply, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                feedback_rows
+            )
+            conn.commit()
+            counts['feedback'] = feedback
+            progress("写入完成，重建索引与触发器")
+
+        progress("索引重建完成，重算派生数据")
+        cursor = conn.cursor()
+        rebuild_fts(cursor)
+        rebuild_statistics(cursor)
+        cursor.execute("UPDATE data_versions SET version = version + 1")
+        conn.commit()
+    finally:
+        conn.close()
+
+    # 已过应还日期的在借记录：标记逾期并生成提醒（与定时任务相同的路径）
+    pool_conn = models.get_db()
+    try:
+        counts['overdue'] = mark_overdue(pool_conn)
+    finally:
+        pool_conn.close()
+    progress(f"完成：{counts}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成大规模合成图书馆数据')
+    parser.add_argument('--db', default=models.DATABASE, help='目标数据库（须不含图书）')
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--loans', type=int, default=100000, help='目标借阅记录数（馆藏不足时实际略少）')
+    parser.add_argument('--years', type=float, default=3, help='借阅记录覆盖的年数')
+    parser.add_argument('--feedback', type=int, help='反馈条数（默认读者数的 1/10）')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf 分布指数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--replace', action='store_true', help='目标数据库已存在时先删除')
+    args = parser.parse_args(argv)
+
+    if args.replace:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    try:
+        generate(args.db, args.books, args.users, args.loans, args.years, args.feedback, args.zipf, args.seed)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+SQLite 连接池
+按数据库文件维护有界连接池，借出的连接已统一设置 PRAGMA（WAL 等），
+调用方 close() 时连接归还连接池而不是真正关闭
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import g, has_app_context
+
+from metrics import connection_factory
+
+# 每个数据库文件最多保持的连接数
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# 连接池耗尽时等待空闲连接的秒数
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+# 空闲超过该秒数的连接在借出前先做一次健康检查
+HEALTH_CHECK_INTERVAL = 30
+
+# 每个连接建立后执行的 PRAGMA（WAL 模式下读不阻塞写）
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -20000),       # 负数表示 KiB，约 20MB 页缓存
+    ('mmap_size', 268435456),     # 256MB 内存映射
+    ('busy_timeout', 5000),       # 毫秒
+    ('temp_store', 'MEMORY'),
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """连接池耗尽且等待超时"""
+
+
+class PooledConnection:
+    """sqlite3.Connection 的轻量代理，close() 时把连接还给连接池"""
+
+    __slots__ = ('_pool', '_conn')
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def close(self):
+        """归还连接（重复调用无副作用）"""
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        self._pool.release(conn)
+
+
+class ConnectionPool:
+    """单个数据库文件的有界连接池"""
+
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=connection_factory())
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _healthy(conn, idle_since):
+        if time.monotonic() - idle_since < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """借出一个原始连接，池满时最多等待 timeout 秒"""
+        while True:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn, idle_since = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout('数据库连接池已耗尽，请稍后重试')
+
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        """归还连接，未提交的事务会被回滚"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    def close_all(self):
+        """关闭所有空闲连接，之后归还的连接也会被直接关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        return {
+            'database': self.database,
+            'size': self.size,
+            'created': self._created,
+            'idle': self._idle.qsize(),
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database):
+    """获取（必要时创建）数据库文件对应的连接池"""
+    path = os.path.abspath(database)
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path)
+    return pool
+
+
+def get_connection(database):
+    """从连接池借出连接；在 Flask 应用上下文中借出的连接会在上下文结束时自动归还"""
+    pool = get_pool(database)
+    conn = PooledConnection(pool, pool.acquire())
+    if has_app_context():
+        g.setdefault('_db_connections', []).append(conn)
+    return conn
+
+
+def close_pools():
+    """关闭所有连接池（测试或进程退出时使用）"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def _release_context_connections(exception=None):
+    for conn in g.pop('_db_connections', []):
+        conn.close()
+
+
+def init_app(app):
+    """在 Flask 应用上注册连接回收钩子"""
+    app.teardown_appcontext(_release_context_connections)
@@ -0,0 +1,52 @@
+"""
+ETag 条件请求
+响应的 ETag 由相关表的数据版本号（data_versions 表，由触发器在每次写入时递增）
+与请求参数组合而成。客户端带 If-None-Match 且数据未变化时，直接返回 304，
+不执行任何业务查询。
+"""
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+from models import get_db
+
+
+def get_data_versions(tables):
+    """读取指定表的数据版本号"""
+    conn = get_db()
+    cursor = conn.cursor()
+    placeholders = ', '.join('?' for _ in tables)
+    cursor.execute(f'SELECT name, version FROM data_versions WHERE name IN ({placeholders})', tables)
+    versions = {row['name']: row['version'] for row in cursor.fetchall()}
+    conn.close()
+    return [versions.get(table, 0) for table in tables]
+
+
+def make_etag(tables):
+    """根据表版本号和请求路径（含查询参数）生成强 ETag"""
+    versions = '-'.join(str(v) for v in get_data_versions(tables))
+    digest = hashlib.blake2b(request.full_path.encode(), digest_size=6).hexdigest()
+    return f'{versions}-{digest}'
+
+
+def conditional(*tables):
+    """为 GET 接口添加 ETag / If-None-Match 支持，数据版本取自 tables"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # 先读版本再查询：查询期间发生写入时 ETag 偏旧，只会导致下一次重新获取
+            etag = make_etag(tables)
+            # 弱比较：压缩后的响应带的是弱 ETag（见 compression.py）
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # 允许缓存但每次使用前必须校验
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
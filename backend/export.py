@@ -0,0 +1,129 @@
+"""
+数据流式导出（CSV / NDJSON）
+生成器从数据库游标分批读取并逐块输出，可选 gzip 压缩；
+不构造完整结果列表，导出任意行数时内存占用保持不变。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from models import get_db
+
+FETCH_SIZE = 1000
+
+# 数据集: (查询语句, 日期过滤列, 排序)
+DATASETS = {
+    'books': (
+        'SELECT * FROM books',
+        None,
+        'id',
+    ),
+    'borrowings': (
+        '''SELECT br.*, u.username, b.title, b.isbn
+           FROM borrowing_records br
+           LEFT JOIN users u ON br.user_id = u.id
+           LEFT JOIN books b ON br.book_id = b.id''',
+        'br.borrow_date',
+        'br.borrow_date, br.id',
+    ),
+    'feedback': (
+        '''SELECT f.*, u.username
+           FROM feedback f
+           LEFT JOIN users u ON f.user_id = u.id''',
+        'f.created_at',
+        'f.created_at, f.id',
+    ),
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def parse_date_bound(value, upper=False):
+    """解析日期过滤参数；只给日期时上界取次日零点（包含当天）"""
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = date.fromisoformat(value)
+            return (day + timedelta(days=1)).isoformat() if upper else day.isoformat()
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f'日期格式不正确: {value}')
+
+
+def build_query(dataset, date_from=None, date_to=None):
+    """生成导出查询，日期范围作用于数据集的日期列"""
+    if dataset not in DATASETS:
+        raise ValueError(f'不支持的导出数据: {dataset}')
+    sql, date_column, order = DATASETS[dataset]
+
+    conditions, params = [], []
+    lower = parse_date_bound(date_from)
+    upper = parse_date_bound(date_to, upper=True)
+    if (lower or upper) and not date_column:
+        raise ValueError('该数据不支持日期过滤')
+    if lower:
+        conditions.append(f'{date_column} >= ?')
+        params.append(lower)
+    if upper:
+        conditions.append(f'{date_column} < ?')
+        params.append(upper)
+
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    return f'{sql} ORDER BY {order}', params
+
+
+def _encode_rows(cursor, fmt):
+    """逐批把游标中的行编码为文本块"""
+    columns = [column[0] for column in cursor.description]
+    buffer = io.StringIO()
+
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+    else:
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield ''.join(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+            )
+
+
+def stream_export(sql, params, fmt, compress=False):
+    """
+    导出生成器，产出 bytes。
+    数据库连接在生成器内部借出并在结束（或客户端断开）时归还，
+    不依赖请求上下文——流式响应在视图函数返回后才开始迭代。
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        for text in _encode_rows(cursor, fmt):
+            data = text.encode('utf-8')
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+    finally:
+        conn.close()
@@ -0,0 +1,275 @@
+"""
+分面检索计数（内存位图）
+每个分类、出版社取值以及"可借"状态各对应一个位图（Python 整数，第 i 位表示图书ID i），
+检索时把关键词命中的图书转换为位图，与各筛选位图按位与后数 1 的个数即得计数，
+一次检索的全部分面计数只需若干次整数位运算，不对每个分面执行 GROUP BY。
+图书较少的取值（少于图书ID上限的 1/DENSE_RATIO）改存图书ID数组，内存随图书数而不是 取值数 × 最大ID 增长；
+关键词只命中少量图书时直接按命中的图书逐本计数，不与每个取值求交。
+
+分面计数采用"多选分面"口径：某一维度的计数应用其余维度的筛选条件，但不应用该维度自身。
+图书行变化后由变更日志（change_log.py，含其他进程与命令行脚本的修改）标记变化的图书ID，
+下次计数前只重新读取这些行（见 lazy_index.py）。
+"""
+import threading
+from array import array
+from collections import Counter
+
+from lazy_index import LazyIndex, load_rows
+
+# 响应中每个维度最多返回的取值数（按计数降序）
+MAX_FACET_VALUES = 20
+# 取值的图书数不少于 图书ID上限 / DENSE_RATIO 时使用位图（此时位图不大于 4 字节 / 本的ID数组）
+DENSE_RATIO = 32
+# 关键词命中的图书不超过该数量时逐本计数
+SMALL_MATCH = 2048
+
+CATEGORY, PUBLISHER, AVAILABLE = range(3)
+
+# int.bit_count() 需要 Python 3.10
+popcount = getattr(int, 'bit_count', None) or (lambda bitmap: bin(bitmap).count('1'))
+
+
+def to_bitmap(ids):
+    """图书ID可迭代对象 -> 位图整数"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for book_id in ids:
+        bits[book_id >> 3] |= 1 << (book_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    """分类 / 出版社 / 可借状态位图；取值 -> 位图整数或（图书较少时）图书ID数组"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._all = 0
+        self._available = 0
+        self._categories = {}       # 分类 -> 位图或 array('I')
+        self._publishers = {}       # 出版社 -> 位图或 array('I')
+        self._rows = {}             # book_id -> (分类, 出版社, 是否可借)
+
+    def load(self, rows):
+        """从 (id, category, publisher, available) 行全量构建"""
+        categories, publishers, available = {}, {}, []
+        for book_id, category, publisher, is_available in rows:
+            self._rows[book_id] = (category, publisher, bool(is_available))
+            if category:
+                categories.setdefault(category, []).append(book_id)
+            if publisher:
+                publishers.setdefault(publisher, []).append(book_id)
+            if is_available:
+                available.append(book_id)
+        self._all = to_bitmap(self._rows)
+        self._available = to_bitmap(available)
+        id_limit = max(self._rows, default=0) + 1
+        self._categories = {value: _members(ids, id_limit) for value, ids in categories.items()}
+        self._publishers = {value: _members(ids, id_limit) for value, ids in publishers.items()}
+
+    def refresh(self, rows):
+        """按 {图书ID: (分类, 出版社, 是否可借) 或 None（已删除）} 更新位图"""
+        with self._lock:
+            for book_id, row in rows.items():
+                self._set(book_id, row)
+
+    def _set(self, book_id, row):
+        bit = 1 << book_id
+        old = self._rows.pop(book_id, None)
+        if old is not None:
+            self._all &= ~bit
+            self._available &= ~bit
+            _remove(self._categories, old[CATEGORY], book_id)
+            _remove(self._publishers, old[PUBLISHER], book_id)
+        if row is None:
+            return
+        category, publisher, is_available = row
+        self._rows[book_id] = row
+        self._all |= bit
+        if is_available:
+            self._available |= bit
+        _add(self._categories, category, book_id)
+        _add(self._publishers, publisher, book_id)
+
+    def count(self, matched_ids=None, category=None, publisher=None, available_only=False):
+        """
+        matched_ids 为关键词命中的图书ID列表（None 表示不限关键词）。
+        返回 {'total', 'categories', 'publishers', 'availability'}
+        """
+        small = matched_ids is not None and len(matched_ids) <= SMALL_MATCH
+        matched = None if matched_ids is None or small else to_bitmap(matched_ids)
+        with self._lock:
+            if small:
+                return self._count_rows(matched_ids, category, publisher, available_only)
+
+            base = self._all if matched is None else self._all & matched
+            category_filter = _bitmap(self._categories.get(category, 0)) if category else -1
+            publisher_filter = _bitmap(self._publishers.get(publisher, 0)) if publisher else -1
+            available_filter = self._available if available_only else -1
+
+            without_availability = base & category_filter & publisher_filter
+            return {
+                'total': popcount(without_availability & available_filter),
+                'categories': _value_counts(self._categories, base & publisher_filter & available_filter),
+                'publishers': _value_counts(self._publishers, base & category_filter & available_filter),
+                'availability': {
+                    'available': popcount(without_availability & self._available),
+                    'all': popcount(without_availability),
+                },
+            }
+
+    def _count_rows(self, matched_ids, category, publisher, available_only):
+        """逐本计数，只涉及命中图书的取值（口径与位图计数相同）"""
+        wanted = (category or None, publisher or None, available_only or None)
+
+        def passes(row, skip):
+            return all(
+                i == skip or value is None or (row[i] if i == AVAILABLE else row[i] == value)
+                for i, value in enumerate(wanted)
+            )
+
+        categories, publishers = Counter(), Counter()
+        in_scope = available = 0
+        for row in map(self._rows.get, set(matched_ids)):
+            if row is None:
+                continue
+            if row[CATEGORY] and passes(row, CATEGORY):
+                categories[row[CATEGORY]] += 1
+            if row[PUBLISHER] and passes(row, PUBLISHER):
+                publishers[row[PUBLISHER]] += 1
+            if passes(row, AVAILABLE):
+                in_scope += 1
+                available += row[AVAILABLE]
+        return {
+            'total': available if available_only else in_scope,
+            'categories': _top(categories.items()),
+            'publishers': _top(publishers.items()),
+            'availability': {'available': available, 'all': in_scope},
+        }
+
+    def stats(self):
+        with self._lock:
+            values = [*self._categories.values(), *self._publishers.values()]
+            bitmaps = [self._all, self._available] + [v for v in values if isinstance(v, int)]
+            arrays = [v for v in values if not isinstance(v, int)]
+            return {
+                'books': len(self._rows),
+                'categories': len(self._categories),
+                'publishers': len(self._publishers),
+                'bitmap_bytes': sum((bitmap.bit_length() + 7) // 8 for bitmap in bitmaps),
+                'id_array_bytes': sum(len(ids) * ids.itemsize for ids in arrays),
+            }
+
+
+def _members(ids, id_limit):
+    """构建时按密度选择位图或图书ID数组"""
+    if len(ids) * DENSE_RATIO >= id_limit:
+        return to_bitmap(ids)
+    return array('I', ids)
+
+
+def _bitmap(members):
+    return members if isinstance(members, int) else to_bitmap(members)
+
+
+def _add(values, value, book_id):
+    if not value:
+        return
+    members = values.get(value)
+    if members is None:
+        values[value] = array('I', [book_id])
+    elif isinstance(members, int):
+        values[value] = members | (1 << book_id)
+    else:
+        members.append(book_id)
+
+
+def _remove(values, value, book_id):
+    members = values.get(value) if value else None
+    if members is None:
+        return
+    if isinstance(members, int):
+        members &= ~(1 << book_id)
+        if members:
+            values[value] = members
+        else:
+            del values[value]
+    else:
+        try:
+            members.remove(book_id)
+        except ValueError:
+            pass
+        if not members:
+            del values[value]
+
+
+def _value_counts(values, scope):
+    scope_bytes = None
+    counts = []
+    for value, members in values.items():
+        if isinstance(members, int):
+            count = popcount(members & scope)
+        else:
+            # 图书ID数组：在位图的字节表示上逐个检查（整数移位对大位图开销高）
+            if scope_bytes is None:
+                scope_bytes = scope.to_bytes((scope.bit_length() + 7) // 8, 'little')
+            size = len(scope_bytes)
+            count = sum(
+                1 for book_id in members
+                if book_id >> 3 < size and scope_bytes[book_id >> 3] >> (book_id & 7) & 1
+            )
+        if count:
+            counts.append((value, count))
+    return _top(counts)
+
+
+def _top(counts):
+    ranked = sorted(counts, key=lambda item: (-item[1], item[0]))[:MAX_FACET_VALUES]
+    return [{'value': value, 'count': count} for value, count in ranked]
+
+
+def build_index(cursor):
+    index = FacetIndex()
+    cursor.execute('SELECT id, category, publisher, available_quantity > 0 FROM books')
+    index.load(tuple(row) for row in cursor.fetchall())
+    return index
+
+
+def refresh_books(index, cursor, book_ids):
+    rows = load_rows(cursor, 'id, category, publisher, available_quantity > 0', book_ids)
+    index.refresh({
+        book_id: None if book_id not in rows else (rows[book_id][1], rows[book_id][2], bool(rows[book_id][3]))
+        for book_id in book_ids
+    })
+
+
+_lazy = LazyIndex(build_index, refresh_books)
+
+
+def get_index(cursor):
+    """获取位图索引：首次使用时全量构建，否则只刷新变化的图书"""
+    return _lazy.get(cursor)
+
+
+def facet_counts(cursor, matched_ids=None, category=None, publisher=None, available_only=False):
+    """matched_ids 为关键词命中的图书ID（None 表示不限关键词）"""
+    matched_ids = None if matched_ids is None else list(matched_ids)
+    return get_index(cursor).count(matched_ids, category, publisher, available_only)
+
+
+def on_books_changed(*book_ids):
+    """图书行（库存、分类、出版社）变化或删除后调用（不等待正在进行的构建）"""
+    _lazy.mark_dirty(book_ids)
+
+
+def invalidate():
+    """批量导入等大范围修改后丢弃索引，下次使用时重建"""
+    _lazy.invalidate()
+
+
+def stats():
+    index = _lazy.current
+    if index is None:
+        return {'loaded': False}
+    return dict(index.stats(), loaded=True)
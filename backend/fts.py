@@ -0,0 +1,97 @@
+"""
+图书全文检索（SQLite FTS5）
+books_fts 是以 books 为外部内容表的 FTS5 虚拟表，由触发器与 books 保持同步。
+使用 trigram 分词器：不依赖空格分词，中文书名也能按任意子串命中，
+子串匹配天然覆盖前缀查询；结果按 bm25 排序。
+pinyin 列（书名、作者的全拼与首字母）同样进入索引，见 pinyin_search.py。
+"""
+import sqlite3
+
+FTS_TABLE = 'books_fts'
+FTS_COLUMNS = ('title', 'author', 'publisher', 'description', 'isbn', 'pinyin')
+# 迁移 2 建表时 books 还没有 pinyin 列
+BASE_FTS_COLUMNS = FTS_COLUMNS[:5]
+# bm25 各列权重，顺序与 FTS_COLUMNS 一致（书名、作者、ISBN 命中更相关）
+BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 5.0, 3.0)
+FTS_TRIGGERS = ('books_fts_ai', 'books_fts_ad', 'books_fts_au')
+# trigram 分词器的最短可检索长度
+MIN_TERM_LENGTH = 3
+
+
+def create_fts(cursor, fts_columns=FTS_COLUMNS):
+    """创建 FTS 表、同步触发器并回填已有图书（迁移中调用）"""
+    columns = ', '.join(fts_columns)
+    new_values = ', '.join(f'new.{c}' for c in fts_columns)
+    old_values = ', '.join(f'old.{c}' for c in fts_columns)
+
+    try:
+        cursor.execute(
+            f'''CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+                USING fts5({columns}, content='books', content_rowid='id', tokenize='trigram')'''
+        )
+    except sqlite3.OperationalError as e:
+        # SQLite 版本过低（< 3.34）不支持 trigram，搜索继续使用 LIKE
+        print(f"警告: 无法创建全文索引 ({e})，搜索将回退为 LIKE 查询")
+        return
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    # 只在文本列变化时更新索引，借还书修改库存不会触发
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF {columns} ON books BEGIN
+            INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {FTS_TABLE} (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    rebuild_fts(cursor)
+
+
+def recreate_fts(cursor):
+    """按当前 FTS_COLUMNS 重新创建全文索引（索引列变化时使用）"""
+    for trigger in FTS_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    create_fts(cursor)
+
+
+def rebuild_fts(cursor):
+    """按 books 表内容重建全文索引"""
+    cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_available(cursor):
+    """数据库中是否存在全文索引"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (FTS_TABLE,)
+    )
+    return cursor.fetchone() is not None
+
+
+def build_match_query(query):
+    """
+    把用户输入转换为 FTS5 MATCH 表达式：按空白拆分，各词作为短语 AND 连接。
+    返回 (match 表达式, 过短的词列表)；短于 trigram 最小长度的词无法走索引，
+    由调用方用 LIKE 在索引结果上再过滤。没有可检索的词时 match 表达式为 None。
+    """
+    terms = [term.strip('*') for term in query.split()]
+    terms = [term for term in terms if term]
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    if not long_terms:
+        return None, short_terms
+    match_query = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in long_terms)
+    return match_query, short_terms
+
+
+def bm25_expression():
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    return f'bm25({FTS_TABLE}, {weights})'
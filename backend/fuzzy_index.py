@@ -0,0 +1,348 @@
+"""
+容错模糊检索索引（内存）
+把书名、作者拆成词建立词表，词表上建 trigram 倒排（按词长分桶）。
+查询词先用 trigram 重合数筛出候选词（q-gram 引理：编辑距离 d 最多破坏 3d 个 trigram），
+再用有界编辑距离精排，最后按命中的查询词数与相似度给图书打分。
+索引在首次使用时从 books 表构建，之后按变更日志（change_log.py）标记的图书增量刷新（见 lazy_index.py）。
+"""
+import heapq
+import re
+import threading
+from array import array
+from collections import Counter
+from itertools import chain
+
+from lazy_index import LazyIndex, load_rows
+
+# 英文、数字按单词切分；连续的中文作为一个词
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+|[一-鿿]+')
+# 每个查询词最多精排的候选词数量
+MAX_CANDIDATES = 64
+# 取前 limit 本时最多枚举的相似度分层组合数，超过后改为逐本计分
+MAX_COMBINATIONS = 1024
+# 包含该词的图书不少于此数时缓存其图书集合（只读），常见词查询时不必每次由列表建集合
+BOOK_SET_CACHE_MIN = 4096
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def trigrams(word):
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(word):
+    """允许的最大编辑距离：短词 1，其余 2（覆盖绝大多数拼写错误，同时保持 trigram 过滤的选择性）"""
+    return 1 if len(word) <= 4 else 2
+
+
+def bounded_levenshtein(a, b, limit):
+    """编辑距离，超过 limit 时提前返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, start=1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            current.append(value)
+            if value < row_min:
+                row_min = value
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _smallest(ids, count):
+    """集合中最小的 count 个ID（升序）；图书ID从 1 起较密时逐个探测，不遍历整个集合"""
+    if count >= len(ids):
+        return sorted(ids)
+    result = []
+    # 探测次数不超过集合大小的 1/4，仍未凑满时改为遍历
+    for book_id in range(1, len(ids) // 4 + 1):
+        if book_id in ids:
+            result.append(book_id)
+            if len(result) == count:
+                return result
+    return heapq.nsmallest(count, ids)
+
+
+def _combination_books(options, signature):
+    """各词选定的层求交集，再去掉选择"不命中"的词命中的图书"""
+    included, excluded = [], []
+    for choices, index in zip(options, signature):
+        hit, _, books = choices[index]
+        (included if hit else excluded).append(books)
+    excluded = [books for books in excluded if books]
+    if not included:
+        return set()
+    if len(included) == 1 and not excluded:
+        return included[0]      # 只读使用，不复制
+    included.sort(key=len)
+    group = included[0].intersection(*included[1:])
+    if group and excluded:
+        group = group.difference(*excluded)
+    return group
+
+
+class FuzzyIndex:
+    """词表 + trigram 倒排的模糊检索索引"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._terms = []            # term_id -> 词
+        self._term_ids = {}         # 词 -> term_id
+        self._term_books = []       # term_id -> 包含该词的图书ID列表
+        self._postings = {}         # (trigram, 词长) -> array('I') of term_id
+        self._book_terms = {}       # book_id -> term_id 元组
+        self._book_sets = {}        # term_id -> 图书ID frozenset（仅大列表，词的图书变化时丢弃）
+
+    def __len__(self):
+        return len(self._book_terms)
+
+    def _term_id(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self._term_ids[term] = term_id
+            self._term_books.append([])
+            length = len(term)
+            for gram in trigrams(term):
+                postings = self._postings.get((gram, length))
+                if postings is None:
+                    postings = self._postings[(gram, length)] = array('I')
+                postings.append(term_id)
+        return term_id
+
+    def add(self, book_id, title, author):
+        """加入或替换一本书"""
+        with self._lock:
+            self._remove(book_id)
+            term_ids = tuple({self._term_id(t) for t in tokenize(title) + tokenize(author)})
+            for term_id in term_ids:
+                self._term_books[term_id].append(book_id)
+                self._book_sets.pop(term_id, None)
+            self._book_terms[book_id] = term_ids
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove(book_id)
+
+    def _remove(self, book_id):
+        # 词表中的词保留（后续图书可能复用），只移除图书引用
+        for term_id in self._book_terms.pop(book_id, ()):
+            self._book_sets.pop(term_id, None)
+            books = self._term_books[term_id]
+            try:
+                books.remove(book_id)
+            except ValueError:
+                pass
+
+    def _similar_terms(self, word):
+        """返回 {term_id: 相似度}，相似度 = 1 - 编辑距离 / 较长词长"""
+        limit = max_distance(word)
+        grams = trigrams(word)
+        threshold = max(1, len(grams) - 3 * limit)
+
+        counts = Counter()
+        for length in range(max(1, len(word) - limit), len(word) + limit + 1):
+            counts.update(chain.from_iterable(
+                self._postings.get((gram, length), ()) for gram in grams
+            ))
+
+        candidates = [(shared, term_id) for term_id, shared in counts.items() if shared >= threshold]
+        result = {}
+        for shared, term_id in heapq.nlargest(MAX_CANDIDATES, candidates):
+            if not self._term_books[term_id]:
+                continue
+            term = self._terms[term_id]
+            distance = bounded_levenshtein(word, term, limit)
+            if distance <= limit:
+                result[term_id] = 1.0 - distance / max(len(word), len(term))
+        return result
+
+    def _books(self, term_id):
+        """包含该词的图书：大列表返回缓存的 frozenset，其余返回列表本身（均只读）"""
+        books = self._book_sets.get(term_id)
+        if books is not None:
+            return books
+        books = self._term_books[term_id]
+        if len(books) < BOOK_SET_CACHE_MIN:
+            return books
+        # 与 add / remove 互斥，避免把修改前的列表缓存下来
+        with self._lock:
+            books = self._book_sets[term_id] = frozenset(self._term_books[term_id])
+        return books
+
+    def _word_tiers(self, word, allowed):
+        """
+        查询词命中的图书按相似度分层：返回 ([(相似度, 图书ID集合)], 全部命中的图书集合)。
+        相似度降序，各层互不重叠（一本书含多个相似词时只计最相似的一个）
+        """
+        by_score = {}
+        for term_id, score in self._similar_terms(word).items():
+            by_score.setdefault(score, []).append(self._books(term_id))
+        tiers, covered = [], set()
+        for score in sorted(by_score, reverse=True):
+            lists = by_score[score]
+            if allowed is not None:
+                books = allowed.intersection(lists[0] if len(lists) == 1 else chain(*lists))
+            elif len(lists) == 1 and isinstance(lists[0], frozenset):
+                books = lists[0]
+            else:
+                books = set().union(*lists)
+            if covered:
+                books = books - covered
+            if books:
+                # 层内集合之后只读：第一层直接作为已命中集合，不再复制
+                covered = covered | books if covered else books
+                tiers.append((score, books))
+        return tiers, covered
+
+    def search(self, query, limit=20, allowed=None):
+        """
+        返回 [(book_id, 分数)]，分数整数部分为命中的查询词数，小数部分为平均相似度。
+        allowed 为允许的图书ID集合（筛选条件），None 表示不限；limit 为 None 时返回全部命中
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        word_tiers = [self._word_tiers(word, allowed) for word in words]
+        if limit is not None:
+            ranked = self._top_k(word_tiers, limit)
+            if ranked is not None:
+                return [(book_id, matched + similarity / len(words) / 10)
+                        for book_id, matched, similarity in ranked]
+        return self._rank_all(word_tiers, limit, len(words))
+
+    @staticmethod
+    def _top_k(word_tiers, limit):
+        """
+        每个查询词选定一层（或不命中）即确定一组图书的得分（命中词数, 相似度之和）；
+        按得分从高到低枚举这些组合，组合内的图书用集合运算求出，凑满 limit 本即停止，
+        不对每本候选图书逐一打分排序。组合过多时返回 None，改为逐本计分。
+        返回 [(book_id, 命中词数, 相似度之和)]
+        """
+        # 每个词的选项：(是否命中, 相似度, 图书集合)，按得分降序，最后一项为不命中
+        options = [
+            [(1, score, books) for score, books in tiers] + [(0, 0.0, covered)]
+            for tiers, covered in word_tiers
+        ]
+
+        def key(signature):
+            matched, similarity = 0, 0
+            for choices, index in zip(options, signature):
+                hit, score, _ = choices[index]
+                matched += hit
+                similarity += score
+            return -matched, -similarity
+
+        start = (0,) * len(options)
+        heap = [(*key(start), start)]
+        visited = {start}
+        result = []
+        popped = 0
+        while heap and len(result) < limit:
+            rank = heap[0][:2]
+            if rank[0] == 0:
+                break       # 剩下的组合一个词都不命中
+            groups = []
+            # 得分相同的组合一起取出，合并后按图书ID排序（与逐本排序的并列规则一致）
+            while heap and heap[0][:2] == rank:
+                signature = heapq.heappop(heap)[2]
+                popped += 1
+                if popped > MAX_COMBINATIONS:
+                    return None
+                books = _combination_books(options, signature)
+                if books:
+                    groups.append(books)
+                for i in range(len(signature)):
+                    successor = signature[:i] + (signature[i] + 1,) + signature[i + 1:]
+                    if successor[i] < len(options[i]) and successor not in visited:
+                        visited.add(successor)
+                        heapq.heappush(heap, (*key(successor), successor))
+            if groups:
+                group = groups[0] if len(groups) == 1 else set().union(*groups)
+                for book_id in _smallest(group, limit - len(result)):
+                    result.append((book_id, -rank[0], -rank[1]))
+        return result
+
+    @staticmethod
+    def _rank_all(word_tiers, limit, word_count):
+        matched = Counter()
+        similarity = Counter()
+        for tiers, covered in word_tiers:
+            matched.update(covered)
+            for score, books in tiers:
+                for book_id in books:
+                    similarity[book_id] += score
+
+        def rank(book_id):
+            return matched[book_id], similarity[book_id], -book_id
+
+        ranked = sorted(matched, key=rank, reverse=True) if limit is None else heapq.nlargest(limit, matched, key=rank)
+        return [
+            (book_id, matched[book_id] + similarity[book_id] / word_count / 10)
+            for book_id in ranked
+        ]
+
+    def stats(self):
+        return {
+            'books': len(self._book_terms),
+            'terms': len(self._terms),
+            'posting_lists': len(self._postings),
+        }
+
+
+def build_index(cursor):
+    """从 books 表全量构建索引"""
+    index = FuzzyIndex()
+    cursor.execute('SELECT id, title, author FROM books')
+    while True:
+        rows = cursor.fetchmany(5000)
+        if not rows:
+            break
+        for row in rows:
+            index.add(row['id'], row['title'], row['author'])
+    return index
+
+
+def refresh_books(index, cursor, book_ids):
+    rows = load_rows(cursor, 'id, title, author', book_ids)
+    for book_id in book_ids:
+        row = rows.get(book_id)
+        if row is None:
+            index.remove(book_id)
+        else:
+            index.add(book_id, row['title'], row['author'])
+
+
+_lazy = LazyIndex(build_index, refresh_books)
+
+
+def get_index(cursor=None):
+    """获取索引，首次调用（或失效后）时构建，有变化的图书时先刷新"""
+    return _lazy.get(cursor)
+
+
+def warm_up():
+    """在后台线程中预先构建索引，避免首个模糊查询等待"""
+    threading.Thread(target=get_index, name='fuzzy-index-warmup', daemon=True).start()
+
+
+def on_books_changed(*book_ids):
+    """书名 / 作者变化或图书删除后调用（不等待正在进行的构建）"""
+    _lazy.mark_dirty(book_ids)
+
+
+def invalidate():
+    """批量导入等大范围修改后丢弃索引，下次使用时重建"""
+    _lazy.invalidate()
+
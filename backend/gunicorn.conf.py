@@ -0,0 +1,89 @@
+"""
+gunicorn 生产配置（Linux / macOS）
+    gunicorn -c gunicorn.conf.py app:app        或    python serve.py
+
+- 主进程启动（及平滑重载）时在子进程中建库 / 执行迁移一次；主进程本身不导入应用，
+  worker fork 后各自导入应用、建立数据库连接，重载时新 worker 加载的是新代码；
+- 每个 worker 启动后各自预热模糊检索索引、启动定时任务（任务租约保证同一任务只有一个 worker 执行）；
+- 多个 worker 各有一份进程内缓存、检索索引与推送代理，彼此通过图书变更日志（change_log.py）同步：
+  处理 API 请求前及后台每 CHANGE_POLL_INTERVAL 秒读取其他进程的写入，预约队列直接在数据库中排序；
+- gthread worker：每个 worker 多个线程。实时库存推送（SSE）每个连接长期占用一个线程，
+  线程数 = WEB_THREADS（普通请求）+ SSE_MAX_SUBSCRIBERS（推送连接上限，与 availability.py 相同），
+  推送连接占满时普通请求仍有 WEB_THREADS 个线程可用；
+- 平滑重载：kill -HUP <主进程PID>，旧 worker 处理完当前请求（最长 WEB_GRACEFUL_TIMEOUT 秒）后退出；
+- 启动耗时：主进程准备数据库、每个 worker 导入应用与初始化的耗时，以及各 worker 就绪时距主进程启动的时间
+  （最后一个即全部就绪的时间）都输出到日志。
+
+配置均可用环境变量覆盖。
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+# library.db 等相对路径以 backend 目录为准
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+# SQLite 写入是串行的，worker 数按 CPU 核数即可，读并发由线程承担
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+# 普通请求线程 + 每个 SSE 连接一个线程
+threads = int(os.environ.get('WEB_THREADS', 8)) + int(os.environ.get('SSE_MAX_SUBSCRIBERS', 100))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+# 每个 worker 处理一定数量请求后重启（0 表示不限），加抖动避免同时重启
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+# 不预加载应用：worker 各自导入，数据库连接和后台线程不跨 fork 共享，重载时加载新代码
+preload_app = False
+accesslog = os.environ.get('WEB_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+# 主进程加载配置的时间（平滑重载时重新加载）；perf_counter 是系统单调时钟，fork 出的 worker 可直接比较
+_started = time.perf_counter()
+
+
+def _elapsed_ms(since):
+    return round((time.perf_counter() - since) * 1000, 1)
+
+
+def _prepare_database(server):
+    began = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', 'from app import prepare_database; prepare_database()'],
+        cwd=chdir, check=True
+    )
+    server.log.info(f"数据库准备完成，耗时 {_elapsed_ms(began)}ms")
+
+
+def on_starting(server):
+    _prepare_database(server)
+
+
+def on_reload(server):
+    """kill -HUP：先执行新代码中的迁移，再启动新 worker"""
+    _prepare_database(server)
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    """worker 导入应用后：启动本进程的后台任务并记录启动耗时"""
+    from app import start_background_tasks
+
+    start_background_tasks()
+    worker.log.info(
+        f"worker {worker.pid} 就绪，启动耗时 {_elapsed_ms(worker.boot_started)}ms，"
+        f"距主进程启动 {_elapsed_ms(_started)}ms"
+    )
+
+
+def when_ready(server):
+    server.log.info(
+        f"监听 {bind}，{workers} 个 worker × {threads} 线程，主进程启动耗时 {_elapsed_ms(_started)}ms"
+    )
@@ -0,0 +1,227 @@
+"""
+图书预约队列
+库存为 0 时读者可预约（holds 表）。归还图书时，在同一写事务中把这本书直接分配给
+队首的预约读者（状态 waiting -> ready，保留 HOLD_PICKUP_DAYS 天），不再放回可借库存；
+读者借阅时优先领取为自己保留的那本。超期未领取的保留由定时清理（scheduler.py）转给下一位或放回库存。
+
+队列顺序：特殊读者优先级（HOLD_PRIORITY），其次预约时间、预约ID。
+队首在分配的写事务中按 idx_holds_queue 直接查询（有序索引取第一条），
+多个进程看到的始终是同一个队列，写事务回滚后重试也不会跳过队首读者。
+读者直接从库存借到图书时，其对该书仍在等待的预约随之完成。
+
+定时清理也可手动执行：python holds.py
+"""
+import os
+from datetime import datetime, timedelta
+
+from transactions import TransactionAbort, run_immediate
+
+# 特殊读者类型 -> 优先级（数值小的先分配），其余读者为 DEFAULT_PRIORITY
+HOLD_PRIORITY = {'disabled': 0, 'elderly': 1}
+DEFAULT_PRIORITY = 2
+HOLD_PICKUP_DAYS = int(os.environ.get('HOLD_PICKUP_DAYS', 3))
+SWEEP_INTERVAL = float(os.environ.get('HOLD_SWEEP_INTERVAL', 300))
+# 每位读者同时有效（等待中 / 待领取）的预约数上限
+MAX_ACTIVE_HOLDS = 10
+
+HOLDS_DDL = [
+    '''CREATE TABLE IF NOT EXISTS holds (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           user_id INTEGER NOT NULL,
+           book_id INTEGER NOT NULL,
+           priority INTEGER NOT NULL DEFAULT 2,
+           requested_at TEXT NOT NULL,
+           status TEXT NOT NULL DEFAULT 'waiting',
+           ready_at TEXT,
+           expires_at TEXT,
+           closed_at TEXT,
+           FOREIGN KEY (user_id) REFERENCES users(id),
+           FOREIGN KEY (book_id) REFERENCES books(id)
+       )''',
+    # 同一读者对同一本书只能有一个有效预约
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_active
+       ON holds (user_id, book_id) WHERE status IN ('waiting', 'ready')''',
+    # 分配队首与排队位置：WHERE book_id = ? AND status = 'waiting' ORDER BY priority, requested_at, id
+    '''CREATE INDEX IF NOT EXISTS idx_holds_queue
+       ON holds (book_id, priority, requested_at, id) WHERE status = 'waiting' ''',
+    # 超期清理：WHERE status = 'ready' AND expires_at < ?
+    '''CREATE INDEX IF NOT EXISTS idx_holds_expiry ON holds (expires_at) WHERE status = 'ready' ''',
+    'CREATE INDEX IF NOT EXISTS idx_holds_user ON holds (user_id, requested_at)',
+]
+
+
+def assign_next(cursor, book_id, now):
+    """在写事务中把一本书分配给队首读者，返回预约ID；无人等待时返回 None"""
+    # idx_holds_queue 按队列顺序有序，取第一条即可
+    cursor.execute(
+        '''SELECT id FROM holds
+           WHERE book_id = ? AND status = 'waiting'
+           ORDER BY priority, requested_at, id
+           LIMIT 1''',
+        (book_id,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    expires_at = (now + timedelta(days=HOLD_PICKUP_DAYS)).isoformat()
+    cursor.execute(
+        "UPDATE holds SET status = 'ready', ready_at = ?, expires_at = ? WHERE id = ?",
+        (now.isoformat(), expires_at, row['id'])
+    )
+    return row['id']
+
+
+def reader_priority(cursor, user_id):
+    cursor.execute('SELECT special_reader_type FROM users WHERE id = ?', (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return HOLD_PRIORITY.get(row['special_reader_type'], DEFAULT_PRIORITY)
+
+
+def place_hold(cursor, user_id, book_id):
+    """在写事务中预约一本无库存的图书，返回 (预约ID, 排队位置)"""
+    priority = reader_priority(cursor, user_id)
+    if priority is None:
+        raise TransactionAbort('用户不存在', 404)
+
+    cursor.execute('SELECT available_quantity FROM books WHERE id = ?', (book_id,))
+    book = cursor.fetchone()
+    if not book:
+        raise TransactionAbort('图书不存在', 404)
+    if book['available_quantity'] > 0:
+        raise TransactionAbort('图书有库存，可直接借阅')
+
+    cursor.execute(
+        "SELECT 1 FROM borrowing_records WHERE user_id = ? AND book_id = ? AND status IN ('borrowed', 'overdue')",
+        (user_id, book_id)
+    )
+    if cursor.fetchone():
+        raise TransactionAbort('您已借阅该图书，无需预约')
+
+    cursor.execute(
+        "SELECT book_id FROM holds WHERE user_id = ? AND status IN ('waiting', 'ready')",
+        (user_id,)
+    )
+    active = {row['book_id'] for row in cursor.fetchall()}
+    if book_id in active:
+        raise TransactionAbort('您已预约该图书')
+    if len(active) >= MAX_ACTIVE_HOLDS:
+        raise TransactionAbort(f'最多同时预约 {MAX_ACTIVE_HOLDS} 本图书')
+
+    requested_at = datetime.now().isoformat()
+    cursor.execute(
+        '''INSERT INTO holds (user_id, book_id, priority, requested_at, status)
+           VALUES (?, ?, ?, ?, 'waiting')''',
+        (user_id, book_id, priority, requested_at)
+    )
+    hold_id = cursor.lastrowid
+    hold = {'id': hold_id, 'book_id': book_id, 'priority': priority, 'requested_at': requested_at}
+    return hold_id, queue_position(cursor, hold)
+
+
+def cancel_hold(cursor, hold_id):
+    """在写事务中取消预约；取消的是待领取的保留时，这本书转给下一位。返回图书ID"""
+    cursor.execute('SELECT book_id, status FROM holds WHERE id = ?', (hold_id,))
+    hold = cursor.fetchone()
+    if not hold:
+        raise TransactionAbort('预约不存在', 404)
+    if hold['status'] not in ('waiting', 'ready'):
+        raise TransactionAbort('该预约已结束')
+
+    cursor.execute(
+        "UPDATE holds SET status = 'cancelled', closed_at = ? WHERE id = ? AND status = ?",
+        (datetime.now().isoformat(), hold_id, hold['status'])
+    )
+    if cursor.rowcount == 0:
+        raise TransactionAbort('该预约已结束')
+    if hold['status'] == 'ready':
+        release_copy(cursor, hold['book_id'])
+    return hold['book_id']
+
+
+def has_waiting_holds(cursor, book_id):
+    cursor.execute(
+        "SELECT 1 FROM holds WHERE book_id = ? AND status = 'waiting' LIMIT 1",
+        (book_id,)
+    )
+    return cursor.fetchone() is not None
+
+
+def release_copy(cursor, book_id, now=None):
+    """
+    一本书空出（归还、保留被取消或过期）时调用：有人排队则分配给队首，
+    否则放回可借库存。返回分配到的预约ID或 None。
+    """
+    hold_id = assign_next(cursor, book_id, now or datetime.now())
+    if hold_id is None:
+        cursor.execute(
+            'UPDATE books SET available_quantity = available_quantity + 1 WHERE id = ?',
+            (book_id,)
+        )
+    return hold_id
+
+
+def claim_hold(cursor, user_id, book_id):
+    """借阅时领取为该读者保留的图书；有保留时返回 True（保留的那本不占用可借库存）"""
+    cursor.execute(
+        '''UPDATE holds SET status = 'fulfilled', closed_at = ?
+           WHERE user_id = ? AND book_id = ? AND status = 'ready' ''',
+        (datetime.now().isoformat(), user_id, book_id)
+    )
+    return cursor.rowcount > 0
+
+
+def close_waiting(cursor, user_id, book_id):
+    """读者直接从库存借到图书后，结束其对该书仍在等待的预约，不再占用队列位置"""
+    cursor.execute(
+        '''UPDATE holds SET status = 'fulfilled', closed_at = ?
+           WHERE user_id = ? AND book_id = ? AND status = 'waiting' ''',
+        (datetime.now().isoformat(), user_id, book_id)
+    )
+
+
+def queue_position(cursor, hold):
+    """等待中预约的排队位置（从 1 开始）"""
+    cursor.execute(
+        '''SELECT COUNT(*) FROM holds
+           WHERE book_id = ? AND status = 'waiting'
+             AND (priority, requested_at, id) < (?, ?, ?)''',
+        (hold['book_id'], hold['priority'], hold['requested_at'], hold['id'])
+    )
+    return cursor.fetchone()[0] + 1
+
+
+def expire_holds(cursor, now=None):
+    """把超期未领取的保留标记为 expired 并转给下一位，返回涉及的图书ID列表"""
+    now = now or datetime.now()
+    cursor.execute(
+        '''SELECT id, book_id FROM holds
+           WHERE status = 'ready' AND expires_at < ?''',
+        (now.isoformat(),)
+    )
+    expired = cursor.fetchall()
+    for hold in expired:
+        cursor.execute(
+            "UPDATE holds SET status = 'expired', closed_at = ? WHERE id = ? AND status = 'ready'",
+            (now.isoformat(), hold['id'])
+        )
+        if cursor.rowcount:
+            release_copy(cursor, hold['book_id'], now)
+    return sorted({hold['book_id'] for hold in expired})
+
+
+def sweep(conn):
+    """执行一次超期清理，返回涉及的图书ID列表"""
+    return run_immediate(conn, expire_holds)
+
+
+if __name__ == '__main__':
+    from models import get_db
+
+    conn = get_db()
+    try:
+        released = sweep(conn)
+    finally:
+        conn.close()
+    print(f"预约超期清理完成，涉及 {len(released)} 本图书")
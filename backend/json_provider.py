@@ -0,0 +1,102 @@
+"""
+JSON 序列化
+- FastJSONProvider：替换 Flask 默认的 JSON provider。安装了 orjson 时用 orjson 编码 / 解码（比标准库快数倍），
+  否则回退到标准库；两种方式输出一致（UTF-8、不转义中文、datetime 等类型按 Flask 的规则转换）。
+  JSON_BACKEND=stdlib 时强制使用标准库；
+- 行直出 JSON：列表接口用 SQLite 的 json_object() 在查询中直接生成每行的 JSON 文本，
+  拼接成数组后以 RawJSON 放入响应，不再为每行构建字典再编码。
+  SQLite 输出浮点数保留 15 位有效数字（如检索相关度 score），分页游标仍取自原始列值。
+"""
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+
+if orjson is not None:
+    # datetime 交给 default 处理，与 Flask 的 HTTP 日期格式保持一致
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+# 表名 -> 列名（表结构在迁移后不再变化，查询一次即可）
+_table_columns = {}
+
+
+class RawJSON:
+    """已编码的 JSON 文本，序列化时原样拼入（只能作为响应顶层字典的值）"""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+    use_orjson = orjson is not None and JSON_BACKEND != 'stdlib'
+
+    def encode(self, obj, indent=False):
+        """编码为 UTF-8 字节串；顶层字典中的 RawJSON 值原样拼入"""
+        if isinstance(obj, dict) and any(isinstance(value, RawJSON) for value in obj.values()):
+            items = sorted(obj.items()) if self.sort_keys else obj.items()
+            parts = [
+                self._encode_value(str(key)) + b':'
+                + (value.text.encode() if isinstance(value, RawJSON) else self._encode_value(value))
+                for key, value in items
+            ]
+            return b'{' + b','.join(parts) + b'}'
+        return self._encode_value(obj, indent)
+
+    def _encode_value(self, obj, indent=False):
+        if self.use_orjson:
+            option = ORJSON_OPTIONS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=self.default, option=option)
+        return json.dumps(
+            obj, default=self.default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+            indent=2 if indent else None, separators=None if indent else (',', ':')
+        ).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj, indent=bool(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def table_columns(cursor, table, alias=''):
+    """表的全部列（带表别名前缀），用于生成 row_json 表达式"""
+    columns = _table_columns.get(table)
+    if columns is None:
+        cursor.execute(f'PRAGMA table_info({table})')
+        columns = _table_columns[table] = [row[1] for row in cursor.fetchall()]
+    prefix = f'{alias}.' if alias else ''
+    return [prefix + column for column in columns]
+
+
+def row_json(columns):
+    """SQLite json_object 表达式，JSON 键为列名（去掉表别名）：row_json(['b.id', 'b.title']) -> json_object('id', b.id, ...)"""
+    pairs = ', '.join(f"'{column.split('.')[-1]}', {column}" for column in columns)
+    return f'json_object({pairs})'
+
+
+def init_app(app):
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,102 @@
+"""
+按需构建、按变化图书刷新的进程内索引（模糊检索、联想、分面位图共用）
+- 首次使用（或失效后）时由一个请求全量构建，其余请求等待构建完成；
+- 变更日志同步时只调用 mark_dirty() 记下变化的图书ID，不等待正在进行的构建，也不读取数据库；
+- 下次取用索引时重新读取这些图书行并更新索引（同一时刻只有一个线程刷新，保证按读取顺序生效）。
+构建期间记下的图书在构建完成后照常刷新；构建期间发生失效时，构建结果不再安装。
+"""
+import threading
+
+from models import get_db
+
+
+def with_cursor(cursor, work):
+    """cursor 为 None 时借出一个连接执行 work(cursor) 后归还"""
+    if cursor is not None:
+        return work(cursor)
+    conn = get_db()
+    try:
+        return work(conn.cursor())
+    finally:
+        conn.close()
+
+
+def load_rows(cursor, columns, book_ids):
+    """按图书ID分批（受 SQLite 变量个数限制）读取 books 行，返回 {图书ID: 行}；第一列必须是 id"""
+    rows = {}
+    for i in range(0, len(book_ids), 500):
+        part = book_ids[i:i + 500]
+        placeholders = ', '.join('?' for _ in part)
+        cursor.execute(f'SELECT {columns} FROM books WHERE id IN ({placeholders})', part)
+        rows.update((row[0], row) for row in cursor.fetchall())
+    return rows
+
+
+class LazyIndex:
+    """
+    build(cursor) 返回新索引；refresh(index, cursor, book_ids) 按数据库当前内容更新这些图书
+    （已删除的图书从索引移除）
+    """
+
+    def __init__(self, build, refresh):
+        self._build = build
+        self._refresh = refresh
+        self._index = None
+        self._build_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # 保护 _dirty、_generation 与索引的安装 / 丢弃，只做内存操作，持有时间很短
+        self._state_lock = threading.Lock()
+        self._dirty = set()
+        self._generation = 0
+
+    @property
+    def current(self):
+        """已构建的索引（不触发构建与刷新）；未构建时为 None"""
+        return self._index
+
+    def get(self, cursor=None):
+        """获取索引：未构建时构建，有变化的图书时先刷新；cursor 为 None 时按需借出连接"""
+        index = self._index
+        if index is None:
+            with self._build_lock:
+                index = self._index
+                if index is None:
+                    with self._state_lock:
+                        generation = self._generation
+                    index = with_cursor(cursor, self._build)
+                    with self._state_lock:
+                        if generation == self._generation:
+                            self._index = index
+        if self._dirty:
+            self._apply_dirty(index, cursor)
+        return index
+
+    def mark_dirty(self, book_ids):
+        """图书行变化或删除后调用；不等待构建，也不访问数据库"""
+        if not book_ids:
+            return
+        with self._state_lock:
+            self._dirty.update(book_ids)
+
+    def invalidate(self):
+        """丢弃索引，下次使用时重建；正在进行的构建完成后不会被安装"""
+        with self._state_lock:
+            self._generation += 1
+            self._index = None
+            self._dirty.clear()
+
+    def _apply_dirty(self, index, cursor):
+        with self._refresh_lock:
+            with self._state_lock:
+                # 已被失效丢弃的索引不刷新：标记留给之后安装的新索引
+                if index is not self._index or not self._dirty:
+                    return
+                book_ids, self._dirty = self._dirty, set()
+            try:
+                with_cursor(cursor, lambda c: self._refresh(index, c, sorted(book_ids)))
+            except Exception:
+                with self._state_lock:
+                    if index is self._index:
+                        self._dirty |= book_ids
+                raise
+
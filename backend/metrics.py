@@ -0,0 +1,263 @@
+"""
+请求与 SQL 耗时统计（Prometheus 文本格式，GET /api/metrics）
+- 请求：按路由规则和方法统计耗时直方图、按状态码计数，以及当前处理中的请求数；
+- SQL：连接池建立的连接使用 TimedConnection，其游标对每条语句计时并统计返回 / 影响的行数，
+  语句按规范化后的 SQL 文本聚合（IN (?)、IN (?, ?, ...) 等占位符列表合并为 (?...)），
+  超过 MAX_STATEMENT_LENGTH 的语句标签为开头部分加完整语句的摘要，开头相同的长语句不会合并；
+  单条语句超过 SLOW_QUERY_MS 毫秒时输出慢查询日志。
+
+METRICS_ENABLED=0 时不注册请求钩子，连接池直接使用 sqlite3.Connection，没有额外开销。
+统计是进程内的：多进程部署时每个进程分别暴露自己的指标。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from flask import Response, g, request
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# 直方图桶上限（秒）
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+# 语句标签的最大长度；更长的语句保留开头 STATEMENT_PREFIX_LENGTH 个字符并附加完整语句的摘要
+MAX_STATEMENT_LENGTH = 200
+STATEMENT_PREFIX_LENGTH = 120
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\(\?(?:\s*,\s*\?)+\)|\bIN \(\?\)', re.IGNORECASE)
+
+
+class Histogram:
+    """按标签聚合的直方图，每组标签保存各桶计数、总和与样本数"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}       # labels -> [各桶计数..., 总和, 样本数]
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+request_duration = Histogram(REQUEST_BUCKETS)       # (endpoint, method)
+request_status = Counter()                          # (endpoint, method, status)
+query_duration = Histogram(QUERY_BUCKETS)           # (statement,)
+query_rows = Counter()                              # (statement,)
+slow_queries = Counter()                            # (statement,)
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def _fold_placeholders(match):
+    return 'IN (?...)' if match.group().upper().startswith('IN') else '(?...)'
+
+
+@lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    statement = _PLACEHOLDER_LIST.sub(_fold_placeholders, _WHITESPACE.sub(' ', sql).strip())
+    if len(statement) <= MAX_STATEMENT_LENGTH:
+        return statement
+    digest = hashlib.blake2b(statement.encode('utf-8'), digest_size=6).hexdigest()
+    return f'{statement[:STATEMENT_PREFIX_LENGTH]}... #{digest}'
+
+
+def record_query(sql, seconds, rows):
+    statement = normalize_sql(sql)
+    query_duration.observe((statement,), seconds)
+    if rows > 0:
+        query_rows.inc((statement,), rows)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc((statement,))
+        print(f"慢查询 {seconds * 1000:.1f}ms: {statement}")
+
+
+class TimedCursor(sqlite3.Cursor):
+    """对 execute / executemany 计时；SELECT 的行数在 fetch* 时累加到最近一条语句"""
+
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._sql = sql
+            record_query(sql, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._sql = None
+            record_query(sql, time.perf_counter() - started, max(self.rowcount, 0))
+
+    def _fetched(self, rows):
+        if self._sql is not None and rows:
+            query_rows.inc((normalize_sql(self._sql),), rows)
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._fetched(len(rows))
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    """cursor() 及 conn.execute() / executemany() 使用 TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """连接池建立连接时使用的 sqlite3.connect factory"""
+    return TimedConnection if ENABLED else sqlite3.Connection
+
+
+def _before_request():
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+    g._metrics_in_flight = True
+    g._metrics_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_duration.observe((endpoint, request.method), time.perf_counter() - started)
+        request_status.inc((endpoint, request.method, str(response.status_code)))
+    return response
+
+
+def _teardown_request(exception=None):
+    global _in_flight
+    if not g.pop('_metrics_in_flight', False):
+        return
+    with _in_flight_lock:
+        _in_flight -= 1
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _histogram_lines(name, help_text, histogram, label_names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, series in sorted(histogram.snapshot().items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, series):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {cumulative}')
+        le = 'le="+Inf"'
+        lines.append(f'{name}_bucket{_labels(label_names, labels, le)} {series[-1]}')
+        lines.append(f'{name}_sum{_labels(label_names, labels)} {series[-2]:.6f}')
+        lines.append(f'{name}_count{_labels(label_names, labels)} {series[-1]}')
+    return lines
+
+
+def _counter_lines(name, help_text, counter, label_names):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for labels, value in sorted(counter.snapshot().items()):
+        lines.append(f'{name}{_labels(label_names, labels)} {value}')
+    return lines
+
+
+def render():
+    """全部指标的 Prometheus 文本格式"""
+    lines = [
+        '# HELP http_requests_in_flight 当前正在处理的请求数',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {_in_flight}',
+    ]
+    lines += _histogram_lines('http_request_duration_seconds', '请求耗时', request_duration, ('endpoint', 'method'))
+    lines += _counter_lines('http_requests_total', '按状态码统计的请求数', request_status, ('endpoint', 'method', 'status'))
+    lines += _histogram_lines('sql_query_duration_seconds', 'SQL 语句执行耗时', query_duration, ('statement',))
+    lines += _counter_lines('sql_query_rows_total', 'SQL 语句返回或影响的行数', query_rows, ('statement',))
+    lines += _counter_lines('sql_slow_queries_total', f'超过 {SLOW_QUERY_MS:g}ms 的 SQL 语句数', slow_queries, ('statement',))
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in (request_duration, request_status, query_duration, query_rows, slow_queries):
+        metric.clear()
+
+
+def metrics_endpoint():
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    """注册请求计时钩子与 /api/metrics（METRICS_ENABLED=0 时跳过）"""
+    if not ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/api/metrics', 'metrics', metrics_endpoint, methods=['GET'])
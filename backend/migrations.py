@@ -0,0 +1,138 @@
+"""
+数据库结构迁移
+使用 PRAGMA user_version 记录当前结构版本，启动时按顺序执行未应用的迁移。
+每个迁移在独立事务中执行，语句本身也都是幂等的，已有的 library.db 可直接升级。
+"""
+from fts import BASE_FTS_COLUMNS, create_fts
+from stats import create_stats_tables
+from ratings import create_rating_aggregates
+from pinyin_search import add_pinyin_column
+from holds import HOLDS_DDL
+from overdue import create_overdue_tracking
+from scheduler import LEASE_DDL
+
+# (版本号, 说明, SQL 语句列表或接收 cursor 的函数)
+MIGRATIONS = [
+    (1, '借阅、反馈、图书常用查询的二级索引', [
+        # 我的借阅：WHERE user_id = ? ORDER BY borrow_date DESC
+        'CREATE INDEX IF NOT EXISTS idx_borrowing_user_date ON borrowing_records (user_id, borrow_date)',
+        # 重复借阅检查：WHERE user_id = ? AND book_id = ? AND status = ?
+        'CREATE INDEX IF NOT EXISTS idx_borrowing_user_book_status ON borrowing_records (user_id, book_id, status)',
+        # 删除图书前检查未归还记录：WHERE book_id = ? AND status = ?
+        'CREATE INDEX IF NOT EXISTS idx_borrowing_book_status ON borrowing_records (book_id, status)',
+        # 分类列表：SELECT DISTINCT category
+        'CREATE INDEX IF NOT EXISTS idx_books_category ON books (category)',
+        # 图书列表：ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_books_created ON books (created_at)',
+        # 反馈列表：ORDER BY created_at DESC / WHERE user_id = ? ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_feedback_user_created ON feedback (user_id, created_at)',
+        # 用户列表：ORDER BY created_at DESC；注册时检查手机号
+        'CREATE INDEX IF NOT EXISTS idx_users_created ON users (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_users_phone ON users (phone)',
+    ]),
+    (2, '图书全文索引 (FTS5 trigram) 及同步触发器', lambda cursor: create_fts(cursor, BASE_FTS_COLUMNS)),
+    (3, '书名排序的分页索引', [
+        # 无关键词搜索：ORDER BY title, id
+        'CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)',
+        # 分类搜索：WHERE category = ? ORDER BY title, id；同时覆盖 DISTINCT category
+        'CREATE INDEX IF NOT EXISTS idx_books_category_title ON books (category, title)',
+        'DROP INDEX IF EXISTS idx_books_category',
+    ]),
+    (4, '按表记录数据版本号（用于 ETag 条件请求）', [
+        '''CREATE TABLE IF NOT EXISTS data_versions (
+               name TEXT PRIMARY KEY,
+               version INTEGER NOT NULL DEFAULT 0
+           )''',
+        "INSERT OR IGNORE INTO data_versions (name, version) VALUES ('books', 0), ('borrowing_records', 0)",
+        '''CREATE TRIGGER IF NOT EXISTS data_version_books_ai AFTER INSERT ON books BEGIN
+               UPDATE data_versions SET version = version + 1 WHERE name = 'books';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS data_version_books_au AFTER UPDATE ON books BEGIN
+               UPDATE data_versions SET version = version + 1 WHERE name = 'books';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS data_version_books_ad AFTER DELETE ON books BEGIN
+               UPDATE data_versions SET version = version + 1 WHERE name = 'books';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS data_version_borrowing_records_ai AFTER INSERT ON borrowing_records BEGIN
+               UPDATE data_versions SET version = version + 1 WHERE name = 'borrowing_records';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS data_version_borrowing_records_au AFTER UPDATE ON borrowing_records BEGIN
+               UPDATE data_versions SET version = version + 1 WHERE name = 'borrowing_records';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS data_version_borrowing_records_ad AFTER DELETE ON borrowing_records BEGIN
+               UPDATE data_versions SET version = version + 1 WHERE name = 'borrowing_records';
+           END''',
+    ]),
+    (5, '借阅统计物化表及增量维护触发器', create_stats_tables),
+    (6, '图书评分聚合列（rating_sum / rating_count）及分类高分索引', create_rating_aggregates),
+    (7, '借阅记录按借阅日期的范围索引（导出日期过滤）', [
+        'CREATE INDEX IF NOT EXISTS idx_borrowing_borrow_date ON borrowing_records (borrow_date)',
+    ]),
+    (8, '拼音检索列（全拼 / 首字母）并加入全文索引', add_pinyin_column),
+    (9, '出版社筛选的分页索引', [
+        # 分面筛选：WHERE publisher = ? ORDER BY title, id
+        'CREATE INDEX IF NOT EXISTS idx_books_publisher_title ON books (publisher, title)',
+    ]),
+    (10, '图书预约队列', HOLDS_DDL),
+    (11, '逾期检测索引、催还提醒表；逾期记录计入当前借阅统计', create_overdue_tracking),
+    (12, '定时任务租约（多进程只由一个进程执行）', LEASE_DDL),
+    (13, '图书变更日志（多进程同步缓存与索引）', [
+        '''CREATE TABLE IF NOT EXISTS book_changes (
+               seq INTEGER PRIMARY KEY AUTOINCREMENT,
+               book_id INTEGER NOT NULL,
+               catalog INTEGER NOT NULL DEFAULT 0
+           )''',
+        # catalog = 1：新增 / 删除，或书目字段（书名、作者、ISBN、分类、出版社）有变化
+        '''CREATE TRIGGER IF NOT EXISTS book_changes_ai AFTER INSERT ON books BEGIN
+               INSERT INTO book_changes (book_id, catalog) VALUES (NEW.id, 1);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS book_changes_au AFTER UPDATE ON books BEGIN
+               INSERT INTO book_changes (book_id, catalog) VALUES (
+                   NEW.id,
+                   OLD.title IS NOT NEW.title OR OLD.author IS NOT NEW.author OR OLD.isbn IS NOT NEW.isbn
+                   OR OLD.category IS NOT NEW.category OR OLD.publisher IS NOT NEW.publisher
+               );
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS book_changes_ad AFTER DELETE ON books BEGIN
+               INSERT INTO book_changes (book_id, catalog) VALUES (OLD.id, 1);
+           END''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """读取数据库当前结构版本"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn):
+    """执行所有未应用的迁移，返回执行的迁移数量"""
+    applied = 0
+    for version, description, steps in MIGRATIONS:
+        if get_version(conn) >= version:
+            continue
+
+        cursor = conn.cursor()
+        # IMMEDIATE 事务内再次确认版本，避免多个进程同时启动时重复迁移
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            if callable(steps):
+                steps(cursor)
+            else:
+                for statement in steps:
+                    cursor.execute(statement)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied += 1
+        print(f"数据库迁移 v{version}: {description}")
+    return applied
@@ -2,18 +2,18 @@
 数据库模型定义
 包含用户、图书、借阅记录三个核心表
 """
-import sqlite3
 import hashlib
 from datetime import datetime, timedelta
 import json
+import db_pool
+from migrations import apply_migrations
+from pinyin_search import pinyin_key
 
 DATABASE = 'library.db'
 
 def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（从连接池借出，已设置 WAL 等 PRAGMA；close() 时归还连接池）"""
+    return db_pool.get_connection(DATABASE)
 
 def init_db():
     """初始化数据库，创建表结构"""
@@ -84,6 +84,9 @@ def init_db():
 
     conn.commit()
 
+    # 创建索引等后续结构变更
+    apply_migrations(conn)
+
     # 检查是否已有管理员账户，没有则创建默认管理员
     cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
     if cursor.fetchone()[0] == 0:
@@ -97,6 +100,14 @@ def init_db():
     conn.close()
     print("数据库初始化完成！")
 
+def migrate_db():
+    """对已有数据库执行未应用的结构迁移"""
+    conn = get_db()
+    try:
+        return apply_migrations(conn)
+    finally:
+        conn.close()
+
 def hash_password(password):
     """密码哈希加密"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -124,8 +135,8 @@ def insert_sample_books():
     ]
 
     cursor.executemany(
-        'INSERT INTO books (title, author, isbn, category, publisher, total_quantity, available_quantity, description) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
-        sample_books
+        'INSERT INTO books (title, author, isbn, category, publisher, total_quantity, available_quantity, description, pinyin) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [book + (pinyin_key(book[0], book[1]),) for book in sample_books]
     )
 
     conn.commit()
@@ -0,0 +1,93 @@
+"""
+逾期检测
+到期未还的借阅记录由定时任务改为 overdue，并为每条逾期记录写入一条待发送提醒（reminders 表）。
+检测走部分索引 (due_date) WHERE status = 'borrowed' 的范围扫描，只读取已到期的记录；
+每批 BATCH_SIZE 条一个写事务，避免长时间占用写锁。
+
+借阅中（borrowed）与逾期（overdue）都算作未归还：重复借阅检查、删除图书检查、
+借阅统计中的当前借阅数都按 ACTIVE_STATUSES 判断；续借逾期记录后若新的到期时间
+已在未来则恢复为 borrowed。
+
+手动执行一次：python overdue.py
+"""
+from datetime import datetime
+
+from stats import create_stats_tables
+from transactions import run_immediate
+
+BATCH_SIZE = 500
+ACTIVE_STATUSES = ('borrowed', 'overdue')
+
+OVERDUE_DDL = [
+    # 逾期检测：WHERE status = 'borrowed' AND due_date < ? ORDER BY due_date
+    '''CREATE INDEX IF NOT EXISTS idx_borrowing_active_due
+       ON borrowing_records (due_date) WHERE status = 'borrowed' ''',
+    '''CREATE TABLE IF NOT EXISTS reminders (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           record_id INTEGER NOT NULL,
+           user_id INTEGER NOT NULL,
+           kind TEXT NOT NULL,
+           created_at TEXT NOT NULL,
+           sent_at TEXT,
+           UNIQUE (record_id, kind),
+           FOREIGN KEY (record_id) REFERENCES borrowing_records(id),
+           FOREIGN KEY (user_id) REFERENCES users(id)
+       )''',
+    # 待发送提醒：WHERE sent_at IS NULL ORDER BY created_at, id
+    '''CREATE INDEX IF NOT EXISTS idx_reminders_pending
+       ON reminders (created_at, id) WHERE sent_at IS NULL''',
+]
+
+
+def create_overdue_tracking(cursor):
+    """逾期索引与提醒表；借阅统计触发器按新的当前借阅口径重建（迁移中调用）"""
+    for statement in OVERDUE_DDL:
+        cursor.execute(statement)
+    for trigger in ('borrow_stats_ai', 'borrow_stats_ad', 'borrow_stats_au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    create_stats_tables(cursor)
+
+
+def mark_overdue_batch(cursor, now, batch_size=BATCH_SIZE):
+    """把一批已到期的借阅记录改为 overdue 并写入提醒，返回处理的记录数"""
+    cursor.execute(
+        '''SELECT id, user_id FROM borrowing_records
+           WHERE status = 'borrowed' AND due_date < ?
+           ORDER BY due_date LIMIT ?''',
+        (now.isoformat(), batch_size)
+    )
+    records = cursor.fetchall()
+    if not records:
+        return 0
+    cursor.executemany(
+        "UPDATE borrowing_records SET status = 'overdue' WHERE id = ? AND status = 'borrowed'",
+        [(record['id'],) for record in records]
+    )
+    cursor.executemany(
+        '''INSERT OR IGNORE INTO reminders (record_id, user_id, kind, created_at)
+           VALUES (?, ?, 'overdue', ?)''',
+        [(record['id'], record['user_id'], now.isoformat()) for record in records]
+    )
+    return len(records)
+
+
+def mark_overdue(conn, now=None, batch_size=BATCH_SIZE):
+    """分批处理全部已到期记录，返回处理的记录总数"""
+    now = now or datetime.now()
+    total = 0
+    while True:
+        count = run_immediate(conn, lambda cursor: mark_overdue_batch(cursor, now, batch_size))
+        total += count
+        if count < batch_size:
+            return total
+
+
+if __name__ == '__main__':
+    from models import get_db
+
+    conn = get_db()
+    try:
+        marked = mark_overdue(conn)
+    finally:
+        conn.close()
+    print(f"逾期检测完成，新增逾期记录 {marked} 条")
@@ -0,0 +1,111 @@
+"""
+游标（keyset）分页
+列表接口按 (排序键, id) 稳定排序，下一页从上一页最后一行之后继续读取，
+不使用 OFFSET，翻到多深的页都只读取 limit 行。
+游标对客户端是不透明的字符串（base64 编码的排序键值）。
+"""
+import base64
+import json
+import math
+
+from flask import request
+
+from json_provider import RawJSON
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _is_key_value(value):
+    """排序键只能是字符串、有限的数字或 null（布尔值、数组、对象等绑定参数时会出错）"""
+    if value is None or isinstance(value, str):
+        return True
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return True
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def decode_cursor(token):
+    """解析游标为排序键值列表；格式或元素类型不符时抛出 ValueError（个数由 Page.where 按排序列检查）"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('无效的分页游标')
+    if not isinstance(values, list) or not values or not all(_is_key_value(v) for v in values):
+        raise ValueError('无效的分页游标')
+    return values
+
+
+class Page:
+    """一次分页请求的参数（limit 与上一页游标）"""
+
+    def __init__(self, limit=DEFAULT_LIMIT, after=None):
+        self.limit = limit
+        self.after = after
+
+    @classmethod
+    def from_request(cls, default_limit=DEFAULT_LIMIT):
+        """从查询参数 limit / cursor 解析分页参数，参数非法时抛出 ValueError"""
+        limit = request.args.get('limit', default_limit)
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValueError('limit 必须是整数')
+        if limit < 1:
+            raise ValueError('limit 必须大于 0')
+        limit = min(limit, MAX_LIMIT)
+
+        token = request.args.get('cursor')
+        after = decode_cursor(token) if token else None
+        return cls(limit, after)
+
+    @property
+    def fetch_size(self):
+        """多取一行用于判断是否还有下一页"""
+        return self.limit + 1
+
+    def where(self, columns, descending=True):
+        """生成 keyset 条件及参数，如 '(created_at, id) < (?, ?)'；第一页返回恒真条件"""
+        if self.after is None:
+            return '1', []
+        if len(self.after) != len(columns):
+            raise ValueError('无效的分页游标')
+        operator = '<' if descending else '>'
+        placeholders = ', '.join('?' for _ in columns)
+        return f"({', '.join(columns)}) {operator} ({placeholders})", list(self.after)
+
+    @staticmethod
+    def order_by(columns, descending=True):
+        direction = 'DESC' if descending else 'ASC'
+        return ', '.join(f'{column} {direction}' for column in columns)
+
+    def _truncate(self, rows, columns):
+        keys = [column.split('.')[-1] for column in columns]
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = encode_cursor([last[key] for key in keys])
+        return rows, next_cursor
+
+    def collect(self, rows, columns):
+        """把查询结果截断为一页，返回 (字典列表, next_cursor)"""
+        rows, next_cursor = self._truncate(rows, columns)
+        return [dict(row) for row in rows], next_cursor
+
+    def collect_json(self, rows, columns):
+        """
+        同 collect，但每行的第一列是 row_json 生成的 JSON 文本（其余列为排序键），
+        返回 (RawJSON 数组, next_cursor)，不为每行构建字典
+        """
+        rows, next_cursor = self._truncate(rows, columns)
+        return RawJSON('[' + ','.join(row[0] for row in rows) + ']'), next_cursor
@@ -0,0 +1,87 @@
+"""
+拼音 / 首字母检索
+books.pinyin 列预先保存书名、作者的全拼与首字母（如 数据库系统概念 ->
+"shujukuxitonggainian sjkxtgn"），写入图书时计算；该列同时进入全文索引，
+输入 sjk 或 shujuku 走与普通关键词相同的 FTS 检索路径。
+
+拼音转换依赖 pypinyin；未安装时 pinyin 列留空，其余检索不受影响。
+全量重算：python pinyin_search.py
+"""
+import re
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # pragma: no cover - 可选依赖
+    lazy_pinyin = None
+
+HAN_PATTERN = re.compile(r'[一-鿿]+')
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def to_pinyin(text):
+    """返回 (全拼, 首字母)；非中文部分保留字母数字（小写）"""
+    full, initials = [], []
+    position = 0
+    for match in HAN_PATTERN.finditer(text):
+        other = NON_ALNUM.sub('', text[position:match.start()].lower())
+        full.append(other)
+        initials.append(other)
+        syllables = lazy_pinyin(match.group())
+        full.append(''.join(syllables))
+        initials.append(''.join(s[0] for s in syllables if s))
+        position = match.end()
+    other = NON_ALNUM.sub('', text[position:].lower())
+    full.append(other)
+    initials.append(other)
+    return ''.join(full), ''.join(initials)
+
+
+def pinyin_key(title, author=None):
+    """生成 books.pinyin 列的内容；不含中文或未安装 pypinyin 时返回 None"""
+    if lazy_pinyin is None:
+        return None
+    parts = []
+    for text in (title, author):
+        if text and HAN_PATTERN.search(text):
+            parts.extend(to_pinyin(text))
+    return ' '.join(parts) or None
+
+
+def backfill_pinyin(cursor):
+    """为所有图书重新计算拼音列"""
+    cursor.execute('SELECT id, title, author FROM books')
+    rows = cursor.fetchall()
+    cursor.executemany(
+        'UPDATE books SET pinyin = ? WHERE id = ?',
+        [(pinyin_key(row['title'], row['author']), row['id']) for row in rows]
+    )
+
+
+def add_pinyin_column(cursor):
+    """增加 books.pinyin 列并回填，再把该列加入全文索引（迁移中调用）"""
+    from fts import recreate_fts
+
+    cursor.execute('PRAGMA table_info(books)')
+    if 'pinyin' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE books ADD COLUMN pinyin TEXT')
+    if lazy_pinyin is None:
+        print("警告: 未安装 pypinyin，拼音检索不可用（pip install pypinyin 后运行 python pinyin_search.py）")
+    backfill_pinyin(cursor)
+    recreate_fts(cursor)
+
+
+if __name__ == '__main__':
+    from models import get_db
+    from transactions import run_immediate
+
+    if lazy_pinyin is None:
+        print("请先安装 pypinyin: pip install pypinyin")
+        raise SystemExit(1)
+
+    conn = get_db()
+    try:
+        # 全文索引由 books 的更新触发器同步
+        run_immediate(conn, backfill_pinyin)
+    finally:
+        conn.close()
+    print("拼音列重算完成！")
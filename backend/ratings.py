@@ -0,0 +1,55 @@
+"""
+图书评分聚合
+books 表上维护 rating_sum / rating_count，由 borrowing_records.rating 的触发器增量更新，
+列表和详情直接带出评分，渲染每本书的平均分是 O(1)。
+按分类的高分榜通过 (category, 平均分, 评分人数) 表达式索引读取。
+"""
+
+# 平均分表达式；评分人数为 0 时结果为 NULL（SQLite 除以 0 返回 NULL）。
+# 高分榜的 ORDER BY 必须与索引中的表达式完全一致才能走索引
+AVERAGE_RATING = 'rating_sum * 1.0 / rating_count'
+
+RATING_DDL = [
+    '''CREATE TRIGGER IF NOT EXISTS rating_aggregate_ai AFTER INSERT ON borrowing_records
+       WHEN new.rating IS NOT NULL BEGIN
+           UPDATE books SET rating_sum = rating_sum + new.rating, rating_count = rating_count + 1
+               WHERE id = new.book_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS rating_aggregate_au AFTER UPDATE OF rating ON borrowing_records
+       WHEN old.rating IS NOT new.rating BEGIN
+           UPDATE books SET
+               rating_sum = rating_sum + COALESCE(new.rating, 0) - COALESCE(old.rating, 0),
+               rating_count = rating_count + (new.rating IS NOT NULL) - (old.rating IS NOT NULL)
+               WHERE id = new.book_id;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS rating_aggregate_ad AFTER DELETE ON borrowing_records
+       WHEN old.rating IS NOT NULL BEGIN
+           UPDATE books SET rating_sum = rating_sum - old.rating, rating_count = rating_count - 1
+               WHERE id = old.book_id;
+       END''',
+    f'''CREATE INDEX IF NOT EXISTS idx_books_category_rating
+        ON books (category, ({AVERAGE_RATING}), rating_count)''',
+]
+
+
+def create_rating_aggregates(cursor):
+    """为 books 增加评分聚合列、触发器与索引，并按已有评分回填（迁移中调用）"""
+    cursor.execute('PRAGMA table_info(books)')
+    columns = {row[1] for row in cursor.fetchall()}
+    for column in ('rating_sum', 'rating_count'):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE books ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+    for statement in RATING_DDL:
+        cursor.execute(statement)
+    rebuild_rating_aggregates(cursor)
+
+
+def rebuild_rating_aggregates(cursor):
+    """按 borrowing_records 全量重算评分聚合"""
+    cursor.execute(
+        '''UPDATE books SET
+               rating_sum = COALESCE((SELECT SUM(rating) FROM borrowing_records
+                                      WHERE book_id = books.id AND rating IS NOT NULL), 0),
+               rating_count = (SELECT COUNT(rating) FROM borrowing_records
+                               WHERE book_id = books.id)'''
+    )
@@ -2,8 +2,23 @@
 管理员功能API路由
 包括用户管理、图书管理、统计报表等
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from models import get_db
+from pagination import Page
+from json_provider import row_json, table_columns
+from etag import conditional
+from cache import cache_stats
+from bulk_import import detect_format, import_books
+import autocomplete
+import facets
+import availability
+import change_log
+import holds
+import scheduler
+from pinyin_search import pinyin_key
+from export import FORMATS, build_query, stream_export
+from transactions import TransactionAbort, run_immediate
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -27,13 +42,16 @@ def add_book():
 
     try:
         cursor.execute(
-            '''INSERT INTO books (title, author, isbn, category, publisher, total_quantity, available_quantity, description)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-            (title, author, isbn, category, publisher, total_quantity, total_quantity, description)
+            '''INSERT INTO books (title, author, isbn, category, publisher, total_quantity, available_quantity,
+                                  description, pinyin)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (title, author, isbn, category, publisher, total_quantity, total_quantity, description,
+             pinyin_key(title, author))
         )
         conn.commit()
         book_id = cursor.lastrowid
         conn.close()
+        change_log.sync()
 
         return jsonify({
             'success': True,
@@ -44,6 +62,37 @@ def add_book():
         conn.close()
         return jsonify({'success': False, 'message': f'添加失败: {str(e)}'}), 500
 
+@admin_bp.route('/books/import', methods=['POST'])
+def bulk_import_books():
+    """批量导入图书：multipart 上传 file 字段，或直接以请求体流式上传 CSV / JSONL"""
+    upload = request.files.get('file')
+    if upload:
+        stream, filename = upload.stream, upload.filename
+    else:
+        stream, filename = request.stream, ''
+
+    fmt = detect_format(filename, request.args.get('format'))
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': '导入格式只支持 csv 或 jsonl'}), 400
+
+    conn = get_db()
+    try:
+        report = import_books(conn, stream, fmt)
+    except Exception as e:
+        conn.close()
+        # 已提交的块照常同步
+        change_log.sync()
+        return jsonify({'success': False, 'message': f'导入失败: {str(e)}'}), 500
+    conn.close()
+    change_log.sync()
+
+    return jsonify({
+        'success': True,
+        'message': f"导入完成: 新增 {report['inserted']} 本，更新 {report['updated']} 本，"
+                   f"重复 {report['duplicates']} 行，错误 {report['error_count']} 行",
+        'report': report
+    }), 200
+
 @admin_bp.route('/books/update/<int:book_id>', methods=['PUT'])
 def update_book(book_id):
     """更新图书信息"""
@@ -56,36 +105,44 @@ def update_book(book_id):
     total_quantity = data.get('total_quantity')
     description = data.get('description')
 
-    conn = get_db()
-    cursor = conn.cursor()
-
-    # 检查图书是否存在
-    cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
-    book = cursor.fetchone()
-
-    if not book:
-        conn.close()
-        return jsonify({'success': False, 'message': '图书不存在'}), 404
+    def work(cursor):
+        cursor.execute('SELECT total_quantity, available_quantity FROM books WHERE id = ?', (book_id,))
+        book = cursor.fetchone()
+        if not book:
+            raise TransactionAbort('图书不存在', 404)
 
-    try:
-        # 计算可借数量变化
-        borrowed_count = book['total_quantity'] - book['available_quantity']
-        new_available = total_quantity - borrowed_count if total_quantity else book['available_quantity']
+        new_total = book['total_quantity'] if total_quantity is None else total_quantity
+        # 已借出及为预约读者保留的册数
+        in_use = book['total_quantity'] - book['available_quantity']
+        if new_total < in_use:
+            raise TransactionAbort(f'总数量不能少于已借出及预约保留的 {in_use} 本')
+        added = new_total - book['total_quantity']
 
         cursor.execute(
             '''UPDATE books
                SET title = ?, author = ?, isbn = ?, category = ?, publisher = ?,
-                   total_quantity = ?, available_quantity = ?, description = ?
+                   total_quantity = ?, available_quantity = ?, description = ?, pinyin = ?
                WHERE id = ?''',
-            (title, author, isbn, category, publisher, total_quantity, new_available, description, book_id)
+            (title, author, isbn, category, publisher, new_total, book['available_quantity'] + min(added, 0),
+             description, pinyin_key(title, author), book_id)
         )
-        conn.commit()
-        conn.close()
+        # 新增的每一册先分配给排队的预约读者，无人排队时放回可借库存
+        for _ in range(added):
+            holds.release_copy(cursor, book_id)
 
-        return jsonify({'success': True, 'message': '图书更新成功'}), 200
+    conn = get_db()
+    try:
+        run_immediate(conn, work)
+    except TransactionAbort as e:
+        conn.close()
+        return jsonify({'success': False, 'message': e.message}), e.status
     except Exception as e:
         conn.close()
         return jsonify({'success': False, 'message': f'更新失败: {str(e)}'}), 500
+    conn.close()
+    change_log.sync()
+
+    return jsonify({'success': True, 'message': '图书更新成功'}), 200
 
 @admin_bp.route('/books/delete/<int:book_id>', methods=['DELETE'])
 def delete_book(book_id):
@@ -95,8 +152,8 @@ def delete_book(book_id):
 
     # 检查是否有未归还的借阅记录
     cursor.execute(
-        'SELECT COUNT(*) as count FROM borrowing_records WHERE book_id = ? AND status = ?',
-        (book_id, 'borrowed')
+        "SELECT COUNT(*) as count FROM borrowing_records WHERE book_id = ? AND status IN ('borrowed', 'overdue')",
+        (book_id,)
     )
     result = cursor.fetchone()
 
@@ -106,8 +163,15 @@ def delete_book(book_id):
 
     try:
         cursor.execute('DELETE FROM books WHERE id = ?', (book_id,))
+        # 图书删除后，有效的预约一并取消
+        cursor.execute(
+            "UPDATE holds SET status = 'cancelled', closed_at = ? "
+            "WHERE book_id = ? AND status IN ('waiting', 'ready')",
+            (datetime.now().isoformat(), book_id)
+        )
         conn.commit()
         conn.close()
+        change_log.sync()
 
         return jsonify({'success': True, 'message': '图书删除成功'}), 200
     except Exception as e:
@@ -116,17 +180,26 @@ def delete_book(book_id):
 
 @admin_bp.route('/users/list', methods=['GET'])
 def list_users():
-    """获取用户列表"""
+    """获取用户列表（按注册时间倒序，游标分页）"""
+    order = ('created_at', 'id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
     conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute(
-        'SELECT id, username, email, phone, role, special_reader_type, created_at FROM users ORDER BY created_at DESC'
+        f'''SELECT id, username, email, phone, role, special_reader_type, created_at FROM users
+            WHERE {keyset} ORDER BY {page.order_by(order)} LIMIT ?''',
+        (*keyset_params, page.fetch_size)
     )
-    users = [dict(row) for row in cursor.fetchall()]
+    users, next_cursor = page.collect(cursor.fetchall(), order)
     conn.close()
 
-    return jsonify({'success': True, 'users': users}), 200
+    return jsonify({'success': True, 'users': users, 'next_cursor': next_cursor}), 200
 
 @admin_bp.route('/users/statistics', methods=['GET'])
 def user_statistics():
@@ -161,37 +234,33 @@ def user_statistics():
     }), 200
 
 @admin_bp.route('/borrowings/statistics', methods=['GET'])
+@conditional('books', 'borrowing_records')
 def borrowing_statistics():
-    """获取借阅统计信息"""
+    """获取借阅统计信息（读取增量维护的统计表）"""
     conn = get_db()
     cursor = conn.cursor()
 
-    # 总借阅次数
-    cursor.execute('SELECT COUNT(*) as count FROM borrowing_records')
-    total_borrowings = cursor.fetchone()['count']
-
-    # 当前借阅中的图书
-    cursor.execute('SELECT COUNT(*) as count FROM borrowing_records WHERE status = ?', ('borrowed',))
-    current_borrowings = cursor.fetchone()['count']
+    # 总借阅次数、当前借阅中的图书
+    cursor.execute('SELECT total, current FROM borrowing_totals WHERE id = 1')
+    totals = cursor.fetchone()
+    total_borrowings = totals['total'] if totals else 0
+    current_borrowings = totals['current'] if totals else 0
 
     # 最受欢迎的图书
     cursor.execute(
-        '''SELECT b.title, b.author, COUNT(*) as borrow_count
-           FROM borrowing_records br
-           JOIN books b ON br.book_id = b.id
-           GROUP BY br.book_id
-           ORDER BY borrow_count DESC
+        '''SELECT b.title, b.author, s.borrow_count
+           FROM book_borrow_stats s
+           JOIN books b ON s.book_id = b.id
+           WHERE s.borrow_count > 0
+           ORDER BY s.borrow_count DESC
            LIMIT 10'''
     )
     popular_books = [dict(row) for row in cursor.fetchall()]
 
     # 按分类统计借阅
     cursor.execute(
-        '''SELECT b.category, COUNT(*) as borrow_count
-           FROM borrowing_records br
-           JOIN books b ON br.book_id = b.id
-           WHERE b.category IS NOT NULL
-           GROUP BY b.category
+        '''SELECT category, borrow_count
+           FROM category_borrow_stats
            ORDER BY borrow_count DESC'''
     )
     category_stats = [dict(row) for row in cursor.fetchall()]
@@ -206,22 +275,123 @@ def borrowing_statistics():
         'category_stats': category_stats
     }), 200
 
+@admin_bp.route('/cache/statistics', methods=['GET'])
+def cache_statistics():
+    """获取目录缓存命中统计、联想 / 分面索引内存占用、库存推送连接数与定时任务状态"""
+    return jsonify({
+        'success': True,
+        'caches': cache_stats(),
+        'suggest_index': autocomplete.stats(),
+        'facet_index': facets.stats(),
+        'availability_stream': availability.broker.stats(),
+        'scheduler': scheduler.stats(),
+        'change_log': change_log.stats()
+    }), 200
+
 @admin_bp.route('/feedback/list', methods=['GET'])
 def list_feedback():
-    """获取反馈列表"""
+    """获取反馈列表（按提交时间倒序，游标分页）"""
+    order = ('f.created_at', 'f.id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        f'''SELECT {row_json(table_columns(cursor, 'feedback', 'f') + ['u.username'])}, f.created_at, f.id
+            FROM feedback f
+            JOIN users u ON f.user_id = u.id
+            WHERE {keyset}
+            ORDER BY {page.order_by(order)}
+            LIMIT ?''',
+        (*keyset_params, page.fetch_size)
+    )
+    feedbacks, next_cursor = page.collect_json(cursor.fetchall(), order)
+    conn.close()
+
+    return jsonify({'success': True, 'feedbacks': feedbacks, 'next_cursor': next_cursor}), 200
+
+@admin_bp.route('/reminders/pending', methods=['GET'])
+def list_pending_reminders():
+    """获取待发送的催还提醒（按生成时间正序，游标分页）"""
+    order = ('r.created_at', 'r.id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order, descending=False)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
     conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute(
-        '''SELECT f.*, u.username
-           FROM feedback f
-           JOIN users u ON f.user_id = u.id
-           ORDER BY f.created_at DESC'''
+        f'''SELECT r.id, r.record_id, r.kind, r.created_at, r.user_id, u.username, u.email, u.phone,
+                   b.title, br.due_date, br.status
+            FROM reminders r
+            JOIN users u ON r.user_id = u.id
+            JOIN borrowing_records br ON r.record_id = br.id
+            JOIN books b ON br.book_id = b.id
+            WHERE r.sent_at IS NULL AND {keyset}
+            ORDER BY {page.order_by(order, descending=False)}
+            LIMIT ?''',
+        (*keyset_params, page.fetch_size)
     )
-    feedbacks = [dict(row) for row in cursor.fetchall()]
+    reminders, next_cursor = page.collect(cursor.fetchall(), order)
     conn.close()
 
-    return jsonify({'success': True, 'feedbacks': feedbacks}), 200
+    return jsonify({'success': True, 'reminders': reminders, 'next_cursor': next_cursor}), 200
+
+@admin_bp.route('/reminders/sent', methods=['PUT'])
+def mark_reminders_sent():
+    """把提醒标记为已发送（由通知渠道发送成功后调用）"""
+    data = request.json or {}
+    reminder_ids = data.get('reminder_ids')
+    if not isinstance(reminder_ids, list) or not all(isinstance(i, int) for i in reminder_ids):
+        return jsonify({'success': False, 'message': 'reminder_ids 必须是整数列表'}), 400
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.executemany(
+            'UPDATE reminders SET sent_at = ? WHERE id = ? AND sent_at IS NULL',
+            [(datetime.now().isoformat(), reminder_id) for reminder_id in reminder_ids]
+        )
+        updated = cursor.rowcount
+        conn.commit()
+        conn.close()
+
+        return jsonify({'success': True, 'updated': updated}), 200
+    except Exception as e:
+        conn.close()
+        return jsonify({'success': False, 'message': f'更新失败: {str(e)}'}), 500
+
+@admin_bp.route('/export/<dataset>', methods=['GET'])
+def export_data(dataset):
+    """流式导出图书 / 借阅记录 / 反馈（format=csv|ndjson，gzip=1，from / to 日期过滤）"""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'message': '导出格式只支持 csv 或 ndjson'}), 400
+    compress = request.args.get('gzip') in ('1', 'true')
+
+    try:
+        sql, params = build_query(dataset, request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    if compress:
+        filename += '.gz'
+    response = Response(
+        stream_export(sql, params, fmt, compress),
+        content_type='application/gzip' if compress else FORMATS[fmt]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @admin_bp.route('/feedback/reply/<int:feedback_id>', methods=['PUT'])
 def reply_feedback(feedback_id):
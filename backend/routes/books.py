@@ -2,131 +2,356 @@
 图书管理相关API路由
 包括搜索、借阅、归还、续借等功能
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from models import get_db
+from fts import FTS_TABLE, build_match_query, bm25_expression, fts_available
+from pagination import Page
+from json_provider import row_json, table_columns
+from etag import conditional
+from cache import CATEGORIES_KEY, book_cache, category_cache
+from ratings import AVERAGE_RATING
+import fuzzy_index
+import autocomplete
+import facets
+import availability
+import change_log
+import holds
+from transactions import TransactionAbort, is_busy_error, run_immediate, run_items
+from overdue import ACTIVE_STATUSES
 from datetime import datetime, timedelta
 
 books_bp = Blueprint('books', __name__)
 
+# 批量借还接口单次最多处理的图书数
+MAX_BATCH_SIZE = 20
+
 @books_bp.route('/search', methods=['GET'])
 def search_books():
-    """搜索图书"""
+    """
+    搜索图书（游标分页；fuzzy=1 时使用容错模糊检索）
+    关键词可与分类、出版社、仅可借（available=1）组合筛选；facets=1 时同时返回分面计数
+    """
     query = request.args.get('query', '')
     category = request.args.get('category', '')
+    publisher = request.args.get('publisher', '')
+    available_only = request.args.get('available') in ('1', 'true')
+
+    if query and request.args.get('fuzzy') in ('1', 'true'):
+        return fuzzy_search_books(query, category, publisher, available_only)
+
+    # 全文检索按相关度排序，其余按书名排序
+    match_query, short_terms = build_match_query(query) if query else (None, [])
 
     conn = get_db()
     cursor = conn.cursor()
+    use_fts = match_query is not None and fts_available(cursor)
+    order = ('score', 'id') if use_fts else ('title', 'id')
 
-    if category:
-        cursor.execute(
-            'SELECT * FROM books WHERE category = ? ORDER BY title',
-            (category,)
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order, descending=False)
+    except ValueError as e:
+        conn.close()
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # 关键词条件（图书表别名为 b）
+    if use_fts:
+        # 全文索引检索，按相关度排序；过短的词在索引结果上用 LIKE 过滤
+        source = f'{FTS_TABLE} JOIN books b ON b.id = {FTS_TABLE}.rowid'
+        text_condition = f'{FTS_TABLE} MATCH ?' + ''.join(
+            ' AND (b.title LIKE ? OR b.author LIKE ? OR b.isbn LIKE ? OR b.pinyin LIKE ?)'
+            for _ in short_terms
         )
+        text_params = [match_query]
+        for term in short_terms:
+            text_params.extend([f'%{term}%'] * 4)
     elif query:
-        search_pattern = f'%{query}%'
-        cursor.execute(
-            '''SELECT * FROM books
-               WHERE title LIKE ? OR author LIKE ? OR isbn LIKE ?
-               ORDER BY title''',
-            (search_pattern, search_pattern, search_pattern)
-        )
+        # 查询词过短（少于 3 个字符）时无法使用 trigram 索引
+        source = 'books b'
+        text_condition = '(b.title LIKE ? OR b.author LIKE ? OR b.isbn LIKE ? OR b.pinyin LIKE ?)'
+        text_params = [f'%{query}%'] * 4
     else:
-        cursor.execute('SELECT * FROM books ORDER BY title LIMIT 50')
+        source = 'books b'
+        text_condition = '1'
+        text_params = []
 
-    books = [dict(row) for row in cursor.fetchall()]
+    filters, filter_params = book_filters(category, publisher, available_only)
+    score = f', {bm25_expression()} AS score' if use_fts else ''
+    columns = table_columns(cursor, 'books') + (['score'] if use_fts else [])
+    cursor.execute(
+        f'''SELECT {row_json(columns)}, {', '.join(order)} FROM (
+                SELECT b.*{score} FROM {source}
+                WHERE {text_condition}{filters}
+            ) WHERE {keyset}
+            ORDER BY {page.order_by(order, descending=False)} LIMIT ?''',
+        (*text_params, *filter_params, *keyset_params, page.fetch_size)
+    )
+    books, next_cursor = page.collect_json(cursor.fetchall(), order)
+    result = {'success': True, 'books': books, 'next_cursor': next_cursor}
+
+    if request.args.get('facets') in ('1', 'true'):
+        matched_ids = None
+        if query:
+            cursor.execute(f'SELECT b.id FROM {source} WHERE {text_condition}', text_params)
+            matched_ids = (row[0] for row in cursor.fetchall())
+        result['facets'] = facets.facet_counts(cursor, matched_ids, category, publisher, available_only)
     conn.close()
 
-    return jsonify({'success': True, 'books': books}), 200
+    return jsonify(result), 200
+
+def book_filters(category, publisher, available_only):
+    """分类、出版社、仅可借筛选条件（图书表别名为 b），返回 (SQL 片段, 参数)"""
+    filters, params = '', []
+    if category:
+        filters += ' AND b.category = ?'
+        params.append(category)
+    if publisher:
+        filters += ' AND b.publisher = ?'
+        params.append(publisher)
+    if available_only:
+        filters += ' AND b.available_quantity > 0'
+    return filters, params
+
+def fuzzy_search_books(query, category='', publisher='', available_only=False):
+    """容错模糊检索：在满足筛选条件的图书中按相似度返回前 limit 本（结果为排名前列，不分页）"""
+    try:
+        page = Page.from_request(default_limit=20)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    conn = get_db()
+    cursor = conn.cursor()
+    index = fuzzy_index.get_index(cursor)
+    filters, filter_params = book_filters(category, publisher, available_only)
+    allowed = None
+    if filters:
+        cursor.execute(f'SELECT b.id FROM books b WHERE 1{filters}', filter_params)
+        allowed = {row[0] for row in cursor.fetchall()}
+
+    scores = dict(index.search(query, page.limit, allowed))
+    books = []
+    if scores:
+        placeholders = ', '.join('?' for _ in scores)
+        cursor.execute(f'SELECT * FROM books WHERE id IN ({placeholders})', list(scores))
+        books = [dict(row, fuzzy_score=round(scores[row['id']], 4)) for row in cursor.fetchall()]
+        books.sort(key=lambda book: (-book['fuzzy_score'], book['id']))
+    result = {'success': True, 'books': books, 'next_cursor': None}
+
+    if request.args.get('facets') in ('1', 'true'):
+        # 分面计数按全部模糊命中的图书计算（各维度口径与普通检索相同）
+        matched_ids = [book_id for book_id, _ in index.search(query, None)]
+        result['facets'] = facets.facet_counts(cursor, matched_ids, category, publisher, available_only)
+    conn.close()
+    return jsonify(result), 200
+
+@books_bp.route('/suggest', methods=['GET'])
+def suggest_books():
+    """搜索框前缀联想（内存索引，按借阅热度排序）"""
+    prefix = request.args.get('prefix', '').strip()
+    try:
+        limit = int(request.args.get('limit', 8))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit 必须是整数'}), 400
+    if not 1 <= limit <= 20:
+        return jsonify({'success': False, 'message': 'limit 必须在 1 到 20 之间'}), 400
+
+    suggestions = autocomplete.suggest(prefix, limit) if prefix else []
+    return jsonify({'success': True, 'suggestions': suggestions}), 200
+
+@books_bp.route('/availability/stream', methods=['GET'])
+def availability_stream():
+    """
+    库存变化 SSE 推送；book_ids=1,2,3 只订阅指定图书。
+    断线重连时浏览器自动携带 Last-Event-ID，从该事件之后补发。
+    """
+    book_ids = None
+    if request.args.get('book_ids'):
+        try:
+            book_ids = {int(value) for value in request.args['book_ids'].split(',') if value.strip()}
+        except ValueError:
+            return jsonify({'success': False, 'message': 'book_ids 必须是逗号分隔的整数'}), 400
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription, replay, reset_id = availability.broker.subscribe(last_event_id, book_ids)
+    if subscription is None:
+        return jsonify({'success': False, 'message': '推送连接数已满，请稍后重试'}), 503
+
+    return Response(
+        availability.stream(subscription, replay, reset_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @books_bp.route('/list', methods=['GET'])
+@conditional('books')
 def list_books():
-    """获取所有图书列表"""
+    """获取图书列表（按入库时间倒序，游标分页）"""
+    order = ('created_at', 'id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
     conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM books ORDER BY created_at DESC')
-    books = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(
+        f'''SELECT {row_json(table_columns(cursor, 'books'))}, created_at, id FROM books
+            WHERE {keyset} ORDER BY {page.order_by(order)} LIMIT ?''',
+        (*keyset_params, page.fetch_size)
+    )
+    books, next_cursor = page.collect_json(cursor.fetchall(), order)
     conn.close()
 
-    return jsonify({'success': True, 'books': books}), 200
+    return jsonify({'success': True, 'books': books, 'next_cursor': next_cursor}), 200
 
 @books_bp.route('/detail/<int:book_id>', methods=['GET'])
 def get_book_detail(book_id):
-    """获取图书详情"""
-    conn = get_db()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
-    book = cursor.fetchone()
-    conn.close()
+    """获取图书详情（优先读取目录缓存）"""
+    book = book_cache.get_or_load(book_id, lambda: load_book(book_id))
 
     if book:
-        return jsonify({'success': True, 'book': dict(book)}), 200
+        return jsonify({'success': True, 'book': book}), 200
     else:
         return jsonify({'success': False, 'message': '图书不存在'}), 404
 
-@books_bp.route('/borrow', methods=['POST'])
-def borrow_book():
-    """借阅图书"""
-    data = request.json
-    user_id = data.get('user_id')
-    book_id = data.get('book_id')
-
-    if not user_id or not book_id:
-        return jsonify({'success': False, 'message': '用户ID和图书ID不能为空'}), 400
-
+def load_book(book_id):
+    """从数据库读取单本图书，不存在时返回 None"""
     conn = get_db()
     cursor = conn.cursor()
-
-    # 检查图书是否可借
     cursor.execute('SELECT * FROM books WHERE id = ?', (book_id,))
     book = cursor.fetchone()
+    conn.close()
+    return dict(book) if book else None
 
-    if not book:
-        conn.close()
-        return jsonify({'success': False, 'message': '图书不存在'}), 404
-
-    if book['available_quantity'] <= 0:
-        conn.close()
-        return jsonify({'success': False, 'message': '图书库存不足'}), 400
-
+def _borrow(cursor, user_id, book_id):
+    """在已开启的写事务中借出一本书，返回 (record_id, due_date)"""
     # 检查用户是否已借阅该书且未归还
     cursor.execute(
-        'SELECT * FROM borrowing_records WHERE user_id = ? AND book_id = ? AND status = ?',
-        (user_id, book_id, 'borrowed')
+        "SELECT 1 FROM borrowing_records WHERE user_id = ? AND book_id = ? AND status IN ('borrowed', 'overdue')",
+        (user_id, book_id)
     )
     if cursor.fetchone():
-        conn.close()
-        return jsonify({'success': False, 'message': '您已借阅该图书，请先归还'}), 400
+        raise TransactionAbort('您已借阅该图书，请先归还')
+
+    # 领取为该读者保留的预约图书（保留时已从可借库存中扣除）；否则条件扣减库存，库存为 0 时不会更新任何行
+    if not holds.claim_hold(cursor, user_id, book_id):
+        cursor.execute(
+            'UPDATE books SET available_quantity = available_quantity - 1 WHERE id = ? AND available_quantity > 0',
+            (book_id,)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute('SELECT 1 FROM books WHERE id = ?', (book_id,))
+            if not cursor.fetchone():
+                raise TransactionAbort('图书不存在', 404)
+            raise TransactionAbort('图书库存不足，可预约排队')
+        holds.close_waiting(cursor, user_id, book_id)
 
     # 创建借阅记录
     borrow_date = datetime.now().isoformat()
     due_date = (datetime.now() + timedelta(days=30)).isoformat()
+    cursor.execute(
+        '''INSERT INTO borrowing_records (user_id, book_id, borrow_date, due_date, status)
+           VALUES (?, ?, ?, ?, ?)''',
+        (user_id, book_id, borrow_date, due_date, 'borrowed')
+    )
+    return cursor.lastrowid, due_date
 
-    try:
-        cursor.execute(
-            '''INSERT INTO borrowing_records (user_id, book_id, borrow_date, due_date, status)
-               VALUES (?, ?, ?, ?, ?)''',
-            (user_id, book_id, borrow_date, due_date, 'borrowed')
-        )
+def _return(cursor, record_id):
+    """在已开启的写事务中归还一条借阅记录，返回图书ID"""
+    cursor.execute('SELECT book_id, status FROM borrowing_records WHERE id = ?', (record_id,))
+    record = cursor.fetchone()
 
-        # 更新图书库存
-        cursor.execute(
-            'UPDATE books SET available_quantity = available_quantity - 1 WHERE id = ?',
-            (book_id,)
-        )
+    if not record:
+        raise TransactionAbort('借阅记录不存在', 404)
 
-        conn.commit()
-        record_id = cursor.lastrowid
-        conn.close()
+    if record['status'] == 'returned':
+        raise TransactionAbort('该图书已归还')
 
-        return jsonify({
-            'success': True,
-            'message': '借阅成功',
-            'record_id': record_id,
-            'due_date': due_date
-        }), 201
+    # 状态条件更新，保证同一记录只会归还一次
+    cursor.execute(
+        'UPDATE borrowing_records SET return_date = ?, status = ? WHERE id = ? AND status != ?',
+        (datetime.now().isoformat(), 'returned', record_id, 'returned')
+    )
+    if cursor.rowcount == 0:
+        raise TransactionAbort('该图书已归还')
+
+    # 有人预约则直接保留给队首读者，否则放回可借库存
+    holds.release_copy(cursor, record['book_id'])
+    return record['book_id']
+
+def _renew(cursor, record_id):
+    """在已开启的写事务中续借，返回新的到期时间"""
+    cursor.execute('SELECT book_id, status, due_date FROM borrowing_records WHERE id = ?', (record_id,))
+    record = cursor.fetchone()
+
+    if not record:
+        raise TransactionAbort('借阅记录不存在', 404)
+
+    if record['status'] not in ACTIVE_STATUSES:
+        raise TransactionAbort('该图书不在借阅状态')
+
+    if holds.has_waiting_holds(cursor, record['book_id']):
+        raise TransactionAbort('该图书已有读者预约，无法续借')
+
+    # 续借：延长30天
+    current_due_date = datetime.fromisoformat(record['due_date'])
+    new_due_date = (current_due_date + timedelta(days=30)).isoformat()
+    # 逾期记录续借后新的到期时间已在未来时恢复为借阅中
+    new_status = 'borrowed' if new_due_date > datetime.now().isoformat() else 'overdue'
+
+    cursor.execute(
+        'UPDATE borrowing_records SET due_date = ?, status = ? WHERE id = ? AND status = ? AND due_date = ?',
+        (new_due_date, new_status, record_id, record['status'], record['due_date'])
+    )
+    if cursor.rowcount == 0:
+        raise TransactionAbort('该图书不在借阅状态')
+    return new_due_date
+
+def notify_stock_changed(*book_ids):
+    """借还、预约提交后调用：图书行的变化已由触发器记入变更日志，立即同步本进程的缓存、索引并推送库存"""
+    if book_ids:
+        change_log.sync()
+
+def _write_error(e, action):
+    """写事务异常转换为响应：数据库繁忙返回 503，其余返回 500"""
+    if is_busy_error(e):
+        return jsonify({'success': False, 'message': '系统繁忙，请稍后重试'}), 503
+    return jsonify({'success': False, 'message': f'{action}失败: {str(e)}'}), 500
+
+@books_bp.route('/borrow', methods=['POST'])
+def borrow_book():
+    """借阅图书"""
+    data = request.json
+    user_id = data.get('user_id')
+    book_id = data.get('book_id')
+
+    if not user_id or not book_id:
+        return jsonify({'success': False, 'message': '用户ID和图书ID不能为空'}), 400
+
+    conn = get_db()
+    try:
+        record_id, due_date = run_immediate(conn, lambda cursor: _borrow(cursor, user_id, book_id))
+    except TransactionAbort as e:
+        conn.close()
+        return jsonify({'success': False, 'message': e.message}), e.status
     except Exception as e:
         conn.close()
-        return jsonify({'success': False, 'message': f'借阅失败: {str(e)}'}), 500
+        return _write_error(e, '借阅')
+    conn.close()
+    notify_stock_changed(book_id)
+
+    return jsonify({
+        'success': True,
+        'message': '借阅成功',
+        'record_id': record_id,
+        'due_date': due_date
+    }), 201
 
 @books_bp.route('/return', methods=['POST'])
 def return_book():
@@ -138,42 +363,18 @@ def return_book():
         return jsonify({'success': False, 'message': '借阅记录ID不能为空'}), 400
 
     conn = get_db()
-    cursor = conn.cursor()
-
-    # 查询借阅记录
-    cursor.execute('SELECT * FROM borrowing_records WHERE id = ?', (record_id,))
-    record = cursor.fetchone()
-
-    if not record:
-        conn.close()
-        return jsonify({'success': False, 'message': '借阅记录不存在'}), 404
-
-    if record['status'] == 'returned':
-        conn.close()
-        return jsonify({'success': False, 'message': '该图书已归还'}), 400
-
-    # 更新借阅记录
-    return_date = datetime.now().isoformat()
-
     try:
-        cursor.execute(
-            'UPDATE borrowing_records SET return_date = ?, status = ? WHERE id = ?',
-            (return_date, 'returned', record_id)
-        )
-
-        # 更新图书库存
-        cursor.execute(
-            'UPDATE books SET available_quantity = available_quantity + 1 WHERE id = ?',
-            (record['book_id'],)
-        )
-
-        conn.commit()
+        book_id = run_immediate(conn, lambda cursor: _return(cursor, record_id))
+    except TransactionAbort as e:
         conn.close()
-
-        return jsonify({'success': True, 'message': '归还成功'}), 200
+        return jsonify({'success': False, 'message': e.message}), e.status
     except Exception as e:
         conn.close()
-        return jsonify({'success': False, 'message': f'归还失败: {str(e)}'}), 500
+        return _write_error(e, '归还')
+    conn.close()
+    notify_stock_changed(book_id)
+
+    return jsonify({'success': True, 'message': '归还成功'}), 200
 
 @books_bp.route('/renew', methods=['POST'])
 def renew_book():
@@ -185,69 +386,240 @@ def renew_book():
         return jsonify({'success': False, 'message': '借阅记录ID不能为空'}), 400
 
     conn = get_db()
-    cursor = conn.cursor()
+    try:
+        new_due_date = run_immediate(conn, lambda cursor: _renew(cursor, record_id))
+    except TransactionAbort as e:
+        conn.close()
+        return jsonify({'success': False, 'message': e.message}), e.status
+    except Exception as e:
+        conn.close()
+        return _write_error(e, '续借')
+    conn.close()
 
-    # 查询借阅记录
-    cursor.execute('SELECT * FROM borrowing_records WHERE id = ?', (record_id,))
-    record = cursor.fetchone()
+    return jsonify({
+        'success': True,
+        'message': '续借成功',
+        'new_due_date': new_due_date
+    }), 200
+
+def _batch_ids(data, key):
+    """读取并校验批量接口的ID列表，非法时返回错误信息"""
+    ids = data.get(key)
+    if not isinstance(ids, list) or not ids:
+        return None, f'{key} 必须是非空列表'
+    if len(ids) > MAX_BATCH_SIZE:
+        return None, f'单次最多处理 {MAX_BATCH_SIZE} 本图书'
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None, f'{key} 必须是整数ID列表'
+    return ids, None
+
+def _batch_response(action, id_key, results, build_success):
+    """把逐项结果整理成批量接口响应"""
+    items = []
+    for item, ok, value in results:
+        entry = {id_key: item, 'success': ok}
+        if ok:
+            entry.update(build_success(value))
+        else:
+            entry['message'] = value
+        items.append(entry)
+    succeeded = sum(1 for entry in items if entry['success'])
+    failed = len(items) - succeeded
+    return jsonify({
+        'success': True,
+        'message': f'批量{action}完成: 成功 {succeeded} 本，失败 {failed} 本',
+        'succeeded': succeeded,
+        'failed': failed,
+        'results': items
+    }), 200
+
+@books_bp.route('/borrow/batch', methods=['POST'])
+def borrow_books_batch():
+    """批量借阅（自助机一次扫描多本书，单事务单次提交）"""
+    data = request.json
+    user_id = data.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': '用户ID不能为空'}), 400
+    book_ids, error = _batch_ids(data, 'book_ids')
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
 
-    if not record:
+    conn = get_db()
+    try:
+        results = run_immediate(conn, lambda cursor: run_items(
+            cursor, book_ids, lambda c, book_id: _borrow(c, user_id, book_id)
+        ))
+    except Exception as e:
         conn.close()
-        return jsonify({'success': False, 'message': '借阅记录不存在'}), 404
+        return _write_error(e, '批量借阅')
+    conn.close()
+    notify_stock_changed(*(book_id for book_id, ok, _ in results if ok))
 
-    if record['status'] != 'borrowed':
+    return _batch_response('借阅', 'book_id', results, lambda value: {
+        'record_id': value[0],
+        'due_date': value[1]
+    })
+
+@books_bp.route('/return/batch', methods=['POST'])
+def return_books_batch():
+    """批量归还（单事务单次提交）"""
+    data = request.json
+    record_ids, error = _batch_ids(data, 'record_ids')
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    conn = get_db()
+    try:
+        results = run_immediate(conn, lambda cursor: run_items(cursor, record_ids, _return))
+    except Exception as e:
         conn.close()
-        return jsonify({'success': False, 'message': '该图书不在借阅状态'}), 400
+        return _write_error(e, '批量归还')
+    conn.close()
+    notify_stock_changed(*(book_id for _, ok, book_id in results if ok))
 
-    # 续借：延长30天
-    current_due_date = datetime.fromisoformat(record['due_date'])
-    new_due_date = (current_due_date + timedelta(days=30)).isoformat()
+    return _batch_response('归还', 'record_id', results, lambda value: {'book_id': value})
 
+@books_bp.route('/renew/batch', methods=['POST'])
+def renew_books_batch():
+    """批量续借（单事务单次提交）"""
+    data = request.json
+    record_ids, error = _batch_ids(data, 'record_ids')
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+
+    conn = get_db()
     try:
-        cursor.execute(
-            'UPDATE borrowing_records SET due_date = ? WHERE id = ?',
-            (new_due_date, record_id)
-        )
-        conn.commit()
+        results = run_immediate(conn, lambda cursor: run_items(cursor, record_ids, _renew))
+    except Exception as e:
         conn.close()
+        return _write_error(e, '批量续借')
+    conn.close()
 
-        return jsonify({
-            'success': True,
-            'message': '续借成功',
-            'new_due_date': new_due_date
-        }), 200
+    return _batch_response('续借', 'record_id', results, lambda value: {'new_due_date': value})
+
+@books_bp.route('/hold', methods=['POST'])
+def place_hold():
+    """预约无库存的图书，归还时按队列顺序保留给预约读者"""
+    data = request.json
+    user_id = data.get('user_id')
+    book_id = data.get('book_id')
+
+    if not user_id or not book_id:
+        return jsonify({'success': False, 'message': '用户ID和图书ID不能为空'}), 400
+
+    conn = get_db()
+    try:
+        hold_id, position = run_immediate(conn, lambda cursor: holds.place_hold(cursor, user_id, book_id))
+    except TransactionAbort as e:
+        conn.close()
+        return jsonify({'success': False, 'message': e.message}), e.status
+    except Exception as e:
+        conn.close()
+        return _write_error(e, '预约')
+    conn.close()
+
+    return jsonify({
+        'success': True,
+        'message': f'预约成功，当前排在第 {position} 位',
+        'hold_id': hold_id,
+        'position': position
+    }), 201
+
+@books_bp.route('/hold/cancel', methods=['POST'])
+def cancel_hold():
+    """取消预约；已保留的图书转给下一位预约读者"""
+    data = request.json
+    hold_id = data.get('hold_id')
+
+    if not hold_id:
+        return jsonify({'success': False, 'message': '预约ID不能为空'}), 400
+
+    conn = get_db()
+    try:
+        book_id = run_immediate(conn, lambda cursor: holds.cancel_hold(cursor, hold_id))
+    except TransactionAbort as e:
+        conn.close()
+        return jsonify({'success': False, 'message': e.message}), e.status
     except Exception as e:
         conn.close()
-        return jsonify({'success': False, 'message': f'续借失败: {str(e)}'}), 500
+        return _write_error(e, '取消预约')
+    conn.close()
+    notify_stock_changed(book_id)
+
+    return jsonify({'success': True, 'message': '预约已取消'}), 200
+
+@books_bp.route('/holds/my/<int:user_id>', methods=['GET'])
+def get_my_holds(user_id):
+    """获取用户的预约（按预约时间倒序，游标分页）；等待中的预约附带排队位置"""
+    order = ('h.requested_at', 'h.id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    conn = get_db()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        f'''SELECT h.*, b.title, b.author, b.isbn
+            FROM holds h
+            JOIN books b ON h.book_id = b.id
+            WHERE h.user_id = ? AND {keyset}
+            ORDER BY {page.order_by(order)}
+            LIMIT ?''',
+        (user_id, *keyset_params, page.fetch_size)
+    )
+    records, next_cursor = page.collect(cursor.fetchall(), order)
+    for record in records:
+        if record['status'] == 'waiting':
+            record['position'] = holds.queue_position(cursor, record)
+    conn.close()
+
+    return jsonify({'success': True, 'holds': records, 'next_cursor': next_cursor}), 200
 
 @books_bp.route('/my-borrowings/<int:user_id>', methods=['GET'])
 def get_my_borrowings(user_id):
-    """获取用户的借阅记录"""
+    """获取用户的借阅记录（按借阅时间倒序，游标分页）"""
+    order = ('br.borrow_date', 'br.id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
     conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute(
-        '''SELECT br.*, b.title, b.author, b.isbn
-           FROM borrowing_records br
-           JOIN books b ON br.book_id = b.id
-           WHERE br.user_id = ?
-           ORDER BY br.borrow_date DESC''',
-        (user_id,)
+        f'''SELECT br.*, b.title, b.author, b.isbn
+            FROM borrowing_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.user_id = ? AND {keyset}
+            ORDER BY {page.order_by(order)}
+            LIMIT ?''',
+        (user_id, *keyset_params, page.fetch_size)
     )
 
-    records = [dict(row) for row in cursor.fetchall()]
+    records, next_cursor = page.collect(cursor.fetchall(), order)
     conn.close()
 
-    return jsonify({'success': True, 'records': records}), 200
+    return jsonify({'success': True, 'records': records, 'next_cursor': next_cursor}), 200
 
-@books_bp.route('/categories', methods=['GET'])
-def get_categories():
-    """获取所有图书分类"""
+def load_categories():
+    """从数据库读取分类列表"""
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('SELECT DISTINCT category FROM books WHERE category IS NOT NULL ORDER BY category')
     categories = [row['category'] for row in cursor.fetchall()]
     conn.close()
+    return categories
+
+@books_bp.route('/categories', methods=['GET'])
+@conditional('books')
+def get_categories():
+    """获取所有图书分类（优先读取目录缓存）"""
+    categories = category_cache.get_or_load(CATEGORIES_KEY, load_categories)
 
     return jsonify({'success': True, 'categories': categories}), 200
 
@@ -280,17 +652,49 @@ def rate_book():
         return jsonify({'success': False, 'message': '只能对已归还的图书进行评分'}), 400
 
     try:
+        # 触发器同步更新图书的 rating_sum / rating_count
         cursor.execute(
             'UPDATE borrowing_records SET rating = ? WHERE id = ?',
             (rating, record_id)
         )
         conn.commit()
         conn.close()
+        change_log.sync()
         return jsonify({'success': True, 'message': '评分成功'}), 200
     except Exception as e:
         conn.close()
         return jsonify({'success': False, 'message': f'评分失败: {str(e)}'}), 500
 
+@books_bp.route('/top-rated', methods=['GET'])
+def top_rated_books():
+    """获取分类内平均评分最高的图书"""
+    category = request.args.get('category', '')
+    if not category:
+        return jsonify({'success': False, 'message': '分类不能为空'}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+        min_ratings = max(int(request.args.get('min_ratings', 1)), 1)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit 和 min_ratings 必须是整数'}), 400
+    if limit < 1:
+        return jsonify({'success': False, 'message': 'limit 必须大于 0'}), 400
+
+    conn = get_db()
+    cursor = conn.cursor()
+    # ORDER BY 与 idx_books_category_rating 的表达式一致，按索引顺序读取前 limit 行
+    cursor.execute(
+        f'''SELECT *, {AVERAGE_RATING} AS average_rating FROM books
+            WHERE category = ? AND rating_count >= ?
+            ORDER BY ({AVERAGE_RATING}) DESC, rating_count DESC
+            LIMIT ?''',
+        (category, min_ratings, limit)
+    )
+    books = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    return jsonify({'success': True, 'books': books}), 200
+
 @books_bp.route('/feedback/submit', methods=['POST'])
 def submit_feedback():
     """用户提交反馈"""
@@ -329,18 +733,26 @@ def submit_feedback():
 
 @books_bp.route('/feedback/my/<int:user_id>', methods=['GET'])
 def get_my_feedbacks(user_id):
-    """获取用户的反馈记录"""
+    """获取用户的反馈记录（按提交时间倒序，游标分页）"""
+    order = ('created_at', 'id')
+    try:
+        page = Page.from_request()
+        keyset, keyset_params = page.where(order)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
     conn = get_db()
     cursor = conn.cursor()
 
     cursor.execute(
-        '''SELECT * FROM feedback
-           WHERE user_id = ?
-           ORDER BY created_at DESC''',
-        (user_id,)
+        f'''SELECT * FROM feedback
+            WHERE user_id = ? AND {keyset}
+            ORDER BY {page.order_by(order)}
+            LIMIT ?''',
+        (user_id, *keyset_params, page.fetch_size)
     )
 
-    feedbacks = [dict(row) for row in cursor.fetchall()]
+    feedbacks, next_cursor = page.collect(cursor.fetchall(), order)
     conn.close()
 
-    return jsonify({'success': True, 'feedbacks': feedbacks}), 200
\ No newline at end of file
+    return jsonify({'success': True, 'feedbacks': feedbacks, 'next_cursor': next_cursor}), 200
@@ -0,0 +1,197 @@
+"""
+后台定时任务
+每个任务按各自的间隔加随机抖动执行；执行前在 scheduler_leases 表中抢占以任务名为键的租约，
+租约有效期略短于任务间隔，多个进程（多个 worker）同时运行时每个间隔内只有一个进程执行该任务。
+
+任务：
+- overdue：到期未还的借阅记录标记为 overdue 并写入提醒（OVERDUE_INTERVAL 秒）
+- expire_holds：超期未领取的预约转给下一位或放回库存（HOLD_SWEEP_INTERVAL 秒）
+- prune_changes：图书变更日志只保留最近 CHANGE_LOG_RETENTION 条（CHANGE_LOG_PRUNE_INTERVAL 秒）
+
+SCHEDULER_ENABLED=0 时不启动（例如由独立进程运行 python scheduler.py）。
+"""
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import holds
+from overdue import mark_overdue
+from transactions import run_immediate
+
+OVERDUE_INTERVAL = float(os.environ.get('OVERDUE_INTERVAL', 300))
+JITTER = float(os.environ.get('SCHEDULER_JITTER', 30))
+ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') not in ('0', 'false')
+
+LEASE_DDL = [
+    '''CREATE TABLE IF NOT EXISTS scheduler_leases (
+           name TEXT PRIMARY KEY,
+           owner TEXT NOT NULL,
+           expires_at TEXT NOT NULL
+       )''',
+]
+
+# 本进程的租约持有者标识
+OWNER = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire_lease(conn, name, ttl, owner=OWNER):
+    """抢占任务租约：租约不存在、已过期或本来就属于自己时成功"""
+    def work(cursor):
+        now = datetime.now()
+        cursor.execute(
+            '''INSERT INTO scheduler_leases (name, owner, expires_at) VALUES (?, ?, ?)
+               ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+               WHERE scheduler_leases.expires_at < ? OR scheduler_leases.owner = excluded.owner''',
+            (name, owner, (now + timedelta(seconds=ttl)).isoformat(), now.isoformat())
+        )
+        return cursor.rowcount > 0
+    return run_immediate(conn, work)
+
+
+class Job:
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = time.monotonic() + random.uniform(0, JITTER)
+        self.runs = 0
+        self.skipped = 0
+        self.last_result = None
+        self.last_error = None
+        self.last_duration = None
+
+    def schedule_next(self):
+        self.next_run = time.monotonic() + self.interval + random.uniform(0, JITTER)
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+            'last_duration_ms': self.last_duration,
+        }
+
+
+class Scheduler:
+    """单线程定时任务调度；func(conn) 的返回值记录为最近一次结果"""
+
+    def __init__(self, get_connection):
+        self._get_connection = get_connection
+        self._jobs = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, interval, func):
+        self._jobs.append(Job(name, interval, func))
+
+    def run_pending(self):
+        now = time.monotonic()
+        for job in self._jobs:
+            if job.next_run > now:
+                continue
+            job.schedule_next()
+            self.run_job(job)
+
+    def run_job(self, job, force=False):
+        conn = self._get_connection()
+        try:
+            # 租约有效期略短于间隔，避免持有者自身的抖动导致漏掉一个周期
+            if not force and not acquire_lease(conn, job.name, job.interval * 0.9):
+                job.skipped += 1
+                return
+            started = time.perf_counter()
+            job.last_result = job.func(conn)
+            job.last_error = None
+            job.runs += 1
+            job.last_duration = round((time.perf_counter() - started) * 1000, 2)
+        except Exception as e:
+            job.last_error = str(e)
+            print(f"定时任务 {job.name} 执行失败: {e}")
+        finally:
+            conn.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            next_run = min(job.next_run for job in self._jobs)
+            self._stop.wait(max(0.0, min(next_run - time.monotonic(), 60)))
+
+    def start(self):
+        if self._thread is not None or not self._jobs:
+            return
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'owner': OWNER,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'jobs': {job.name: job.stats() for job in self._jobs},
+        }
+
+
+_scheduler = None
+
+
+def create_scheduler(on_stock_released=None):
+    """创建包含全部任务的调度器；on_stock_released(*book_ids) 在预约释放图书后调用"""
+    import change_log
+    from models import get_db
+
+    def expire_holds(conn):
+        book_ids = holds.sweep(conn)
+        if book_ids and on_stock_released:
+            on_stock_released(*book_ids)
+        return len(book_ids)
+
+    scheduler = Scheduler(get_db)
+    scheduler.add_job('overdue', OVERDUE_INTERVAL, mark_overdue)
+    scheduler.add_job('expire_holds', holds.SWEEP_INTERVAL, expire_holds)
+    scheduler.add_job('prune_changes', change_log.PRUNE_INTERVAL, change_log.prune)
+    return scheduler
+
+
+def start(on_stock_released=None):
+    """启动本进程的后台调度线程（SCHEDULER_ENABLED=0 时跳过）"""
+    global _scheduler
+    if not ENABLED or _scheduler is not None:
+        return
+    _scheduler = create_scheduler(on_stock_released)
+    _scheduler.start()
+
+
+def stats():
+    if _scheduler is None:
+        return {'running': False}
+    return _scheduler.stats()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='运行后台定时任务（逾期检测、预约超期清理）')
+    parser.add_argument('--once', action='store_true', help='立即执行一次全部任务（忽略租约）后退出')
+    args = parser.parse_args()
+
+    scheduler = create_scheduler()
+    if args.once:
+        for job in scheduler._jobs:
+            scheduler.run_job(job, force=True)
+            print(f"{job.name}: {job.last_error or job.last_result}")
+    else:
+        print(f"定时任务运行中（{OWNER}），按 Ctrl+C 停止")
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
@@ -0,0 +1,64 @@
+"""
+生产环境启动入口
+    python serve.py [--bind 0.0.0.0:5000] [--workers N] [--threads N]
+
+- Linux / macOS：使用 gunicorn 多进程（配置见 gunicorn.conf.py），worker 数默认等于 CPU 核数；
+- Windows（gunicorn 不支持）：使用 waitress 单进程多线程。
+
+开发调试仍可使用 python app.py（FLASK_DEBUG=1 开启自动重载）。
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def serve_gunicorn():
+    from gunicorn.app.wsgiapp import run
+
+    sys.argv = ['gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'), 'app:app']
+    run()
+
+
+def serve_waitress(bind, threads):
+    from waitress import serve
+
+    started = time.perf_counter()
+    from app import app, prepare_database, start_background_tasks
+
+    prepare_database()
+    start_background_tasks()
+    print(f"waitress 监听 {bind}，{threads} 线程，启动耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+    serve(app, listen=bind, threads=threads, channel_timeout=int(os.environ.get('WEB_TIMEOUT', 60)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='以生产模式启动图书馆服务')
+    parser.add_argument('--bind', help='监听地址（默认 0.0.0.0:5000，或环境变量 WEB_BIND）')
+    parser.add_argument('--workers', type=int, help='gunicorn worker 进程数（默认 CPU 核数）')
+    parser.add_argument('--threads', type=int, help='每个进程处理普通请求的线程数（默认 8，另加 SSE_MAX_SUBSCRIBERS 个推送线程）')
+    parser.add_argument('--server', choices=('gunicorn', 'waitress'), help='指定服务器（默认按平台选择）')
+    args = parser.parse_args(argv)
+
+    # 命令行参数通过环境变量传给 gunicorn.conf.py
+    for name, value in (('WEB_BIND', args.bind), ('WEB_WORKERS', args.workers), ('WEB_THREADS', args.threads)):
+        if value is not None:
+            os.environ[name] = str(value)
+    os.chdir(BACKEND_DIR)
+
+    server = args.server or ('waitress' if os.name == 'nt' else 'gunicorn')
+    if importlib.util.find_spec(server) is None:
+        raise SystemExit(f'未安装 {server}，请先执行 pip install -r requirements.txt')
+    if server == 'gunicorn':
+        serve_gunicorn()
+    else:
+        # 与 gunicorn.conf.py 相同：普通请求线程 + 每个 SSE 连接一个线程
+        threads = int(os.environ.get('WEB_THREADS', 8)) + int(os.environ.get('SSE_MAX_SUBSCRIBERS', 100))
+        serve_waitress(os.environ.get('WEB_BIND', '0.0.0.0:5000'), threads)
+
+
+if __name__ == '__main__':
+    main()
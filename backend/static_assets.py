@@ -0,0 +1,169 @@
+"""
+前端静态资源（frontend/dist）
+- 构建后执行 python static_assets.py，为文本类资源生成 .gz / .br 预压缩文件（brotli 为可选依赖，
+  未安装时只生成 .gz），运行时不再压缩；
+- 服务启动时扫描一次 dist 目录生成内存清单（路径 -> 类型、ETag、各编码的内容），
+  请求时只查字典，不再对每个请求调用 os.path.exists / stat；不超过 MAX_CACHED_FILE 的文件内容直接缓存在内存中；
+- 按 Accept-Encoding 选择 br / gzip / 原文件，响应带 Vary: Accept-Encoding 与 ETag；
+- Vite 生成的带内容哈希的文件（assets/xxx-<hash>.js）一年且 immutable，其余文件（index.html 等）短缓存后重新验证。
+
+重新构建前端后需重启服务（gunicorn 可 kill -HUP 平滑重载）才会加载新清单。
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+COMPRESSIBLE = {'.html', '.js', '.mjs', '.css', '.svg', '.json', '.map', '.txt', '.xml', '.ico', '.webmanifest', '.wasm'}
+# 小于该字节数的文件不压缩（压缩收益抵不过额外的响应头）
+MIN_COMPRESS_SIZE = 1024
+# 超过该字节数的文件不缓存内容，响应时从磁盘读取
+MAX_CACHED_FILE = 2 * 1024 * 1024
+# (Content-Encoding, 文件后缀)，按优先级排列
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+HASHED_ASSET = re.compile(r'(^|/)assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SHORT_TTL = 'public, max-age=60, must-revalidate'
+
+
+class Asset:
+    """一个静态文件及其预压缩版本；variants: 编码 -> (内容或 None, 文件路径, ETag)"""
+
+    __slots__ = ('mimetype', 'cache_control', 'variants')
+
+    def __init__(self, mimetype, cache_control):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.variants = {}
+
+
+def _is_compressible(name, size):
+    return os.path.splitext(name)[1].lower() in COMPRESSIBLE and size >= MIN_COMPRESS_SIZE
+
+
+def precompress(dist_dir):
+    """为 dist 目录中的文本类资源生成 .gz / .br（已是最新的跳过），返回生成的文件数"""
+    written = 0
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            size = os.path.getsize(path)
+            if not _is_compressible(name, size):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                if encoding == 'br':
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                # 压缩后没有变小的不保留
+                if len(compressed) >= size:
+                    continue
+                with open(target, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+    return written
+
+
+def _variant(path, etag_base, encoding):
+    size = os.path.getsize(path)
+    data = None
+    if size <= MAX_CACHED_FILE:
+        with open(path, 'rb') as f:
+            data = f.read()
+    etag = etag_base if encoding == 'identity' else f'{etag_base}-{encoding}'
+    return data, path, etag
+
+
+def build_manifest(dist_dir):
+    """扫描 dist 目录：相对路径（/ 分隔）-> Asset。过期（早于原文件）的预压缩文件忽略"""
+    manifest = {}
+    if not os.path.isdir(dist_dir):
+        return manifest
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            if name.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, dist_dir).replace(os.sep, '/')
+            mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            asset = Asset(mimetype, IMMUTABLE if HASHED_ASSET.search(relative) else SHORT_TTL)
+
+            digest = hashlib.blake2b(digest_size=8)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(chunk)
+            etag = digest.hexdigest()
+            asset.variants['identity'] = _variant(path, etag, 'identity')
+            mtime = os.path.getmtime(path)
+            for encoding, suffix in ENCODINGS:
+                if name + suffix in files and os.path.getmtime(path + suffix) >= mtime:
+                    asset.variants[encoding] = _variant(path + suffix, etag, encoding)
+            manifest[relative] = asset
+    return manifest
+
+
+def choose_encoding(asset):
+    """按 Accept-Encoding 选择编码：客户端接受的编码中按 ENCODINGS 优先级取第一个"""
+    accepted = request.accept_encodings
+    for encoding, _ in ENCODINGS:
+        if encoding in asset.variants and accepted.quality(encoding) > 0:
+            return encoding
+    return 'identity'
+
+
+def serve(asset):
+    """生成静态资源响应（支持 If-None-Match）"""
+    encoding = choose_encoding(asset)
+    data, path, etag = asset.variants[encoding]
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif data is not None:
+        response = Response(data, mimetype=asset.mimetype)
+    else:
+        response = send_file(path, mimetype=asset.mimetype, conditional=False, etag=False)
+    if encoding != 'identity' and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = asset.cache_control
+    if len(asset.variants) > 1:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def stats(manifest):
+    return {
+        'files': len(manifest),
+        'precompressed': sum(len(asset.variants) > 1 for asset in manifest.values()),
+        'cached_bytes': sum(
+            len(data) for asset in manifest.values() for data, _, _ in asset.variants.values() if data
+        ),
+    }
+
+
+if __name__ == '__main__':
+    default_dist = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../frontend/dist')
+    dist = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else default_dist)
+    if not os.path.isdir(dist):
+        raise SystemExit(f'{dist} 不存在，请先构建前端（npm run build）')
+    if brotli is None:
+        print("提示: 未安装 brotli，只生成 .gz（pip install brotli）")
+    print(f"预压缩完成，生成 {precompress(dist)} 个文件")
@@ -0,0 +1,129 @@
+"""
+借阅统计物化表
+book_borrow_stats（每本书借阅次数）、category_borrow_stats（每个分类借阅次数）、
+borrowing_totals（总借阅数 / 当前借阅数）由触发器在借阅记录写入的同一事务中增量维护，
+统计接口只需读取少量行，耗时与历史记录数量无关。
+
+回填或校正：python stats.py
+"""
+import sqlite3
+
+STATS_DDL = [
+    '''CREATE TABLE IF NOT EXISTS book_borrow_stats (
+           book_id INTEGER PRIMARY KEY,
+           borrow_count INTEGER NOT NULL DEFAULT 0
+       )''',
+    'CREATE INDEX IF NOT EXISTS idx_book_borrow_stats_count ON book_borrow_stats (borrow_count)',
+    '''CREATE TABLE IF NOT EXISTS category_borrow_stats (
+           category TEXT PRIMARY KEY,
+           borrow_count INTEGER NOT NULL DEFAULT 0
+       )''',
+    '''CREATE TABLE IF NOT EXISTS borrowing_totals (
+           id INTEGER PRIMARY KEY CHECK (id = 1),
+           total INTEGER NOT NULL DEFAULT 0,
+           current INTEGER NOT NULL DEFAULT 0
+       )''',
+    'INSERT OR IGNORE INTO borrowing_totals (id, total, current) VALUES (1, 0, 0)',
+
+    # 新增借阅记录：图书、分类、总数计数加一
+    '''CREATE TRIGGER IF NOT EXISTS borrow_stats_ai AFTER INSERT ON borrowing_records BEGIN
+           INSERT INTO book_borrow_stats (book_id, borrow_count) VALUES (new.book_id, 1)
+               ON CONFLICT (book_id) DO UPDATE SET borrow_count = borrow_count + 1;
+           INSERT INTO category_borrow_stats (category, borrow_count)
+               SELECT category, 1 FROM books WHERE id = new.book_id AND category IS NOT NULL
+               ON CONFLICT (category) DO UPDATE SET borrow_count = borrow_count + 1;
+           UPDATE borrowing_totals
+               SET total = total + 1, current = current + (new.status IN ('borrowed', 'overdue'))
+               WHERE id = 1;
+       END''',
+    # 删除借阅记录：对应计数减一
+    '''CREATE TRIGGER IF NOT EXISTS borrow_stats_ad AFTER DELETE ON borrowing_records BEGIN
+           UPDATE book_borrow_stats SET borrow_count = borrow_count - 1 WHERE book_id = old.book_id;
+           UPDATE category_borrow_stats SET borrow_count = borrow_count - 1
+               WHERE category = (SELECT category FROM books WHERE id = old.book_id);
+           DELETE FROM category_borrow_stats WHERE borrow_count <= 0;
+           UPDATE borrowing_totals
+               SET total = total - 1, current = current - (old.status IN ('borrowed', 'overdue'))
+               WHERE id = 1;
+       END''',
+    # 借阅状态变化（归还等）：调整当前借阅数；借阅中与逾期都计为当前借阅
+    '''CREATE TRIGGER IF NOT EXISTS borrow_stats_au AFTER UPDATE OF status ON borrowing_records
+       WHEN (old.status IN ('borrowed', 'overdue')) != (new.status IN ('borrowed', 'overdue')) BEGIN
+           UPDATE borrowing_totals
+               SET current = current + (new.status IN ('borrowed', 'overdue'))
+                                     - (old.status IN ('borrowed', 'overdue'))
+               WHERE id = 1;
+       END''',
+    # 图书改分类：该书的借阅次数从旧分类移到新分类
+    '''CREATE TRIGGER IF NOT EXISTS borrow_stats_book_category AFTER UPDATE OF category ON books
+       WHEN old.category IS NOT new.category BEGIN
+           UPDATE category_borrow_stats
+               SET borrow_count = borrow_count
+                   - COALESCE((SELECT borrow_count FROM book_borrow_stats WHERE book_id = new.id), 0)
+               WHERE category = old.category;
+           INSERT INTO category_borrow_stats (category, borrow_count)
+               SELECT new.category, borrow_count FROM book_borrow_stats
+               WHERE book_id = new.id AND borrow_count > 0 AND new.category IS NOT NULL
+               ON CONFLICT (category) DO UPDATE SET borrow_count = borrow_count + excluded.borrow_count;
+           DELETE FROM category_borrow_stats WHERE borrow_count <= 0;
+       END''',
+    # 删除图书：其借阅记录不再计入热门图书与分类统计（与按 books 关联统计的口径一致）
+    '''CREATE TRIGGER IF NOT EXISTS borrow_stats_book_delete AFTER DELETE ON books BEGIN
+           UPDATE category_borrow_stats
+               SET borrow_count = borrow_count
+                   - COALESCE((SELECT borrow_count FROM book_borrow_stats WHERE book_id = old.id), 0)
+               WHERE category = old.category;
+           DELETE FROM category_borrow_stats WHERE borrow_count <= 0;
+           DELETE FROM book_borrow_stats WHERE book_id = old.id;
+       END''',
+]
+
+
+def create_stats_tables(cursor):
+    """创建统计表与维护触发器，并按现有借阅记录回填（迁移中调用）"""
+    for statement in STATS_DDL:
+        cursor.execute(statement)
+    rebuild_statistics(cursor)
+
+
+def rebuild_statistics(cursor):
+    """按 borrowing_records 全量重算统计表"""
+    cursor.execute('DELETE FROM book_borrow_stats')
+    cursor.execute(
+        '''INSERT INTO book_borrow_stats (book_id, borrow_count)
+           SELECT br.book_id, COUNT(*) FROM borrowing_records br
+           JOIN books b ON br.book_id = b.id
+           GROUP BY br.book_id'''
+    )
+    cursor.execute('DELETE FROM category_borrow_stats')
+    cursor.execute(
+        '''INSERT INTO category_borrow_stats (category, borrow_count)
+           SELECT b.category, SUM(s.borrow_count) FROM book_borrow_stats s
+           JOIN books b ON s.book_id = b.id
+           WHERE b.category IS NOT NULL
+           GROUP BY b.category'''
+    )
+    cursor.execute(
+        '''UPDATE borrowing_totals SET
+               total = (SELECT COUNT(*) FROM borrowing_records),
+               current = (SELECT COUNT(*) FROM borrowing_records WHERE status IN ('borrowed', 'overdue'))
+           WHERE id = 1'''
+    )
+
+
+if __name__ == '__main__':
+    from models import get_db
+
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        rebuild_statistics(cursor)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"统计表重建失败: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+    print("借阅统计表重建完成！")
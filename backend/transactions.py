@@ -0,0 +1,73 @@
+"""
+写事务辅助
+借还书等库存变更在 BEGIN IMMEDIATE 事务中执行：事务开始即持有写锁，
+检查与更新之间不会被其他写入插入；遇到 SQLITE_BUSY 时有限次退避重试。
+"""
+import random
+import sqlite3
+import time
+
+# 获取写锁失败时的最大尝试次数与退避基数（秒）
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.02
+
+
+class TransactionAbort(Exception):
+    """业务检查失败，回滚事务并以 message / status 返回给客户端"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def is_busy_error(error):
+    """是否为数据库被锁（SQLITE_BUSY / SQLITE_LOCKED）"""
+    text = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in text or 'busy' in text)
+
+
+def run_immediate(conn, work, attempts=MAX_ATTEMPTS):
+    """
+    在 IMMEDIATE 事务中执行 work(cursor) 并提交，返回 work 的返回值。
+    work 抛出 TransactionAbort 时回滚并原样抛出；数据库繁忙时指数退避后重试，
+    超过次数仍失败则抛出最后一次的 OperationalError。
+    """
+    for attempt in range(attempts):
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            result = work(cursor)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy_error(e) or attempt == attempts - 1:
+                raise
+            time.sleep(BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random()))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+def run_items(cursor, items, operation):
+    """
+    在已开启的写事务中逐项执行 operation(cursor, item)，每项使用独立保存点：
+    单项失败只回滚该项，不影响其余项。返回 [(item, 是否成功, 返回值或错误信息)]。
+    """
+    results = []
+    for item in items:
+        cursor.execute('SAVEPOINT batch_item')
+        try:
+            value = operation(cursor, item)
+        except (TransactionAbort, sqlite3.Error, ValueError) as e:
+            cursor.execute('ROLLBACK TO batch_item')
+            cursor.execute('RELEASE batch_item')
+            message = e.message if isinstance(e, TransactionAbort) else f'操作失败: {str(e)}'
+            results.append((item, False, message))
+        else:
+            cursor.execute('RELEASE batch_item')
+            results.append((item, True, value))
+    return results
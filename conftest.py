@@ -0,0 +1,14 @@
+"""
+pytest 公共夹具
+    python -m pytest -q test_system.py
+"""
+import pytest
+
+from test_system import temp_library
+
+
+@pytest.fixture
+def library_db():
+    """临时数据库（已执行全部迁移），测试结束后恢复 models.DATABASE；返回数据库路径"""
+    with temp_library() as database:
+        yield database
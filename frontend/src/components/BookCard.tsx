@@ -4,6 +4,7 @@ import { BookOpen, Package } from 'lucide-react'
 import { Button } from './ui/button'
 import { Card } from './ui/card'
 import { Badge } from './ui/badge'
+import StarRating from './StarRating'
 import { booksApi } from '@/services/api'
 import type { Book, User } from '@/types'
 
@@ -23,22 +24,23 @@ export default function BookCard({ book, index, user, onBorrow }: BookCardProps)
       return
     }
 
-    if (book.available_quantity <= 0) {
-      alert('No copies available')
-      return
-    }
-
-    if (!confirm(`Borrow "${book.title}"?`)) return
+    const outOfStock = book.available_quantity <= 0
+    if (!outOfStock && !confirm(`Borrow "${book.title}"?`)) return
 
     try {
       setLoading(true)
-      const response = await booksApi.borrow(user.id, book.id)
+      // Out of stock: the borrow still succeeds when a returned copy is being held for this user
+      const response = await booksApi.borrow(user.id, book.id).catch((error) => error.response?.data)
 
-      if (response.success) {
+      if (response?.success) {
         alert('Book borrowed successfully!')
         onBorrow?.()
+      } else if (outOfStock) {
+        if (!confirm(`No copies available. Join the hold queue for "${book.title}"?`)) return
+        const hold = await booksApi.placeHold(user.id, book.id)
+        alert(hold.message)
       } else {
-        alert(response.message || 'Failed to borrow book')
+        alert(response?.message || 'Failed to borrow book')
       }
     } catch (error: any) {
       alert(error.response?.data?.message || 'An error occurred')
@@ -97,17 +99,28 @@ export default function BookCard({ book, index, user, onBorrow }: BookCardProps)
                 {book.available_quantity} / {book.total_quantity}
               </span>
             </div>
+
+            {!!book.rating_count && (
+              <div className="flex items-center justify-between text-sm">
+                <span className="text-muted-foreground">Rating:</span>
+                <span className="flex items-center gap-1">
+                  <StarRating rating={Math.round((book.rating_sum ?? 0) / book.rating_count)} readonly size="sm" />
+                  <span className="text-muted-foreground">({book.rating_count})</span>
+                </span>
+              </div>
+            )}
           </div>
 
           {/* Actions */}
           <div className="flex items-center gap-2">
             <Button
               onClick={handleBorrow}
-              disabled={loading || book.available_quantity <= 0}
+              disabled={loading}
               className="flex-1"
               size="sm"
+              variant={book.available_quantity > 0 ? 'default' : 'outline'}
             >
-              {loading ? 'Borrowing...' : book.available_quantity > 0 ? 'Borrow' : 'Out of Stock'}
+              {loading ? 'Borrowing...' : book.available_quantity > 0 ? 'Borrow' : 'Place Hold'}
             </Button>
           </div>
         </div>
@@ -0,0 +1,21 @@
+import { Button } from './ui/button'
+
+interface LoadMoreProps {
+  // next_cursor from the last page; null once the list is complete
+  cursor: string | null
+  loading: boolean
+  onLoadMore: () => void
+  label?: string
+}
+
+export default function LoadMore({ cursor, loading, onLoadMore, label = 'Load More' }: LoadMoreProps) {
+  if (!cursor) return null
+
+  return (
+    <div className="text-center mt-6">
+      <Button variant="outline" onClick={onLoadMore} disabled={loading}>
+        {loading ? 'Loading...' : label}
+      </Button>
+    </div>
+  )
+}
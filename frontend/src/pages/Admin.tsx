@@ -7,6 +7,7 @@ import { Input } from '@/components/ui/input'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import { adminApi, booksApi } from '@/services/api'
+import LoadMore from '@/components/LoadMore'
 import type { Book, User, Statistics } from '@/types'
 
 interface Feedback {
@@ -25,6 +26,9 @@ export default function Admin() {
   const [, setUser] = useState<User | null>(null)
   const [books, setBooks] = useState<Book[]>([])
   const [feedbacks, setFeedbacks] = useState<Feedback[]>([])
+  const [booksCursor, setBooksCursor] = useState<string | null>(null)
+  const [feedbackCursor, setFeedbackCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState<'books' | 'feedbacks' | null>(null)
   const [stats, setStats] = useState<Statistics>({
     total_users: 0,
     total_books: 0,
@@ -70,7 +74,10 @@ export default function Admin() {
         adminApi.getBorrowingStatistics(),
       ])
 
-      if (booksRes.success) setBooks(booksRes.books)
+      if (booksRes.success) {
+        setBooks(booksRes.books)
+        setBooksCursor(booksRes.next_cursor ?? null)
+      }
 
       const combinedStats = {
         total_users: userStatsRes.total_users || 0,
@@ -129,6 +136,7 @@ export default function Admin() {
       const response = await adminApi.getFeedbacks()
       if (response.success) {
         setFeedbacks(response.feedbacks)
+        setFeedbackCursor(response.next_cursor ?? null)
       }
     } catch (error) {
       console.error('Failed to load feedbacks:', error)
@@ -137,6 +145,36 @@ export default function Admin() {
     }
   }
 
+  const loadMoreBooks = async () => {
+    try {
+      setLoadingMore('books')
+      const response = await booksApi.list(booksCursor)
+      if (response.success) {
+        setBooks((current) => [...current, ...response.books])
+        setBooksCursor(response.next_cursor ?? null)
+      }
+    } catch (error) {
+      console.error('Failed to load more books:', error)
+    } finally {
+      setLoadingMore(null)
+    }
+  }
+
+  const loadMoreFeedbacks = async () => {
+    try {
+      setLoadingMore('feedbacks')
+      const response = await adminApi.getFeedbacks(feedbackCursor)
+      if (response.success) {
+        setFeedbacks((current) => [...current, ...response.feedbacks])
+        setFeedbackCursor(response.next_cursor ?? null)
+      }
+    } catch (error) {
+      console.error('Failed to load more feedbacks:', error)
+    } finally {
+      setLoadingMore(null)
+    }
+  }
+
   const handleReplyFeedback = async (feedbackId: number) => {
     if (!replyText.trim()) {
       alert('请输入回复内容')
@@ -333,6 +371,7 @@ export default function Admin() {
                     ))}
                   </tbody>
                 </table>
+                <LoadMore cursor={booksCursor} loading={loadingMore === 'books'} onLoadMore={loadMoreBooks} />
               </div>
             )}
           </CardContent>
@@ -430,6 +469,12 @@ export default function Admin() {
                     </CardContent>
                   </Card>
                 ))}
+                <LoadMore
+                  cursor={feedbackCursor}
+                  loading={loadingMore === 'feedbacks'}
+                  onLoadMore={loadMoreFeedbacks}
+                  label="加载更多"
+                />
               </div>
             )}
           </CardContent>
@@ -6,13 +6,23 @@ import { Button } from '@/components/ui/button'
 import { Badge } from '@/components/ui/badge'
 import { booksApi } from '@/services/api'
 import StarRating from '@/components/StarRating'
+import LoadMore from '@/components/LoadMore'
+import type { BadgeProps } from '@/components/ui/badge'
 import type { BorrowingRecord, User } from '@/types'
 
+const STATUS_BADGES: Record<BorrowingRecord['status'], { label: string; variant: BadgeProps['variant'] }> = {
+  borrowed: { label: 'Borrowed', variant: 'default' },
+  overdue: { label: 'Overdue', variant: 'destructive' },
+  returned: { label: 'Returned', variant: 'secondary' },
+}
+
 export default function Borrowings() {
   const navigate = useNavigate()
   const [user, setUser] = useState<User | null>(null)
   const [records, setRecords] = useState<BorrowingRecord[]>([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     const userStr = localStorage.getItem('user')
@@ -31,6 +41,7 @@ export default function Borrowings() {
       const response = await booksApi.getMyBorrowings(userId)
       if (response.success) {
         setRecords(response.records)
+        setNextCursor(response.next_cursor ?? null)
       }
     } catch (error) {
       console.error('Failed to load records:', error)
@@ -39,6 +50,22 @@ export default function Borrowings() {
     }
   }
 
+  const loadMore = async () => {
+    if (!user) return
+    try {
+      setLoadingMore(true)
+      const response = await booksApi.getMyBorrowings(user.id, nextCursor)
+      if (response.success) {
+        setRecords((current) => [...current, ...response.records])
+        setNextCursor(response.next_cursor ?? null)
+      }
+    } catch (error) {
+      console.error('Failed to load more records:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleReturn = async (recordId: number) => {
     if (!confirm('Confirm return?')) return
 
@@ -143,8 +170,8 @@ export default function Borrowings() {
                     <td className="p-4 text-sm">{new Date(record.borrow_date).toLocaleDateString()}</td>
                     <td className="p-4 text-sm">{new Date(record.due_date).toLocaleDateString()}</td>
                     <td className="p-4">
-                      <Badge variant={record.status === 'borrowed' ? 'default' : 'secondary'}>
-                        {record.status === 'borrowed' ? 'Borrowed' : 'Returned'}
+                      <Badge variant={STATUS_BADGES[record.status].variant}>
+                        {STATUS_BADGES[record.status].label}
                       </Badge>
                     </td>
                     <td className="p-4">
@@ -157,7 +184,7 @@ export default function Borrowings() {
                       )}
                     </td>
                     <td className="p-4 text-right space-x-2">
-                      {record.status === 'borrowed' && (
+                      {record.status !== 'returned' && (
                         <>
                           <Button
                             size="sm"
@@ -183,6 +210,8 @@ export default function Borrowings() {
             </table>
           </div>
         )}
+
+        {!loading && <LoadMore cursor={nextCursor} loading={loadingMore} onLoadMore={loadMore} />}
       </main>
     </div>
   )
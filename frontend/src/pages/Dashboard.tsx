@@ -4,16 +4,25 @@ import { motion } from 'framer-motion'
 import { BookOpen, LogOut, User as UserIcon, LayoutDashboard, Clock, MessageSquare } from 'lucide-react'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
-import { booksApi } from '@/services/api'
-import type { Book, User } from '@/types'
+import { booksApi, subscribeAvailability } from '@/services/api'
+import type { Book, BookSuggestion, SearchFacets, SearchFilters, User } from '@/types'
 import BookCard from '@/components/BookCard'
+import LoadMore from '@/components/LoadMore'
 
 export default function Dashboard() {
   const navigate = useNavigate()
   const [user, setUser] = useState<User | null>(null)
   const [books, setBooks] = useState<Book[]>([])
   const [searchQuery, setSearchQuery] = useState('')
+  const [suggestions, setSuggestions] = useState<BookSuggestion[]>([])
+  const [showSuggestions, setShowSuggestions] = useState(false)
+  const [filters, setFilters] = useState<SearchFilters>({})
+  const [facets, setFacets] = useState<SearchFacets | null>(null)
   const [loading, setLoading] = useState(true)
+  // Cursor for the next page of whatever is shown: the full list, or the last search
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [lastSearch, setLastSearch] = useState<{ query: string; filters: SearchFilters } | null>(null)
   const [activeTab, setActiveTab] = useState<'books' | 'borrowings' | 'admin'>('books')
 
   useEffect(() => {
@@ -32,6 +41,8 @@ export default function Dashboard() {
       const response = await booksApi.list()
       if (response.success) {
         setBooks(response.books)
+        setNextCursor(response.next_cursor ?? null)
+        setLastSearch(null)
       }
     } catch (error) {
       console.error('Failed to load books:', error)
@@ -40,22 +51,94 @@ export default function Dashboard() {
     }
   }
 
-  const handleSearch = async () => {
-    if (!searchQuery.trim()) {
-      loadBooks()
+  // Live stock updates replace polling of the list / detail endpoints
+  useEffect(() => {
+    return subscribeAvailability(
+      (update) => {
+        setBooks((current) =>
+          update.deleted
+            ? current.filter((book) => book.id !== update.book_id)
+            : current.map((book) =>
+                book.id === update.book_id
+                  ? {
+                      ...book,
+                      available_quantity: update.available_quantity ?? book.available_quantity,
+                      total_quantity: update.total_quantity ?? book.total_quantity,
+                    }
+                  : book
+              )
+        )
+      },
+      () => loadBooks()
+    )
+  }, [])
+
+  // As-you-type suggestions, debounced so fast typing issues one request
+  useEffect(() => {
+    const prefix = searchQuery.trim()
+    if (!prefix) {
+      setSuggestions([])
       return
     }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await booksApi.suggest(prefix)
+        if (response.success) {
+          setSuggestions(response.suggestions)
+        }
+      } catch (error) {
+        console.error('Suggest failed:', error)
+      }
+    }, 150)
+    return () => clearTimeout(timer)
+  }, [searchQuery])
+
+  const handleSearch = async (query = searchQuery, nextFilters = filters) => {
+    setShowSuggestions(false)
+    setFilters(nextFilters)
 
     try {
-      const response = await booksApi.search(searchQuery)
+      const response = await booksApi.search(query.trim(), null, { ...nextFilters, facets: true })
       if (response.success) {
         setBooks(response.books)
+        setFacets(response.facets ?? null)
+        setNextCursor(response.next_cursor ?? null)
+        setLastSearch({ query: query.trim(), filters: nextFilters })
       }
     } catch (error) {
       console.error('Search failed:', error)
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    try {
+      setLoadingMore(true)
+      const response = lastSearch
+        ? await booksApi.search(lastSearch.query, nextCursor, lastSearch.filters)
+        : await booksApi.list(nextCursor)
+      if (response.success) {
+        setBooks((current) => [...current, ...response.books])
+        setNextCursor(response.next_cursor ?? null)
+      }
+    } catch (error) {
+      console.error('Failed to load more books:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  const toggleFilter = (key: 'category' | 'publisher', value: string) => {
+    handleSearch(searchQuery, { ...filters, [key]: filters[key] === value ? undefined : value })
+  }
+
+  const showAll = () => {
+    setSearchQuery('')
+    setFilters({})
+    setFacets(null)
+    loadBooks()
+  }
+
   const handleLogout = () => {
     localStorage.removeItem('user')
     navigate('/login')
@@ -171,19 +254,72 @@ export default function Dashboard() {
 
         {/* Search Bar */}
         <div className="flex gap-4 mb-8">
-          <Input
-            placeholder="Search by title, author, or ISBN..."
-            value={searchQuery}
-            onChange={(e) => setSearchQuery(e.target.value)}
-            onKeyPress={(e) => e.key === 'Enter' && handleSearch()}
-            className="flex-1"
-          />
-          <Button onClick={handleSearch}>Search</Button>
-          <Button variant="outline" onClick={loadBooks}>
+          <div className="relative flex-1">
+            <Input
+              placeholder="Search by title, author, or ISBN..."
+              value={searchQuery}
+              onChange={(e) => {
+                setSearchQuery(e.target.value)
+                setShowSuggestions(true)
+              }}
+              onKeyPress={(e) => e.key === 'Enter' && handleSearch()}
+              onBlur={() => setShowSuggestions(false)}
+            />
+            {showSuggestions && suggestions.length > 0 && (
+              <ul className="absolute z-40 mt-1 w-full rounded-md border bg-background shadow-lg">
+                {suggestions.map((suggestion) => (
+                  <li
+                    key={suggestion.book_id}
+                    className="px-3 py-2 cursor-pointer hover:bg-muted"
+                    onMouseDown={(e) => {
+                      e.preventDefault()
+                      setSearchQuery(suggestion.title)
+                      handleSearch(suggestion.title)
+                    }}
+                  >
+                    <span className="font-medium">{suggestion.title}</span>
+                    {suggestion.author && (
+                      <span className="text-sm text-muted-foreground"> · {suggestion.author}</span>
+                    )}
+                  </li>
+                ))}
+              </ul>
+            )}
+          </div>
+          <Button onClick={() => handleSearch()}>Search</Button>
+          <Button variant="outline" onClick={showAll}>
             Show All
           </Button>
         </div>
 
+        {/* Facets: counts for the current query, one dimension's own filter excluded */}
+        {facets && (
+          <div className="mb-8 space-y-3 text-sm">
+            <label className="flex items-center gap-2">
+              <input
+                type="checkbox"
+                checked={!!filters.available}
+                onChange={(e) => handleSearch(searchQuery, { ...filters, available: e.target.checked })}
+              />
+              Available only ({facets.availability.available} / {facets.availability.all})
+            </label>
+            {(['category', 'publisher'] as const).map((key) => (
+              <div key={key} className="flex flex-wrap gap-2">
+                {(key === 'category' ? facets.categories : facets.publishers).map((facet) => (
+                  <Button
+                    key={facet.value}
+                    size="sm"
+                    variant={filters[key] === facet.value ? 'default' : 'outline'}
+                    onClick={() => toggleFilter(key, facet.value)}
+                  >
+                    {facet.value} ({facet.count})
+                  </Button>
+                ))}
+              </div>
+            ))}
+          </div>
+        )}
+
         {/* Books Grid */}
         {loading ? (
           <div className="text-center py-12">
@@ -198,6 +334,8 @@ export default function Dashboard() {
           </div>
         )}
 
+        {!loading && <LoadMore cursor={nextCursor} loading={loadingMore} onLoadMore={loadMore} />}
+
         {filteredBooks.length === 0 && !loading && (
           <motion.div
             initial={{ opacity: 0 }}
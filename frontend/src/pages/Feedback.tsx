@@ -6,6 +6,7 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import { booksApi } from '@/services/api'
+import LoadMore from '@/components/LoadMore'
 import type { User } from '@/types'
 
 interface Feedback {
@@ -23,6 +24,8 @@ export default function Feedback() {
   const [user, setUser] = useState<User | null>(null)
   const [feedbacks, setFeedbacks] = useState<Feedback[]>([])
   const [loading, setLoading] = useState(false)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [submitting, setSubmitting] = useState(false)
   const [formData, setFormData] = useState({
     type: 'suggestion',
@@ -46,6 +49,7 @@ export default function Feedback() {
       const response = await booksApi.getMyFeedbacks(userId)
       if (response.success) {
         setFeedbacks(response.feedbacks)
+        setNextCursor(response.next_cursor ?? null)
       }
     } catch (error) {
       console.error('Failed to load feedbacks:', error)
@@ -54,6 +58,22 @@ export default function Feedback() {
     }
   }
 
+  const loadMore = async () => {
+    if (!user) return
+    try {
+      setLoadingMore(true)
+      const response = await booksApi.getMyFeedbacks(user.id, nextCursor)
+      if (response.success) {
+        setFeedbacks((current) => [...current, ...response.feedbacks])
+        setNextCursor(response.next_cursor ?? null)
+      }
+    } catch (error) {
+      console.error('Failed to load more feedbacks:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault()
     if (!user || !formData.content.trim()) return
@@ -227,6 +247,7 @@ export default function Feedback() {
                   </Card>
                 </motion.div>
               ))}
+              <LoadMore cursor={nextCursor} loading={loadingMore} onLoadMore={loadMore} label="加载更多" />
             </div>
           )}
         </motion.div>
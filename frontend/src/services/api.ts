@@ -4,6 +4,10 @@ import type {
   RegisterRequest,
   LoginResponse,
   BooksResponse,
+  SuggestResponse,
+  SearchFilters,
+  AvailabilityUpdate,
+  HoldsResponse,
   BorrowingsResponse,
   Book,
 } from '../types';
@@ -49,13 +53,32 @@ export const authApi = {
 
 // Books API
 export const booksApi = {
-  search: async (query: string): Promise<BooksResponse> => {
-    const response = await api.get(`/books/search?query=${encodeURIComponent(query)}`);
+  search: async (
+    query: string,
+    cursor?: string | null,
+    filters: SearchFilters = {}
+  ): Promise<BooksResponse> => {
+    const { category, publisher, available, facets } = filters;
+    const response = await api.get('/books/search', {
+      params: {
+        query,
+        cursor,
+        category,
+        publisher,
+        available: available ? 1 : undefined,
+        facets: facets ? 1 : undefined,
+      },
+    });
+    return response.data;
+  },
+
+  suggest: async (prefix: string, limit = 8): Promise<SuggestResponse> => {
+    const response = await api.get('/books/suggest', { params: { prefix, limit } });
     return response.data;
   },
 
-  list: async (): Promise<BooksResponse> => {
-    const response = await api.get('/books/list');
+  list: async (cursor?: string | null): Promise<BooksResponse> => {
+    const response = await api.get('/books/list', { params: { cursor } });
     return response.data;
   },
 
@@ -79,8 +102,43 @@ export const booksApi = {
     return response.data;
   },
 
-  getMyBorrowings: async (user_id: number): Promise<BorrowingsResponse> => {
-    const response = await api.get(`/books/my-borrowings/${user_id}`);
+  placeHold: async (user_id: number, book_id: number) => {
+    const response = await api.post('/books/hold', { user_id, book_id });
+    return response.data;
+  },
+
+  cancelHold: async (hold_id: number) => {
+    const response = await api.post('/books/hold/cancel', { hold_id });
+    return response.data;
+  },
+
+  getMyHolds: async (user_id: number, cursor?: string | null): Promise<HoldsResponse> => {
+    const response = await api.get(`/books/holds/my/${user_id}`, { params: { cursor } });
+    return response.data;
+  },
+
+  borrowBatch: async (user_id: number, book_ids: number[]) => {
+    const response = await api.post('/books/borrow/batch', { user_id, book_ids });
+    return response.data;
+  },
+
+  returnBatch: async (record_ids: number[]) => {
+    const response = await api.post('/books/return/batch', { record_ids });
+    return response.data;
+  },
+
+  renewBatch: async (record_ids: number[]) => {
+    const response = await api.post('/books/renew/batch', { record_ids });
+    return response.data;
+  },
+
+  getMyBorrowings: async (user_id: number, cursor?: string | null): Promise<BorrowingsResponse> => {
+    const response = await api.get(`/books/my-borrowings/${user_id}`, { params: { cursor } });
+    return response.data;
+  },
+
+  getTopRated: async (category: string, limit = 10): Promise<BooksResponse> => {
+    const response = await api.get('/books/top-rated', { params: { category, limit } });
     return response.data;
   },
 
@@ -99,13 +157,28 @@ export const booksApi = {
     return response.data;
   },
 
-  getMyFeedbacks: async (user_id: number) => {
-    const response = await api.get(`/books/feedback/my/${user_id}`);
+  getMyFeedbacks: async (user_id: number, cursor?: string | null) => {
+    const response = await api.get(`/books/feedback/my/${user_id}`, { params: { cursor } });
     return response.data;
   },
 };
 
 // Admin API
+// Live availability (Server-Sent Events). EventSource reconnects on its own and
+// sends Last-Event-ID, so missed updates are replayed; a "reset" event means the
+// gap was too long and the caller should reload its list.
+export const subscribeAvailability = (
+  onUpdate: (update: AvailabilityUpdate) => void,
+  onReset: () => void
+): (() => void) => {
+  const source = new EventSource(`${API_BASE}/books/availability/stream`);
+  source.addEventListener('availability', (event) => {
+    onUpdate(JSON.parse((event as MessageEvent).data));
+  });
+  source.addEventListener('reset', onReset);
+  return () => source.close();
+};
+
 export const adminApi = {
   addBook: async (data: Partial<Book>) => {
     const response = await api.post('/admin/books/add', data);
@@ -122,8 +195,8 @@ export const adminApi = {
     return response.data;
   },
 
-  getUsers: async () => {
-    const response = await api.get('/admin/users/list');
+  getUsers: async (cursor?: string | null) => {
+    const response = await api.get('/admin/users/list', { params: { cursor } });
     return response.data;
   },
 
@@ -137,8 +210,8 @@ export const adminApi = {
     return response.data;
   },
 
-  getFeedbacks: async () => {
-    const response = await api.get('/admin/feedback/list');
+  getFeedbacks: async (cursor?: string | null) => {
+    const response = await api.get('/admin/feedback/list', { params: { cursor } });
     return response.data;
   },
 
@@ -39,6 +39,8 @@ export interface Book {
   available_quantity: number;
   description: string | null;
   created_at: string;
+  rating_sum?: number;
+  rating_count?: number;
 }
 
 export interface BorrowingRecord {
@@ -51,10 +53,32 @@ export interface BorrowingRecord {
   borrow_date: string;
   due_date: string;
   return_date: string | null;
-  status: 'borrowed' | 'returned';
+  status: 'borrowed' | 'overdue' | 'returned';
   rating: number | null;
 }
 
+export interface Hold {
+  id: number;
+  user_id: number;
+  book_id: number;
+  priority: number;
+  requested_at: string;
+  status: 'waiting' | 'ready' | 'fulfilled' | 'cancelled' | 'expired';
+  ready_at: string | null;
+  expires_at: string | null;
+  closed_at: string | null;
+  title: string;
+  author: string;
+  isbn: string;
+  position?: number;
+}
+
+export interface HoldsResponse {
+  success: boolean;
+  holds: Hold[];
+  next_cursor?: string | null;
+}
+
 // API Response Types
 export interface ApiResponse<T = any> {
   success: boolean;
@@ -65,11 +89,54 @@ export interface ApiResponse<T = any> {
 export interface BooksResponse {
   success: boolean;
   books: Book[];
+  next_cursor?: string | null;
+  facets?: SearchFacets;
+}
+
+export interface AvailabilityUpdate {
+  book_id: number;
+  available_quantity?: number;
+  total_quantity?: number;
+  deleted?: boolean;
+}
+
+export interface SearchFilters {
+  category?: string;
+  publisher?: string;
+  available?: boolean;
+  facets?: boolean;
+}
+
+export interface FacetValue {
+  value: string;
+  count: number;
+}
+
+export interface SearchFacets {
+  total: number;
+  categories: FacetValue[];
+  publishers: FacetValue[];
+  availability: { available: number; all: number };
+}
+
+export interface BookSuggestion {
+  book_id: number;
+  title: string;
+  author: string | null;
+  isbn: string | null;
+  matched: 'title' | 'author' | 'isbn' | 'pinyin';
+  borrow_count: number;
+}
+
+export interface SuggestResponse {
+  success: boolean;
+  suggestions: BookSuggestion[];
 }
 
 export interface BorrowingsResponse {
   success: boolean;
   records: BorrowingRecord[];
+  next_cursor?: string | null;
 }
 
 // Statistics Types
@@ -25,12 +25,22 @@ if errorlevel 1 (
     exit /b 1
 )
 
+REM Precompress static assets (.gz / .br)
+cd /d "%~dp0backend"
+python static_assets.py
+if errorlevel 1 (
+    echo [ERROR] Static asset precompression failed!
+    cd /d "%~dp0"
+    pause
+    exit /b 1
+)
+
 echo Build completed successfully!
 echo.
 
 echo [2/2] Starting server...
 cd /d "%~dp0backend"
-start "Smart Library Server" python app.py
+start "Smart Library Server" python serve.py
 
 echo.
 echo ==========================================
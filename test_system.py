@@ -4,6 +4,30 @@
 """
 import sys
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+
+@contextmanager
+def temp_library(name='library.db'):
+    """在临时目录中建库（执行全部迁移）并切换 models.DATABASE，结束后恢复；返回数据库路径"""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import models
+    import change_log
+
+    old_database = models.DATABASE
+    models.DATABASE = os.path.join(tempfile.mkdtemp(), name)
+    try:
+        models.init_db()
+        # 进程内缓存 / 索引按变更日志同步，换库后全部丢弃
+        change_log.reset()
+        yield models.DATABASE
+    finally:
+        models.DATABASE = old_database
+        change_log.reset()
 
 def check_files():
     """检查必要文件是否存在"""
@@ -118,6 +142,1748 @@ def test_database():
         print(f"✗ 数据库初始化失败: {e}")
         return False
 
+def test_concurrent_borrowing(library_db):
+    """并发借还压力测试：高并发下库存不会被超借，也不会变为负数"""
+    print("\n" + "=" * 50)
+    print("并发借还压力测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+
+    threads_count = 32
+    rounds = 5
+    stock = 3
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO books (title, total_quantity, available_quantity) VALUES (?, ?, ?)',
+        ('并发测试图书', stock, stock)
+    )
+    book_id = cursor.lastrowid
+    cursor.executemany(
+        'INSERT INTO users (username, password) VALUES (?, ?)',
+        [(f'stress{i}', 'x') for i in range(threads_count)]
+    )
+    conn.commit()
+    cursor.execute("SELECT id FROM users WHERE username LIKE 'stress%' ORDER BY id")
+    user_ids = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+
+    barrier = threading.Barrier(threads_count)
+    lock = threading.Lock()
+    counts = {'borrowed': 0, 'returned': 0, 'errors': 0}
+    min_available = [stock]
+
+    def worker(user_id):
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(rounds):
+            response = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+            if response.status_code == 201:
+                with lock:
+                    counts['borrowed'] += 1
+                record_id = response.get_json()['record_id']
+                response = client.post('/api/books/return', json={'record_id': record_id})
+                with lock:
+                    counts['returned' if response.status_code == 200 else 'errors'] += 1
+            elif response.status_code != 400:
+                with lock:
+                    counts['errors'] += 1
+            available = client.get(f'/api/books/detail/{book_id}').get_json()['book']['available_quantity']
+            with lock:
+                min_available[0] = min(min_available[0], available)
+
+    workers = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT available_quantity FROM books WHERE id = ?', (book_id,))
+    final_available = cursor.fetchone()['available_quantity']
+    cursor.execute("SELECT COUNT(*) FROM borrowing_records WHERE status = 'borrowed'")
+    still_borrowed = cursor.fetchone()[0]
+    conn.close()
+
+    print(f"✓ {threads_count} 线程 x {rounds} 轮: 借出 {counts['borrowed']} 次, 归还 {counts['returned']} 次")
+    print(f"  最低库存 {min_available[0]}, 最终库存 {final_available}, 错误 {counts['errors']}")
+
+    assert counts['errors'] == 0, '并发借还出现错误响应'
+    assert min_available[0] >= 0, '库存出现负数'
+    assert final_available == stock and still_borrowed == 0, '库存与借阅记录不一致'
+
+def test_hold_queue(library_db):
+    """预约队列：归还时按优先级与预约时间保留给队首读者，领取后库存保持一致"""
+    print("\n" + "=" * 50)
+    print("预约队列测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO books (title, total_quantity, available_quantity) VALUES (?, ?, ?)',
+        ('预约测试图书', 1, 1)
+    )
+    book_id = cursor.lastrowid
+    # 按预约顺序：普通读者、老年读者、残障读者
+    user_ids = {}
+    for name, reader_type in [('holder', None), ('normal', None), ('elderly', 'elderly'), ('disabled', 'disabled')]:
+        cursor.execute(
+            'INSERT INTO users (username, password, special_reader_type) VALUES (?, ?, ?)',
+            (f'hold_{name}', 'x', reader_type)
+        )
+        user_ids[name] = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    record_id = client.post(
+        '/api/books/borrow', json={'user_id': user_ids['holder'], 'book_id': book_id}
+    ).get_json()['record_id']
+    for name in ('normal', 'elderly', 'disabled'):
+        response = client.post('/api/books/hold', json={'user_id': user_ids[name], 'book_id': book_id})
+        assert response.status_code == 201, f'预约失败: {response.get_json()}'
+
+    response = client.post('/api/books/renew', json={'record_id': record_id})
+    assert response.status_code == 400, '有读者预约时不应允许续借'
+    client.post('/api/books/return', json={'record_id': record_id})
+
+    response = client.post('/api/books/borrow', json={'user_id': user_ids['normal'], 'book_id': book_id})
+    assert response.status_code == 400, '保留给预约读者的图书不应被他人借走'
+    response = client.post('/api/books/borrow', json={'user_id': user_ids['disabled'], 'book_id': book_id})
+    assert response.status_code == 201, '队首（残障读者）应能领取保留的图书'
+
+    holds = client.get(f"/api/books/holds/my/{user_ids['elderly']}").get_json()['holds']
+    assert holds[0]['position'] == 1, '老年读者应排在普通读者之前'
+    available = client.get(f'/api/books/detail/{book_id}').get_json()['book']['available_quantity']
+    assert available == 0, '库存与预约状态不一致'
+
+    # 管理员增加一册：先保留给队首（老年读者），不进入可借库存
+    book = {'title': '预约测试图书', 'author': None, 'isbn': None, 'category': None, 'publisher': None,
+            'description': None}
+    response = client.put(f'/api/admin/books/update/{book_id}', json=dict(book, total_quantity=2))
+    assert response.status_code == 200, f'更新失败: {response.get_json()}'
+    holds = client.get(f"/api/books/holds/my/{user_ids['elderly']}").get_json()['holds']
+    assert holds[0]['status'] == 'ready', '新增的一册应保留给队首读者'
+    assert client.get(f'/api/books/detail/{book_id}').get_json()['book']['available_quantity'] == 0
+    response = client.put(f'/api/admin/books/update/{book_id}', json=dict(book, total_quantity=1))
+    assert response.status_code == 400, '总数量不能少于已借出及保留的册数'
+
+    # 普通读者仍在排队时直接从库存借到（库存由进程外放回），其等待中的预约随之完成
+    conn = models.get_db()
+    conn.execute('UPDATE books SET total_quantity = 3, available_quantity = 1 WHERE id = ?', (book_id,))
+    conn.commit()
+    conn.close()
+    response = client.post('/api/books/borrow', json={'user_id': user_ids['normal'], 'book_id': book_id})
+    assert response.status_code == 201, f'借阅失败: {response.get_json()}'
+    holds = client.get(f"/api/books/holds/my/{user_ids['normal']}").get_json()['holds']
+    assert holds[0]['status'] == 'fulfilled', '从库存借到后等待中的预约应结束'
+
+    print("✓ 归还后按优先级保留给残障读者，老年读者排在普通读者之前；增加册数时按队列保留")
+
+def test_overdue_scheduler(library_db):
+    """逾期检测：到期记录改为 overdue 并生成一条提醒，租约保证同一任务只有一个进程执行"""
+    print("\n" + "=" * 50)
+    print("逾期检测测试...")
+    print("=" * 50)
+
+    from datetime import datetime, timedelta
+    import models
+    from app import app
+    from overdue import mark_overdue
+    from scheduler import acquire_lease
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO books (title, total_quantity, available_quantity) VALUES (?, ?, ?)',
+        ('逾期测试图书', 1, 1)
+    )
+    book_id = cursor.lastrowid
+    cursor.execute('INSERT INTO users (username, password) VALUES (?, ?)', ('overdue_reader', 'x'))
+    user_id = cursor.lastrowid
+    conn.commit()
+
+    client = app.test_client()
+    record_id = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id}).get_json()['record_id']
+    cursor.execute(
+        'UPDATE borrowing_records SET due_date = ? WHERE id = ?',
+        ((datetime.now() - timedelta(days=10)).isoformat(), record_id)
+    )
+    conn.commit()
+
+    assert mark_overdue(conn, batch_size=1) == 1, '应检测到一条逾期记录'
+    assert mark_overdue(conn) == 0, '已逾期的记录不应重复处理'
+    cursor.execute('SELECT status FROM borrowing_records WHERE id = ?', (record_id,))
+    assert cursor.fetchone()['status'] == 'overdue'
+    cursor.execute('SELECT COUNT(*) FROM reminders WHERE record_id = ?', (record_id,))
+    assert cursor.fetchone()[0] == 1, '每条逾期记录只生成一条提醒'
+    cursor.execute('SELECT current FROM borrowing_totals WHERE id = 1')
+    assert cursor.fetchone()['current'] == 1, '逾期记录仍应计入当前借阅'
+
+    response = client.post('/api/books/renew', json={'record_id': record_id})
+    assert response.status_code == 200, '逾期记录应可续借'
+    cursor.execute('SELECT status FROM borrowing_records WHERE id = ?', (record_id,))
+    assert cursor.fetchone()['status'] == 'borrowed', '续借后到期时间在未来应恢复为借阅中'
+
+    assert acquire_lease(conn, 'overdue', 60, owner='worker-a')
+    assert not acquire_lease(conn, 'overdue', 60, owner='worker-b'), '租约有效期内其他进程不应执行'
+    conn.close()
+
+    print("✓ 逾期记录已标记并生成提醒，续借后恢复，租约互斥")
+
+def test_json_responses(library_db):
+    """列表接口：SQLite 直出的 JSON 与逐行构建字典的结果一致，较大的响应按 Accept-Encoding 压缩"""
+    print("\n" + "=" * 50)
+    print("JSON 响应测试...")
+    print("=" * 50)
+
+    import gzip
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.executemany(
+        'INSERT INTO books (title, author, description, total_quantity, available_quantity) VALUES (?, ?, ?, ?, ?)',
+        [(f'JSON 测试图书 {i}', '作者 "引号"', '简介\n' * 20, 2, 1) for i in range(30)]
+    )
+    conn.commit()
+    cursor.execute('SELECT * FROM books ORDER BY created_at DESC, id DESC LIMIT 20')
+    expected = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    client = app.test_client()
+    response = client.get('/api/books/list?limit=20')
+    data = response.get_json()
+    assert data['books'] == expected, '直出 JSON 应与逐行字典一致'
+    assert data['next_cursor'], '应返回下一页游标'
+    assert 'Content-Encoding' not in response.headers, '客户端未声明 Accept-Encoding 时不压缩'
+
+    compressed = client.get('/api/books/list?limit=20', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers.get('Content-Encoding') in ('gzip', 'zstd')
+    if compressed.headers['Content-Encoding'] == 'gzip':
+        assert gzip.decompress(compressed.data) == response.data
+    etag = compressed.headers['ETag']
+    assert etag.startswith('W/'), '压缩后的响应应使用弱 ETag'
+    not_modified = client.get('/api/books/list?limit=20', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert not_modified.status_code == 304, '弱 ETag 应能命中条件请求'
+
+    print("✓ 直出 JSON 与字典序列化结果一致，压缩与条件请求正常")
+
+def test_change_log_sync(library_db):
+    """其他进程（直接写库）的修改经由变更日志同步到本进程的详情缓存、模糊检索索引"""
+    print("\n" + "=" * 50)
+    print("变更日志同步测试...")
+    print("=" * 50)
+
+    import models
+    import change_log
+    import fuzzy_index
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO books (title, author, total_quantity, available_quantity) VALUES ('变更日志测试', '作者甲', 2, 2)"
+    )
+    book_id = cursor.lastrowid
+    conn.commit()
+
+    client = app.test_client()
+    assert client.get(f'/api/books/detail/{book_id}').get_json()['book']['available_quantity'] == 2
+    fuzzy_index.get_index()
+    full_resets = change_log.stats()['full_resets']
+
+    # 模拟另一个 worker / 命令行脚本：不经过本进程的写路径
+    cursor.execute("UPDATE books SET available_quantity = 1, title = 'Distributed Systems' WHERE id = ?", (book_id,))
+    conn.commit()
+    conn.close()
+
+    book = client.get(f'/api/books/detail/{book_id}').get_json()['book']
+    assert book['available_quantity'] == 1, '请求前应同步其他进程的写入，不返回缓存中的旧库存'
+    assert book_id in dict(fuzzy_index.get_index().search('distrbuted', 10)), '模糊检索索引应增量更新书名'
+    assert change_log.stats()['full_resets'] == full_resets, '增量变更不应触发全量重建'
+
+    print("✓ 进程外的修改已同步到缓存与检索索引")
+
+def test_bulk_import(library_db):
+    """批量导入：按 ISBN upsert，触发器照常维护全文索引；总数量少于在借册数的行作为错误行拒绝"""
+    print("\n" + "=" * 50)
+    print("批量导入测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+
+    client = app.test_client()
+
+    def upload(text, fmt='csv'):
+        response = client.post(
+            f'/api/admin/books/import?format={fmt}',
+            data=text.encode('utf-8'), content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        ).get_json()
+        assert response['success'], response['message']
+        return response['report']
+
+    report = upload(
+        'title,author,isbn,total_quantity\n'
+        '导入测试甲,作者一,9787111111111,2\n'
+        '导入测试乙,作者二,9787222222222,1\n'
+        '导入测试乙重复,作者二,9787222222222,1\n'
+        ',缺少书名,,1\n'
+    )
+    assert report['inserted'] == 2, f'导入结果不正确: {report}'
+    assert report['duplicates'] == 1 and report['errors'][0]['line'] == 5
+
+    search = client.get('/api/books/search', query_string={'query': '导入测试甲'}).get_json()
+    assert [book['isbn'] for book in search['books']] == ['9787111111111'], '导入后全文索引应已同步'
+    book_id = search['books'][0]['id']
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (username, password) VALUES ('import_reader', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    response = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+    assert response.status_code == 201
+
+    # 甲已借出 1 本：总数量改为 0 会导致库存为负，应拒绝该行并保留原数据；乙正常更新
+    report = upload(
+        'title,author,isbn,total_quantity\n'
+        '导入测试甲,作者一,9787111111111,0\n'
+        '导入测试乙（修订）,作者二,9787222222222,3\n'
+    )
+    assert report['updated'] == 1 and report['error_count'] == 1, f'导入结果不正确: {report}'
+    assert report['errors'][0]['line'] == 2
+    book = client.get(f'/api/books/detail/{book_id}').get_json()['book']
+    assert (book['total_quantity'], book['available_quantity']) == (2, 1), '被拒绝的行不应修改库存'
+
+    # JSONL 中类型不对的字段只拒绝所在行，不中断整个导入
+    report = upload(
+        '{"title": 123, "isbn": "9787333333333"}\n'
+        '{"title": "导入测试丙", "author": ["作者三"]}\n'
+        '{"title": "导入测试丁", "isbn": {"value": 1}}\n'
+        '{"title": "导入测试戊", "total_quantity": [2]}\n'
+        '{"title": "导入测试己", "isbn": "9787444444444", "total_quantity": 2}\n',
+        fmt='jsonl'
+    )
+    assert report['inserted'] == 1 and report['error_count'] == 4, f'导入结果不正确: {report}'
+    assert [error['line'] for error in report['errors']] == [1, 2, 3, 4]
+    assert 'title' in report['errors'][0]['message'] and 'author' in report['errors'][1]['message']
+
+    print("✓ 导入按 ISBN 去重与 upsert，库存不足及字段类型不对的行被拒绝")
+
+def test_availability_replay(library_db):
+    """库存推送：事件ID 为变更日志序号，断线重连从内存历史或变更日志补发，未知 / 已清理的位置发送 reset"""
+    print("\n" + "=" * 50)
+    print("库存推送补发测试...")
+    print("=" * 50)
+
+    import models
+    import availability
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO books (title, total_quantity, available_quantity) VALUES ('推送测试图书', 2, 2)")
+    book_id = cursor.lastrowid
+    cursor.execute("INSERT INTO users (username, password) VALUES ('sse_reader', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    client.get('/api/books/categories')
+    broker = availability.broker
+    before = broker.position
+    response = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+    assert response.status_code == 201
+
+    conn = models.get_db()
+    latest = conn.execute('SELECT MAX(seq) FROM book_changes').fetchone()[0]
+    conn.close()
+    assert broker.position == latest, '事件ID 应为变更日志序号'
+
+    subscription, replay, reset_id = broker.subscribe(before, {book_id})
+    broker.unsubscribe(subscription)
+    assert reset_id is None and [e[2]['available_quantity'] for e in replay] == [1], '应从内存历史补发'
+
+    # 模拟重连到另一个 worker：内存中没有这段历史，从变更日志补发
+    broker.restart(latest)
+    subscription, replay, reset_id = broker.subscribe(before, {book_id})
+    broker.unsubscribe(subscription)
+    assert reset_id is None and replay == [(latest, 'availability', {
+        'book_id': book_id, 'available_quantity': 1, 'total_quantity': 2
+    })], '应从变更日志补发当前库存'
+
+    subscription, replay, reset_id = broker.subscribe(latest + 100)
+    broker.unsubscribe(subscription)
+    assert reset_id == latest and not replay, '未知的事件ID 应发送 reset'
+
+    conn = models.get_db()
+    conn.execute('DELETE FROM book_changes WHERE seq <= ?', (before + 1,))
+    conn.commit()
+    conn.close()
+    subscription, replay, reset_id = broker.subscribe(before, {book_id})
+    broker.unsubscribe(subscription)
+    assert reset_id == latest, '变更日志已清理时应发送 reset'
+
+    print("✓ 事件ID 与变更日志一致，可跨进程补发")
+
+def test_fuzzy_search(library_db):
+    """模糊检索：容忍拼写错误，并与分类、仅可借筛选及分面计数组合"""
+    print("\n" + "=" * 50)
+    print("模糊检索测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+
+    conn = models.get_db()
+    conn.executemany(
+        'INSERT INTO books (title, author, category, total_quantity, available_quantity) VALUES (?, ?, ?, ?, ?)',
+        [
+            ('Database System Concepts', 'Silberschatz', '计算机', 2, 2),
+            ('Database Internals', 'Petrov', '计算机', 1, 0),
+            ('Database Marketing', 'Blattberg', '经济', 1, 1),
+            ('Operating Systems', 'Tanenbaum', '计算机', 1, 1),
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+
+    def search(**params):
+        response = client.get('/api/books/search', query_string=dict(query='databse', fuzzy=1, **params))
+        assert response.status_code == 200
+        return response.get_json()
+
+    titles = [book['title'] for book in search()['books']]
+    assert set(titles) == {'Database System Concepts', 'Database Internals', 'Database Marketing'}, titles
+    assert all(book['fuzzy_score'] > 1 for book in search()['books'])
+
+    titles = [book['title'] for book in search(category='计算机', available=1)['books']]
+    assert titles == ['Database System Concepts'], f'模糊检索应应用筛选条件: {titles}'
+
+    counts = search(category='计算机', facets=1)['facets']
+    assert counts['total'] == 2
+    assert {item['value']: item['count'] for item in counts['categories']} == {'计算机': 2, '经济': 1}
+    print("✓ 拼写错误的查询命中目标图书，筛选与分面计数生效")
+
+    # 取前 limit 本（分层组合枚举）与全部排序的前 limit 本一致；常见词走缓存的图书集合
+    import random
+    import benchmark
+    import datagen
+    import fuzzy_index
+    rng = random.Random(3)
+    word_weights = (datagen.zipf_cum_weights(len(datagen.CHINESE_WORDS), 1.1),
+                    datagen.zipf_cum_weights(len(datagen.ENGLISH_WORDS), 1.1))
+    index = fuzzy_index.FuzzyIndex()
+    for book_id in range(1, 3001):
+        index.add(book_id, datagen.make_title(rng, word_weights), datagen.make_author(rng))
+    queries = benchmark.fuzzy_queries(rng, 60)
+    allowed = set(range(1, 3001, 3))
+    original = fuzzy_index.BOOK_SET_CACHE_MIN
+    fuzzy_index.BOOK_SET_CACHE_MIN = 100
+    try:
+        for round_ in range(2):
+            for query in queries:
+                ranked = index.search(query, None)
+                for limit in (1, 7, 20):
+                    assert index.search(query, limit) == ranked[:limit], (query, limit)
+                assert index.search(query, 20, allowed) == [r for r in ranked if r[0] in allowed][:20], query
+            # 改写、删除部分图书后缓存的集合随之失效
+            for book_id in rng.sample(range(1, 3001), 300):
+                index.add(book_id, datagen.make_title(rng, word_weights), datagen.make_author(rng))
+            for book_id in rng.sample(range(1, 3001), 100):
+                index.remove(book_id)
+    finally:
+        fuzzy_index.BOOK_SET_CACHE_MIN = original
+    assert benchmark.main(['fuzzy', '--books', '2000', '--queries', '30', '--target-ms', '1000']) == 0
+    assert benchmark.main(['fuzzy', '--books', '2000', '--queries', '30', '--target-ms', '0']) == 1
+    print("✓ 取前 N 本与全部排序结果一致，延迟基准按目标判定")
+
+def test_compression_fallback(library_db):
+    """响应压缩：未安装 zstandard 时按 gzip 压缩，客户端只接受 zstd 时不压缩"""
+    print("\n" + "=" * 50)
+    print("响应压缩回退测试...")
+    print("=" * 50)
+
+    import gzip
+    import models
+    import compression
+    from app import app
+
+    conn = models.get_db()
+    conn.executemany(
+        'INSERT INTO books (title, description, total_quantity, available_quantity) VALUES (?, ?, 1, 1)',
+        [(f'压缩测试图书 {i}', '简介' * 50) for i in range(20)]
+    )
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    plain = client.get('/api/books/list').data
+    encoders = compression.ENCODERS
+    # 模拟未安装 zstandard
+    compression.ENCODERS = [encoder for encoder in encoders if encoder[0] != 'zstd']
+    try:
+        response = client.get('/api/books/list', headers={'Accept-Encoding': 'zstd, gzip'})
+        assert response.headers.get('Content-Encoding') == 'gzip', '没有 zstd 时应回退为 gzip'
+        assert gzip.decompress(response.data) == plain
+        response = client.get('/api/books/list', headers={'Accept-Encoding': 'zstd'})
+        assert 'Content-Encoding' not in response.headers and response.data == plain, '无可用编码时应原样返回'
+        assert 'Accept-Encoding' in response.headers.get('Vary', '')
+    finally:
+        compression.ENCODERS = encoders
+
+    if compression.zstandard is not None:
+        response = client.get('/api/books/list', headers={'Accept-Encoding': 'zstd, gzip'})
+        assert response.headers.get('Content-Encoding') == 'zstd'
+        assert compression.zstandard.ZstdDecompressor().decompress(response.data) == plain
+
+    print("✓ zstd 不可用时回退为 gzip")
+
+def test_batch_savepoints(library_db):
+    """批量借还：单事务内每项独立保存点，失败项回滚（包括已执行的写入），其余项照常提交"""
+    print("\n" + "=" * 50)
+    print("批量操作保存点测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+    from transactions import TransactionAbort, run_immediate, run_items
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    book_ids = []
+    for title, quantity in [('批量甲', 1), ('批量乙', 0), ('批量丙', 1)]:
+        cursor.execute(
+            'INSERT INTO books (title, total_quantity, available_quantity) VALUES (?, ?, ?)',
+            (title, max(quantity, 1), quantity)
+        )
+        book_ids.append(cursor.lastrowid)
+    cursor.execute("INSERT INTO users (username, password) VALUES ('batch_reader', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+
+    client = app.test_client()
+    response = client.post(
+        '/api/books/borrow/batch', json={'user_id': user_id, 'book_ids': [*book_ids, 999999]}
+    ).get_json()
+    assert (response['succeeded'], response['failed']) == (2, 2), response
+    assert [item['success'] for item in response['results']] == [True, False, True, False]
+
+    cursor.execute('SELECT book_id FROM borrowing_records WHERE user_id = ? ORDER BY book_id', (user_id,))
+    assert [row[0] for row in cursor.fetchall()] == [book_ids[0], book_ids[2]]
+    cursor.execute('SELECT SUM(available_quantity) FROM books WHERE id IN (?, ?, ?)', book_ids)
+    assert cursor.fetchone()[0] == 0, '成功项扣减库存，失败项不应改变库存'
+
+    # 写入之后才失败的项：保存点回滚该项已执行的写入
+    def operation(c, title):
+        c.execute('INSERT INTO books (title, total_quantity, available_quantity) VALUES (?, 1, 1)', (title,))
+        if title.endswith('失败'):
+            raise TransactionAbort('模拟失败')
+        return c.lastrowid
+
+    results = run_immediate(conn, lambda c: run_items(c, ['保存点一', '保存点失败', '保存点二'], operation))
+    assert [ok for _, ok, _ in results] == [True, False, True]
+    cursor.execute("SELECT title FROM books WHERE title LIKE '保存点%' ORDER BY id")
+    assert [row[0] for row in cursor.fetchall()] == ['保存点一', '保存点二'], '失败项的写入应被回滚'
+    conn.close()
+
+    print("✓ 失败项独立回滚，成功项在同一事务中提交")
+
+def test_catalog_cache(library_db):
+    """目录缓存：LRU 淘汰与 TTL 过期；加载期间发生失效的结果不回填；写入后详情与分类不返回旧数据"""
+    print("\n" + "=" * 50)
+    print("目录缓存测试...")
+    print("=" * 50)
+
+    import time
+    import models
+    from app import app
+    from cache import LRUCache, book_cache
+
+    cache = LRUCache(maxsize=2, ttl=60)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key.upper())
+    assert cache.get('a') == (False, None) and cache.get('c') == (True, 'C'), '应淘汰最久未使用的条目'
+    assert cache.stats()['evictions'] == 1
+
+    # 加载期间其他线程提交了修改并失效：加载到的旧值不能写入缓存
+    def stale_loader():
+        cache.invalidate('d')
+        return 'stale'
+    assert cache.get_or_load('d', stale_loader) == 'stale'
+    assert cache.get('d') == (False, None), '加载期间发生失效时不应回填'
+    assert cache.get_or_load('d', lambda: 'fresh') == 'fresh' and cache.get('d') == (True, 'fresh')
+
+    short = LRUCache(maxsize=2, ttl=0.01)
+    short.set('x', 1)
+    time.sleep(0.02)
+    assert short.get('x') == (False, None) and short.stats()['expirations'] == 1, '超过 TTL 应过期'
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO books (title, category, total_quantity, available_quantity) VALUES ('缓存测试', '旧分类', 1, 1)")
+    book_id = cursor.lastrowid
+    cursor.execute("INSERT INTO users (username, password) VALUES ('cache_reader', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    hits = book_cache.hits
+    for _ in range(2):
+        assert client.get(f'/api/books/detail/{book_id}').get_json()['book']['available_quantity'] == 1
+    assert book_cache.hits == hits + 1, '第二次读取应命中缓存'
+    assert '旧分类' in client.get('/api/books/categories').get_json()['categories']
+
+    client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+    assert client.get(f'/api/books/detail/{book_id}').get_json()['book']['available_quantity'] == 0, '借阅后详情应失效'
+    client.put(f'/api/admin/books/update/{book_id}', json={
+        'title': '缓存测试', 'author': None, 'isbn': None, 'category': '新分类', 'publisher': None,
+        'description': None, 'total_quantity': 1
+    })
+    assert client.get('/api/books/categories').get_json()['categories'] == ['新分类'], '修改分类后分类列表应失效'
+
+    print("✓ 淘汰、过期、代际保护与写后失效均正常")
+
+def test_etag_conditional(library_db):
+    """ETag 条件请求：数据未变化时 304，写入后版本号变化返回新内容；不同查询参数的 ETag 不同"""
+    print("\n" + "=" * 50)
+    print("ETag 条件请求测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO books (title, total_quantity, available_quantity) VALUES ('ETag 测试', 1, 1)")
+    book_id = cursor.lastrowid
+    cursor.execute("INSERT INTO users (username, password) VALUES ('etag_reader', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    first = client.get('/api/books/list')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/api/books/list?limit=5').headers['ETag'] != etag, '查询参数不同 ETag 应不同'
+
+    cached = client.get('/api/books/list', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and not cached.data and cached.headers['ETag'] == etag
+
+    statistics = client.get('/api/admin/borrowings/statistics')
+    assert client.get(
+        '/api/admin/borrowings/statistics', headers={'If-None-Match': statistics.headers['ETag']}
+    ).status_code == 304
+
+    client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+    changed = client.get('/api/books/list', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag, '写入后应返回新内容'
+    assert changed.get_json()['books'][0]['available_quantity'] == 0
+    assert client.get(
+        '/api/admin/borrowings/statistics', headers={'If-None-Match': statistics.headers['ETag']}
+    ).status_code == 200, '借阅记录变化后统计接口的 ETag 应变化'
+
+    print("✓ 未变化时返回 304，写入后 ETag 随数据版本变化")
+
+def test_borrow_statistics(library_db):
+    """借阅统计物化表：借还、改分类、删除图书后，触发器维护的结果与全量重算一致"""
+    print("\n" + "=" * 50)
+    print("借阅统计测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+    from stats import rebuild_statistics
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    book_ids = []
+    for title, category in [('统计甲', '文学'), ('统计乙', '文学'), ('统计丙', '历史')]:
+        cursor.execute(
+            'INSERT INTO books (title, category, total_quantity, available_quantity) VALUES (?, ?, 5, 5)',
+            (title, category)
+        )
+        book_ids.append(cursor.lastrowid)
+    user_ids = []
+    for i in range(3):
+        cursor.execute('INSERT INTO users (username, password) VALUES (?, ?)', (f'stats_reader_{i}', 'x'))
+        user_ids.append(cursor.lastrowid)
+    conn.commit()
+
+    client = app.test_client()
+    records = []
+    for user_id in user_ids:
+        for book_id in book_ids[:2]:
+            response = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+            records.append(response.get_json()['record_id'])
+    client.post('/api/books/borrow', json={'user_id': user_ids[0], 'book_id': book_ids[2]})
+    for record_id in records[:3]:
+        client.post('/api/books/return', json={'record_id': record_id})
+
+    data = client.get('/api/admin/borrowings/statistics').get_json()
+    assert (data['total_borrowings'], data['current_borrowings']) == (7, 4), data
+    assert {item['category']: item['borrow_count'] for item in data['category_stats']} == {'文学': 6, '历史': 1}
+
+    # 改分类、删除已无在借记录的图书后与全量重算比对
+    cursor.execute("UPDATE books SET category = '历史' WHERE id = ?", (book_ids[1],))
+    cursor.execute("UPDATE borrowing_records SET status = 'returned' WHERE book_id = ?", (book_ids[2],))
+    cursor.execute('DELETE FROM books WHERE id = ?', (book_ids[2],))
+    conn.commit()
+
+    def snapshot():
+        tables = {}
+        for table, key in [('book_borrow_stats', 'book_id'), ('category_borrow_stats', 'category'),
+                           ('borrowing_totals', 'id')]:
+            cursor.execute(f'SELECT * FROM {table} ORDER BY {key}')
+            tables[table] = [tuple(row) for row in cursor.fetchall()]
+        return tables
+
+    incremental = snapshot()
+    rebuild_statistics(cursor)
+    assert snapshot() == incremental, '触发器增量维护的统计应与全量重算一致'
+    conn.rollback()
+    conn.close()
+
+    print("✓ 统计接口与物化表在各类写入后保持一致")
+
+def test_ratings(library_db):
+    """评分聚合：评分 / 改分后图书的 rating_sum、rating_count 同步更新；高分榜按平均分排序并走索引"""
+    print("\n" + "=" * 50)
+    print("评分与高分榜测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+    from ratings import AVERAGE_RATING
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    book_ids = []
+    for title in ('评分甲', '评分乙', '评分丙'):
+        cursor.execute(
+            "INSERT INTO books (title, category, total_quantity, available_quantity) VALUES (?, '小说', 5, 5)",
+            (title,)
+        )
+        book_ids.append(cursor.lastrowid)
+    user_ids = []
+    for i in range(2):
+        cursor.execute('INSERT INTO users (username, password) VALUES (?, ?)', (f'rating_reader_{i}', 'x'))
+        user_ids.append(cursor.lastrowid)
+    conn.commit()
+
+    client = app.test_client()
+
+    def borrow_and_return(user_id, book_id):
+        record_id = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id}).get_json()['record_id']
+        assert client.post('/api/books/rate', json={'record_id': record_id, 'rating': 5}).status_code == 400, \
+            '未归还的图书不能评分'
+        client.post('/api/books/return', json={'record_id': record_id})
+        return record_id
+
+    # 甲：5 + 4；乙：5（仅 1 人）；丙：3 + 3
+    ratings = {book_ids[0]: [5, 4], book_ids[1]: [5], book_ids[2]: [3, 3]}
+    records = {}
+    for book_id, scores in ratings.items():
+        for user_id, score in zip(user_ids, scores):
+            record_id = borrow_and_return(user_id, book_id)
+            records[(user_id, book_id)] = record_id
+            assert client.post('/api/books/rate', json={'record_id': record_id, 'rating': score}).status_code == 200
+
+    book = client.get(f'/api/books/detail/{book_ids[0]}').get_json()['book']
+    assert (book['rating_sum'], book['rating_count']) == (9, 2)
+    # 改分：聚合按差值调整，不重复计数
+    client.post('/api/books/rate', json={'record_id': records[(user_ids[1], book_ids[0])], 'rating': 2})
+    book = client.get(f'/api/books/detail/{book_ids[0]}').get_json()['book']
+    assert (book['rating_sum'], book['rating_count']) == (7, 2), '改分后详情应反映新的聚合值'
+
+    top = client.get('/api/books/top-rated', query_string={'category': '小说'}).get_json()['books']
+    assert [b['title'] for b in top] == ['评分乙', '评分甲', '评分丙'], [b['title'] for b in top]
+    top = client.get('/api/books/top-rated', query_string={'category': '小说', 'min_ratings': 2}).get_json()['books']
+    assert [b['title'] for b in top] == ['评分甲', '评分丙'] and top[0]['average_rating'] == 3.5
+    assert client.get('/api/books/top-rated').status_code == 400, '缺少分类应返回 400'
+
+    cursor.execute(
+        f'''EXPLAIN QUERY PLAN SELECT * FROM books WHERE category = ? AND rating_count >= 1
+            ORDER BY ({AVERAGE_RATING}) DESC, rating_count DESC LIMIT 10''',
+        ('小说',)
+    )
+    plan = ' '.join(row[-1] for row in cursor.fetchall())
+    assert 'idx_books_category_rating' in plan and 'TEMP B-TREE' not in plan, plan
+    conn.close()
+
+    print("✓ 评分聚合增量更新，高分榜按索引顺序读取")
+
+def test_export_date_bounds(library_db):
+    """流式导出：日期下界包含、只给日期的上界包含当天、带时间的上界不含；格式与压缩"""
+    print("\n" + "=" * 50)
+    print("数据导出测试...")
+    print("=" * 50)
+
+    import csv
+    import gzip
+    import io
+    import json
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO books (title, total_quantity, available_quantity) VALUES ('导出测试', 5, 5)")
+    book_id = cursor.lastrowid
+    cursor.execute("INSERT INTO users (username, password) VALUES ('export_reader', 'x')")
+    user_id = cursor.lastrowid
+    dates = ['2024-03-01T08:00:00', '2024-03-02T00:00:00', '2024-03-02T23:59:59', '2024-03-03T00:00:00']
+    for borrow_date in dates:
+        cursor.execute(
+            """INSERT INTO borrowing_records (user_id, book_id, borrow_date, due_date, status)
+               VALUES (?, ?, ?, ?, 'returned')""",
+            (user_id, book_id, borrow_date, borrow_date)
+        )
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+
+    def exported(**params):
+        response = client.get('/api/admin/export/borrowings', query_string=dict(params, format='ndjson'))
+        assert response.status_code == 200
+        assert response.content_type.startswith('application/x-ndjson')
+        return [json.loads(line)['borrow_date'] for line in response.get_data(as_text=True).splitlines()]
+
+    assert exported() == dates
+    assert exported(**{'from': '2024-03-02', 'to': '2024-03-02'}) == dates[1:3], '只给日期的上界应包含当天全天'
+    assert exported(**{'from': '2024-03-02T12:00:00'}) == dates[2:]
+    assert exported(to='2024-03-02T00:00:00') == dates[:1], '带时间的上界不包含该时刻'
+
+    response = client.get('/api/admin/export/borrowings', query_string={'from': '2024-03-03', 'gzip': '1'})
+    assert response.content_type == 'application/gzip'
+    assert '.csv.gz' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode('utf-8'))))
+    assert [row['borrow_date'] for row in rows] == dates[3:] and rows[0]['title'] == '导出测试'
+
+    assert client.get('/api/admin/export/borrowings', query_string={'from': '2024-13-01'}).status_code == 400
+    assert client.get('/api/admin/export/books', query_string={'from': '2024-03-01'}).status_code == 400, \
+        '图书数据没有日期列'
+    assert client.get('/api/admin/export/borrowings', query_string={'format': 'xml'}).status_code == 400
+    assert client.get('/api/admin/export/unknown').status_code == 400
+
+    print("✓ 日期边界、格式与 gzip 导出正确")
+
+def test_pinyin_search(library_db):
+    """拼音检索：全拼、首字母（含少于 3 个字符的 LIKE 路径）命中书名与作者，修改书名后拼音随之更新"""
+    print("\n" + "=" * 50)
+    print("拼音检索测试...")
+    print("=" * 50)
+
+    import pinyin_search
+    from app import app
+
+    if pinyin_search.lazy_pinyin is None:
+        assert pinyin_search.pinyin_key('数据库系统概念') is None
+        print("✓ 未安装 pypinyin，拼音列留空")
+        return
+
+    assert pinyin_search.to_pinyin('C++程序设计') == ('cchengxusheji', 'ccxsj')
+    assert pinyin_search.pinyin_key('数据库系统概念', '萨师煊') == \
+        'shujukuxitonggainian sjkxtgn sashixuan ssx'
+
+    client = app.test_client()
+
+    def add(title, author):
+        response = client.post('/api/admin/books/add', json={'title': title, 'author': author, 'total_quantity': 1})
+        assert response.status_code == 201
+        return response.get_json()['book_id']
+
+    def titles(query):
+        response = client.get('/api/books/search', query_string={'query': query})
+        return sorted(book['title'] for book in response.get_json()['books'])
+
+    db_book = add('数据库系统概念', '萨师煊')
+    add('算法导论', 'Thomas Cormen')
+    add('深入理解计算机系统', '布莱恩特')
+
+    assert titles('sjk') == ['数据库系统概念']
+    assert titles('shujuku') == ['数据库系统概念']
+    assert titles('ssx') == ['数据库系统概念'], '作者首字母应可检索'
+    assert titles('sf') == ['算法导论'], '两个字母的首字母走 LIKE 路径'
+    assert titles('xitong') == ['数据库系统概念', '深入理解计算机系统']
+    assert titles('xitong sj') == ['数据库系统概念', '深入理解计算机系统'], '长词走索引、短词在结果上过滤'
+
+    client.put(f'/api/admin/books/update/{db_book}', json={
+        'title': '数据结构', 'author': '严蔚敏', 'total_quantity': 1
+    })
+    assert titles('sjk') == []
+    assert titles('sjjg') == ['数据结构']
+
+    print("✓ 全拼与首字母检索正确")
+
+def test_suggest_ranking(library_db):
+    """前缀联想：书名词后缀、作者、带连字符的 ISBN 命中；按借阅热度、书名长度排序；随图书增删增量更新"""
+    print("\n" + "=" * 50)
+    print("搜索联想测试...")
+    print("=" * 50)
+
+    import autocomplete
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (username, password) VALUES ('suggest_reader', 'x')")
+    user_id = cursor.lastrowid
+    book_ids = {}
+    for title, author, isbn, borrows in (
+        ('Python', 'Guido', '9787111111111', 0),
+        ('Python Cookbook', 'David Beazley', '9787222222222', 3),
+        ('Learning Python', 'Mark Lutz', '9787333333333', 1),
+    ):
+        cursor.execute(
+            'INSERT INTO books (title, author, isbn, total_quantity, available_quantity) VALUES (?, ?, ?, 5, 5)',
+            (title, author, isbn)
+        )
+        book_ids[title] = cursor.lastrowid
+        for _ in range(borrows):
+            cursor.execute(
+                """INSERT INTO borrowing_records (user_id, book_id, borrow_date, due_date, status)
+                   VALUES (?, ?, '2024-01-01T00:00:00', '2024-02-01T00:00:00', 'returned')""",
+                (user_id, book_ids[title])
+            )
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+
+    def suggest(prefix, limit=8):
+        response = client.get('/api/books/suggest', query_string={'prefix': prefix, 'limit': limit})
+        assert response.status_code == 200
+        return response.get_json()['suggestions']
+
+    result = suggest('py')
+    assert [s['title'] for s in result] == ['Python Cookbook', 'Learning Python', 'Python'], \
+        '借阅次数多的在前，次数相同时书名较短的在前'
+    assert [s['borrow_count'] for s in result] == [3, 1, 0]
+    assert all(s['matched'] == 'title' for s in result)
+    assert [s['title'] for s in suggest('py', limit=1)] == ['Python Cookbook']
+
+    result = suggest('guido')
+    assert [(s['title'], s['matched']) for s in result] == [('Python', 'author')]
+    result = suggest('978-7-333')
+    assert [(s['title'], s['matched']) for s in result] == [('Learning Python', 'isbn')]
+    assert suggest('   ') == [] and suggest('java') == []
+    assert client.get('/api/books/suggest', query_string={'prefix': 'py', 'limit': 21}).status_code == 400
+
+    # 借阅热度定期刷新
+    conn = models.get_db()
+    cursor = conn.cursor()
+    for _ in range(5):
+        cursor.execute(
+            """INSERT INTO borrowing_records (user_id, book_id, borrow_date, due_date, status)
+               VALUES (?, ?, '2024-01-02T00:00:00', '2024-02-02T00:00:00', 'returned')""",
+            (user_id, book_ids['Python'])
+        )
+    conn.commit()
+    conn.close()
+    autocomplete.get_index()._popularity_loaded_at = 0.0
+    assert suggest('py')[0]['title'] == 'Python'
+
+    # 新增、修改、删除图书后索引增量更新
+    response = client.post('/api/admin/books/add', json={'title': 'Pytest 实战', 'total_quantity': 1})
+    new_id = response.get_json()['book_id']
+    assert 'Pytest 实战' in [s['title'] for s in suggest('pyt')]
+    client.put(f'/api/admin/books/update/{book_ids["Learning Python"]}', json={
+        'title': 'Fluent Python', 'author': 'Luciano Ramalho', 'isbn': '9787333333333', 'total_quantity': 5
+    })
+    assert suggest('learning') == [] and [s['title'] for s in suggest('fluent')] == ['Fluent Python']
+    client.delete(f'/api/admin/books/delete/{new_id}')
+    assert 'Pytest 实战' not in [s['title'] for s in suggest('pyt')]
+
+    print("✓ 联想命中字段与热度排序正确，索引随图书修改更新")
+
+def test_facet_counts(library_db):
+    """分面计数：各筛选组合下与直接按数据计算的多选口径一致；借阅、修改分类、删除后计数随之更新"""
+    print("\n" + "=" * 50)
+    print("分面计数测试...")
+    print("=" * 50)
+
+    import itertools
+    import facets
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    for i, (category, publisher, available) in enumerate(itertools.product(
+            ('文学', '历史', None), ('甲出版社', '乙出版社'), (0, 1, 2))):
+        cursor.execute(
+            """INSERT INTO books (title, category, publisher, total_quantity, available_quantity)
+               VALUES (?, ?, ?, 2, ?)""",
+            (f'分面{i} 史记' if i % 2 else f'分面{i}', category, publisher, available)
+        )
+    cursor.execute("INSERT INTO users (username, password) VALUES ('facet_reader', 'x')")
+    user_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+
+    def expected(keyword, category, publisher, available_only):
+        """按数据库当前内容直接计算多选分面口径"""
+        conn = models.get_db()
+        rows = [dict(row) for row in conn.execute('SELECT * FROM books').fetchall()]
+        conn.close()
+        if keyword:
+            rows = [row for row in rows if keyword in row['title']]
+
+        def matches(row, skip=None):
+            return ((skip == 'category' or not category or row['category'] == category)
+                    and (skip == 'publisher' or not publisher or row['publisher'] == publisher)
+                    and (skip == 'availability' or not available_only or row['available_quantity'] > 0))
+
+        def value_counts(field):
+            counts = {}
+            for row in rows:
+                if row[field] and matches(row, skip=field if field == 'category' else 'publisher'):
+                    counts[row[field]] = counts.get(row[field], 0) + 1
+            return sorted(({'value': v, 'count': c} for v, c in counts.items()),
+                          key=lambda item: (-item['count'], item['value']))
+
+        scoped = [row for row in rows if matches(row, skip='availability')]
+        return {
+            'total': sum(1 for row in rows if matches(row)),
+            'categories': value_counts('category'),
+            'publishers': value_counts('publisher'),
+            'availability': {
+                'available': sum(1 for row in scoped if row['available_quantity'] > 0),
+                'all': len(scoped),
+            },
+        }
+
+    def check_all():
+        for keyword, category, publisher, available_only in itertools.product(
+                ('', '史记'), ('', '文学', '历史'), ('', '乙出版社'), (False, True)):
+            params = {'category': category, 'publisher': publisher, 'facets': 1}
+            if keyword:
+                params['query'] = keyword
+            if available_only:
+                params['available'] = 1
+            response = client.get('/api/books/search', query_string=params)
+            assert response.status_code == 200
+            assert response.get_json()['facets'] == expected(keyword, category, publisher, available_only), params
+
+    check_all()
+
+    # 借走最后一本：该书不再计入可借
+    conn = models.get_db()
+    book_id = conn.execute("SELECT id FROM books WHERE available_quantity = 1 AND category = '文学'").fetchone()[0]
+    conn.close()
+    response = client.post('/api/books/borrow', json={'user_id': user_id, 'book_id': book_id})
+    assert response.status_code == 201
+    check_all()
+
+    # 修改分类与出版社、删除图书
+    client.put(f'/api/admin/books/update/{book_id}', json={
+        'title': '分面改', 'category': '历史', 'publisher': '丙出版社', 'total_quantity': 2
+    })
+    conn = models.get_db()
+    deleted_id = conn.execute("SELECT id FROM books WHERE category IS NULL LIMIT 1").fetchone()[0]
+    conn.close()
+    client.delete(f'/api/admin/books/delete/{deleted_id}')
+    check_all()
+    counts = client.get('/api/books/search', query_string={'facets': 1}).get_json()['facets']
+    assert {'value': '丙出版社', 'count': 1} in counts['publishers']
+
+    # 另一种存储 / 计数方式：全部取值存图书ID数组，关键词命中也走位图求交
+    saved = facets.SMALL_MATCH, facets.DENSE_RATIO
+    facets.SMALL_MATCH, facets.DENSE_RATIO = 0, 0
+    try:
+        facets.invalidate()
+        check_all()
+        stats = facets.stats()
+        assert stats['id_array_bytes'] > 0 and stats['bitmap_bytes'] <= 2 * 8, stats
+    finally:
+        facets.SMALL_MATCH, facets.DENSE_RATIO = saved
+        facets.invalidate()
+    assert facets.popcount(0b1011 << 100) == 3
+
+    print("✓ 分面计数与按数据直接计算的结果一致")
+
+def test_metrics_output(library_db):
+    """指标输出：按路由与状态码计数、直方图累计桶、SQL 规范化聚合与行数、慢查询计数"""
+    print("\n" + "=" * 50)
+    print("运行指标测试...")
+    print("=" * 50)
+
+    import re
+    import metrics
+    import models
+    from app import app
+
+    if not metrics.ENABLED:
+        print("✓ METRICS_ENABLED=0，跳过")
+        return
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    for i in range(3):
+        cursor.execute('INSERT INTO books (title, total_quantity, available_quantity) VALUES (?, 1, 1)', (f'指标{i}',))
+    book_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    metrics.reset()
+    client.get(f'/api/books/detail/{book_id}')
+    client.get(f'/api/books/detail/{book_id}')
+    client.get('/api/books/detail/999999')
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM books WHERE id IN (?, ?)', (1, 2))
+    cursor.fetchall()
+    cursor.execute('SELECT id   FROM books\n WHERE id IN (?, ?, ?)', (1, 2, 3))
+    cursor.fetchall()
+    cursor.execute('SELECT id FROM books WHERE id IN (?)', (1,))
+    cursor.fetchall()
+    saved = metrics.SLOW_QUERY_MS
+    metrics.SLOW_QUERY_MS = 0
+    try:
+        cursor.execute("SELECT 'slow'")
+        cursor.fetchone()
+    finally:
+        metrics.SLOW_QUERY_MS = saved
+    conn.close()
+
+    response = client.get('/api/metrics')
+    assert response.status_code == 200 and response.mimetype == 'text/plain'
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+
+    assert samples['http_requests_in_flight'] == 1, '统计时只有 /api/metrics 本身在处理'
+    endpoint = 'endpoint="/api/books/detail/<int:book_id>",method="GET"'
+    assert samples[f'http_requests_total{{{endpoint},status="200"}}'] == 2
+    assert samples[f'http_requests_total{{{endpoint},status="404"}}'] == 1
+    buckets = [value for name, value in samples.items()
+               if name.startswith(f'http_request_duration_seconds_bucket{{{endpoint},')]
+    assert buckets == sorted(buckets) and buckets[-1] == 3, '直方图桶应为累计计数'
+    assert samples[f'http_request_duration_seconds_count{{{endpoint}}}'] == 3
+
+    statement = 'statement="SELECT id FROM books WHERE id IN (?...)"'
+    assert samples[f'sql_query_duration_seconds_count{{{statement}}}'] == 3, '空白与 IN 列表长度不同的语句应合并'
+    assert samples[f'sql_query_rows_total{{{statement}}}'] == 6
+    assert samples['sql_slow_queries_total{statement="SELECT \'slow\'"}'] == 1
+    assert not any(re.search(r'sql_slow_queries_total\{statement="SELECT id', name) for name in samples)
+
+    # 开头相同的长语句（如列表与各种检索的 json_object 列清单）分别统计
+    columns = ', '.join(f"'c{i}', c{i}" for i in range(40))
+    first = metrics.normalize_sql(f'SELECT json_object({columns}) FROM books ORDER BY id')
+    second = metrics.normalize_sql(f'SELECT json_object({columns}) FROM books WHERE category = ? ORDER BY id')
+    assert first != second and first[:100] == second[:100]
+    assert len(first) <= metrics.MAX_STATEMENT_LENGTH
+    assert metrics.normalize_sql(f'SELECT json_object({columns}) FROM books ORDER BY id') == first
+
+    metrics.reset()
+    client.get('/api/books/list')
+    client.get('/api/books/search', query_string={'query': '指标'})
+    client.get('/api/books/search', query_string={'category': '小说'})
+    text = client.get('/api/metrics').get_data(as_text=True)
+    assert 'detail' not in text
+    statements = set(re.findall(r'sql_query_duration_seconds_count\{statement="(SELECT json_object[^"]*)"\}', text))
+    assert len(statements) == 3, statements
+
+    print("✓ 请求与 SQL 指标输出正确")
+
+def test_static_assets(library_db):
+    """前端静态资源：预压缩、按 Accept-Encoding 选择编码、ETag / 304、Vary 与缓存策略"""
+    print("\n" + "=" * 50)
+    print("静态资源测试...")
+    print("=" * 50)
+
+    import gzip
+    import os
+    import tempfile
+    import app as app_module
+    import static_assets
+
+    script = ('console.log("智慧图书馆");\n' * 200).encode('utf-8')
+    html = ('<!doctype html><html><body>' + '<div id="root"></div>' * 100 + '</body></html>').encode('utf-8')
+    with tempfile.TemporaryDirectory() as dist:
+        os.makedirs(os.path.join(dist, 'assets'))
+        files = {
+            'index.html': html,
+            'assets/index-AbCdEf12.js': script,
+            'favicon.svg': b'<svg xmlns="http://www.w3.org/2000/svg"/>',
+        }
+        for name, data in files.items():
+            with open(os.path.join(dist, name), 'wb') as f:
+                f.write(data)
+
+        expected = 2 * (2 if static_assets.brotli is not None else 1)
+        assert static_assets.precompress(dist) == expected, '只压缩足够大的文本文件'
+        assert static_assets.precompress(dist) == 0, '已是最新的预压缩文件不重复生成'
+        assert not os.path.exists(os.path.join(dist, 'favicon.svg.gz'))
+
+        saved = app_module.frontend_assets
+        app_module.frontend_assets = static_assets.build_manifest(dist)
+        client = app_module.app.test_client()
+        try:
+            path = '/assets/index-AbCdEf12.js'
+            response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert gzip.decompress(response.data) == script
+            assert response.headers['Vary'] == 'Accept-Encoding'
+            assert response.headers['Cache-Control'] == static_assets.IMMUTABLE
+            gzip_etag = response.headers['ETag']
+
+            response = client.get(path, headers={'Accept-Encoding': 'br;q=0, gzip;q=0'})
+            assert 'Content-Encoding' not in response.headers and response.data == script
+            identity_etag = response.headers['ETag']
+            assert identity_etag != gzip_etag, '各编码的 ETag 不同'
+
+            response = client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzip_etag})
+            assert response.status_code == 304 and response.data == b''
+            response = client.get(path, headers={'If-None-Match': gzip_etag})
+            assert response.status_code == 200 and response.data == script, '编码不同时 ETag 不匹配'
+
+            if static_assets.brotli is not None:
+                response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+                assert response.headers['Content-Encoding'] == 'br'
+                assert static_assets.brotli.decompress(response.data) == script
+
+            # 前端路由回退到 index.html，短缓存；旧构建的 assets 返回 404
+            response = client.get('/borrowings', headers={'Accept-Encoding': 'gzip'})
+            assert gzip.decompress(response.data) == html
+            assert response.headers['Cache-Control'] == static_assets.SHORT_TTL
+            assert client.get('/assets/index-Old12345.js').status_code == 404
+            assert client.get('/api/unknown').status_code == 404
+
+            response = client.get('/favicon.svg', headers={'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers and 'Vary' not in response.headers
+
+            # 早于原文件的预压缩文件忽略；超过 MAX_CACHED_FILE 的文件从磁盘读取
+            stale = os.path.join(dist, 'index.html.gz')
+            os.utime(stale, (0, 0))
+            saved_limit = static_assets.MAX_CACHED_FILE
+            static_assets.MAX_CACHED_FILE = 100
+            try:
+                manifest = static_assets.build_manifest(dist)
+            finally:
+                static_assets.MAX_CACHED_FILE = saved_limit
+            assert set(manifest['index.html'].variants) == {'identity'} | (
+                {'br'} if static_assets.brotli is not None else set())
+            app_module.frontend_assets = manifest
+            response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+            assert gzip.decompress(response.get_data()) == script and response.headers['ETag'] == gzip_etag
+            response.close()
+        finally:
+            app_module.frontend_assets = saved
+
+    print("✓ 预压缩与内容协商正确")
+
+def test_sync_during_index_build(library_db):
+    """索引全量构建期间的变更：同步与其他请求不等待构建，构建完成后补上构建期间的修改"""
+    print("\n" + "=" * 50)
+    print("索引构建期间同步测试...")
+    print("=" * 50)
+
+    import threading
+    import time
+    import availability
+    import change_log
+    import fuzzy_index
+    import models
+    from app import app
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO books (title, author, total_quantity, available_quantity) VALUES ('Operating Systems', '甲', 1, 1)")
+    book_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    client.get('/api/health')
+    fuzzy_index.invalidate()
+
+    # 构建读完快照后停住，直到测试放行
+    lazy = fuzzy_index._lazy
+    real_build = lazy._build
+    snapshot_taken, release = threading.Event(), threading.Event()
+
+    def slow_build(cursor):
+        index = real_build(cursor)
+        snapshot_taken.set()
+        release.wait(10)
+        return index
+
+    def timed(work):
+        """在线程中执行 work，返回耗时（秒）；超过 5 秒视为被阻塞"""
+        done, errors = threading.Event(), []
+
+        def run():
+            try:
+                work()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+        started = time.perf_counter()
+        threading.Thread(target=run, daemon=True).start()
+        assert done.wait(5), '请求被索引构建阻塞'
+        if errors:
+            raise errors[0]
+        return time.perf_counter() - started
+
+    lazy._build = slow_build
+    saved_get_db = availability.get_db
+    try:
+        builder = threading.Thread(target=fuzzy_index.get_index, daemon=True)
+        builder.start()
+        assert snapshot_taken.wait(5)
+
+        # 同步使用自己借出的一个连接，推送库存不再另借连接
+        def no_second_connection():
+            raise AssertionError('同步期间不应再借出连接')
+        availability.get_db = no_second_connection
+
+        def rename():
+            response = client.put(f'/api/admin/books/update/{book_id}', json={
+                'title': 'Distributed Systems', 'author': '甲', 'total_quantity': 1
+            })
+            assert response.status_code == 200
+        timed(rename)
+        timed(lambda: client.get('/api/health'))
+        assert builder.is_alive(), '构建仍在进行'
+        availability.get_db = saved_get_db
+
+        release.set()
+        builder.join(5)
+        index = fuzzy_index.get_index()
+        assert book_id in dict(index.search('distrbuted', 10)), '构建期间的修改应在构建完成后生效'
+        assert book_id not in dict(index.search('operating', 10))
+
+        # 构建期间发生失效：构建结果不安装，下次使用时重建
+        snapshot_taken.clear()
+        release.clear()
+        fuzzy_index.invalidate()
+        builder = threading.Thread(target=fuzzy_index.get_index, daemon=True)
+        builder.start()
+        assert snapshot_taken.wait(5)
+        timed(fuzzy_index.invalidate)
+        release.set()
+        builder.join(5)
+        assert lazy.current is None
+    finally:
+        release.set()
+        lazy._build = real_build
+        availability.get_db = saved_get_db
+
+    print("✓ 同步不等待索引构建，构建期间的修改随后生效")
+
+def test_cursor_pagination(library_db):
+    """游标分页：排序键重复时逐页翻完不重不漏，篡改的游标返回 400"""
+    print("\n" + "=" * 50)
+    print("游标分页测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+    from pagination import decode_cursor, encode_cursor
+
+    values = ['标题 "引号"', 42, 3.5, None]
+    assert decode_cursor(encode_cursor(values)) == values, '游标应能原样解码'
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    # 入库时间全部相同、书名只有三种：排序键大量重复，只能靠 id 区分先后
+    cursor.executemany(
+        'INSERT INTO books (title, author, total_quantity, available_quantity, created_at) VALUES (?, ?, 1, 1, ?)',
+        [(f'游标分页 {"ABC"[i % 3]}', '作者', '2024-01-01 00:00:00') for i in range(23)]
+    )
+    conn.commit()
+    cursor.execute('SELECT id FROM books ORDER BY created_at DESC, id DESC')
+    expected = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+
+    client = app.test_client()
+
+    def walk(path):
+        ids, token = [], None
+        while True:
+            response = client.get(path + (f'&cursor={token}' if token else ''))
+            assert response.status_code == 200, response.get_json()
+            data = response.get_json()
+            ids.extend(book['id'] for book in data['books'])
+            token = data['next_cursor']
+            if not token:
+                return ids
+
+    assert walk('/api/books/list?limit=5') == expected, '列表翻页应按 (入库时间, id) 稳定排序且不重不漏'
+    for query in ('游标分页', '分页'):      # 全文检索（按相关度）与短词 LIKE（按书名）两种排序
+        path = f'/api/books/search?query={query}'
+        ids = walk(path + '&limit=4')
+        assert ids == walk(path + '&limit=200'), f'{query}: 分页结果应与一次取完一致'
+        assert sorted(ids) == sorted(expected), f'{query}: 翻页应不重不漏'
+
+    bad_tokens = ['!!!', encode_cursor({'a': 1}), encode_cursor([]), encode_cursor(['2024-01-01']),
+                  encode_cursor([['2024-01-01'], 1]), encode_cursor([{'x': 1}, 1]), encode_cursor([True, 1]),
+                  encode_cursor(['2024-01-01', 1, 2]), encode_cursor([float('inf'), 1])]
+    for token in bad_tokens:
+        for path in ('/api/books/list?limit=5', '/api/books/search?query=游标分页&limit=4'):
+            response = client.get(f'{path}&cursor={token}')
+            assert response.status_code == 400, (path, token, response.status_code)
+            assert response.get_json()['success'] is False
+    print("✓ 游标往返一致，重复排序键翻页稳定，非法游标返回 400")
+
+def test_full_text_search(library_db):
+    """全文检索：bm25 按列权重排序、中文子串命中、短词与无索引时回退 LIKE，迁移可重复执行"""
+    print("\n" + "=" * 50)
+    print("全文检索测试...")
+    print("=" * 50)
+
+    import models
+    from app import app
+    from fts import FTS_TABLE, FTS_TRIGGERS
+    from migrations import LATEST_VERSION, apply_migrations, get_version
+
+    conn = models.get_db()
+    cursor = conn.cursor()
+    cursor.executemany(
+        'INSERT INTO books (title, author, description, total_quantity, available_quantity) VALUES (?, ?, ?, 1, 1)',
+        [
+            ('Cooking Basics', 'Chef', 'notes from the zephyrine valley'),    # 只在简介中命中
+            ('Garden Stories', 'Zephyrine Press', ''),                         # 作者命中
+            ('Zephyrine Handbook', 'Anon', ''),                                # 书名命中
+            ('分布式系统原理与范型', '塔嫩鲍姆', ''),
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+
+    def search(query):
+        response = client.get('/api/books/search', query_string={'query': query, 'limit': 50})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['books']
+
+    books = search('zephyrine')
+    assert [b['title'] for b in books] == ['Zephyrine Handbook', 'Garden Stories', 'Cooking Basics'], \
+        f'bm25 应按书名 > 作者 > 简介的权重排序: {[b["title"] for b in books]}'
+    assert all('score' in b for b in books), '三个字符以上的查询应走全文索引'
+
+    books = search('式系统原')
+    assert [b['title'] for b in books] == ['分布式系统原理与范型'], '中文应能按任意子串命中'
+    assert search('系统范型') == [], '不连续的中文不应命中'
+
+    books = search('分布')
+    assert [b['title'] for b in books] == ['分布式系统原理与范型'] and 'score' not in books[0], \
+        '不足三个字符的查询应回退为 LIKE'
+    assert [b['title'] for b in search('zephyrine Ha')] == ['Zephyrine Handbook'], '过短的词应在索引结果上再过滤'
+
+    # 全文索引不可用（如 SQLite 版本过低）时整体回退为 LIKE：只匹配书名、作者等，不匹配简介
+    conn = models.get_db()
+    for trigger in FTS_TRIGGERS:
+        conn.execute(f'DROP TRIGGER {trigger}')
+    conn.execute(f'DROP TABLE {FTS_TABLE}')
+    conn.commit()
+    conn.close()
+    books = search('zephyrine')
+    assert sorted(b['title'] for b in books) == ['Garden Stories', 'Zephyrine Handbook'], books
+    assert all('score' not in b for b in books)
+    print("✓ bm25 排序、中文子串与短词回退正常")
+
+    # 迁移可重复执行：已是最新版本时不执行任何迁移，表结构不变
+    conn = models.get_db()
+    schema = conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall()
+    assert get_version(conn) == LATEST_VERSION
+    assert apply_migrations(conn) == 0
+    conn.close()
+    models.init_db()
+    conn = models.get_db()
+    assert get_version(conn) == LATEST_VERSION
+    assert conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall() == schema
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'").fetchone()[0] == 1
+    conn.close()
+    print("✓ 重复初始化与迁移不改变数据库结构")
+
+def test_connection_pool(library_db):
+    """连接池：请求间复用连接，连接已设置 PRAGMA，请求出错时连接同样归还"""
+    print("\n" + "=" * 50)
+    print("连接池测试...")
+    print("=" * 50)
+
+    import db_pool
+    import models
+    from app import app
+    from routes import books
+
+    pool = db_pool.get_pool(models.DATABASE)
+    conn = models.get_db()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1     # NORMAL
+    conn.close()
+    assert conn.closed
+
+    client = app.test_client()
+    for _ in range(20):
+        assert client.get('/api/books/list?limit=5').status_code == 200
+        assert client.get('/api/books/search?query=Python').status_code == 200
+    created = pool.stats()['created']
+    assert created <= 2, f'顺序请求应复用连接，实际新建 {created} 个'
+    assert pool.stats()['idle'] == created, '请求结束后连接应全部归还'
+
+    # 借出连接后抛出异常：由应用上下文的 teardown 归还
+    def broken(cursor):
+        raise RuntimeError('模拟查询出错')
+
+    saved = books.fts_available
+    books.fts_available = broken
+    try:
+        for _ in range(3):
+            try:
+                response = client.get('/api/books/search?query=Python')
+                assert response.status_code == 500
+            except RuntimeError:
+                pass        # TESTING 模式下异常直接抛给测试客户端
+    finally:
+        books.fts_available = saved
+    assert pool.stats()['created'] == created and pool.stats()['idle'] == created, pool.stats()
+    print("✓ 连接复用、PRAGMA 设置与异常后归还正常")
+
+def test_schema_migrations(library_db):
+    """迁移：未迁移的旧库升级到最新版本且保留数据，常用查询走二级索引，失败的迁移整体回滚"""
+    print("\n" + "=" * 50)
+    print("结构迁移测试...")
+    print("=" * 50)
+
+    import migrations
+    import models
+    from fts import FTS_TABLE
+
+    # 只建基础表、不执行迁移，模拟升级前的 library.db
+    saved_database, saved_apply = models.DATABASE, models.apply_migrations
+    models.DATABASE = os.path.join(tempfile.mkdtemp(), 'legacy.db')
+    models.apply_migrations = lambda conn: 0
+    try:
+        models.init_db()
+    finally:
+        models.apply_migrations = saved_apply
+    try:
+        conn = models.get_db()
+        assert migrations.get_version(conn) == 0
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO books (title, author, category) VALUES ('旧库中的图书', '作者', '编程')")
+        book_id = cursor.lastrowid
+        cursor.execute("INSERT INTO borrowing_records (user_id, book_id, due_date) VALUES (1, ?, '2099-01-01')",
+                       (book_id,))
+        conn.commit()
+
+        assert migrations.apply_migrations(conn) == len(migrations.MIGRATIONS)
+        assert migrations.get_version(conn) == migrations.LATEST_VERSION
+        assert cursor.execute('SELECT title FROM books WHERE id = ?', (book_id,)).fetchone()[0] == '旧库中的图书'
+        cursor.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?', ('"库中的"',))
+        assert [row[0] for row in cursor.fetchall()] == [book_id], '已有图书应回填到全文索引'
+
+        def plan(sql, params=()):
+            return ' '.join(row[-1] for row in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+        assert 'idx_borrowing_user_date' in plan(
+            'SELECT * FROM borrowing_records WHERE user_id = ? ORDER BY borrow_date DESC', (1,))
+        assert 'idx_borrowing_user_book_status' in plan(
+            'SELECT id FROM borrowing_records WHERE user_id = ? AND book_id = ? AND status = ?', (1, book_id, 'borrowed'))
+        assert 'idx_books_category_title' in plan(
+            'SELECT * FROM books WHERE category = ? ORDER BY title, id', ('编程',))
+        print("✓ 旧库升级到最新版本，数据保留，常用查询使用二级索引")
+
+        # 迁移中途出错：该迁移的语句全部回滚，版本号不变
+        version = migrations.LATEST_VERSION + 1
+        migrations.MIGRATIONS.append((version, '测试：中途失败的迁移', [
+            'CREATE INDEX idx_test_partial ON books (author)',
+            'SELECT * FROM no_such_table',
+        ]))
+        error = None
+        try:
+            migrations.apply_migrations(conn)
+        except Exception as e:
+            error = e
+        finally:
+            migrations.MIGRATIONS.pop()
+        assert error is not None and 'no_such_table' in str(error), f'失败的迁移应抛出异常: {error!r}'
+        assert migrations.get_version(conn) == migrations.LATEST_VERSION
+        assert cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_test_partial'").fetchone()[0] == 0
+        conn.close()
+    finally:
+        models.DATABASE = saved_database
+    print("✓ 失败的迁移整体回滚")
+
+def test_benchmark_harness(library_db):
+    """压测：在合成库上统计各接口延迟分位数，与基线比较时识别回退"""
+    print("\n" + "=" * 50)
+    print("压测工具测试...")
+    print("=" * 50)
+
+    import copy
+    import json
+    import benchmark
+    import change_log
+    import models
+
+    assert benchmark.percentile(list(range(1, 101)), 0.95) == 95
+    assert benchmark.percentile([7], 0.5) == 7 and benchmark.percentile([], 0.5) is None
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'bench.db')
+    saved_database = models.DATABASE
+    try:
+        benchmark.seed_database(database, books=200, users=40, years=1, loans_per_book=2, seed=5)
+        change_log.reset()
+        result = benchmark.run_benchmark(database, threads=2, duration=60, max_requests=200, seed=5)
+    finally:
+        models.DATABASE = saved_database
+        change_log.reset()
+
+    assert result['config']['books'] == 200 and result['config']['users'] == 40
+    assert result['overall']['count'] >= 200
+    for name, endpoint in result['endpoints'].items():
+        assert endpoint['errors'] == 0, f'{name}: {endpoint["statuses"]}'
+        assert endpoint['p50_ms'] <= endpoint['p95_ms'] <= endpoint['p99_ms'] <= endpoint['max_ms'], name
+    assert {'search', 'list', 'detail', 'suggest'} <= set(result['endpoints'])
+
+    # 基线中 search 快一个数量级：只有 search 被判为回退；相同结果不算回退
+    baseline = copy.deepcopy(result)
+    baseline['endpoints']['search']['p95_ms'] = result['endpoints']['search']['p95_ms'] / 10
+    regressions = benchmark.compare(result, baseline, tolerance=0.2, min_delta_ms=0)
+    assert [r['endpoint'] for r in regressions] == ['search'], regressions
+    assert benchmark.compare(result, result, min_delta_ms=0) == []
+    # 超出容忍比例但绝对差值小于 min_delta_ms 的抖动忽略
+    assert benchmark.compare(result, baseline, min_delta_ms=10 ** 6) == []
+
+    baseline_path = os.path.join(directory, 'baseline.json')
+    baseline['endpoints']['search']['p95_ms'] = 0.001
+    with open(baseline_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f)
+    try:
+        status = benchmark.main(['run', '--db', database, '--threads', '1', '--requests', '30',
+                                 '--mix', '{"search": 1}', '--baseline', baseline_path,
+                                 '--min-delta-ms', '0', '--output', os.path.join(directory, 'out.json')])
+    finally:
+        models.DATABASE = saved_database
+        change_log.reset()
+    assert status == 1, '相对基线变慢时退出码应为 1'
+    print("✓ 延迟分位数与基线比较正常")
+
+def test_datagen_consistency(library_db):
+    """合成数据：同一种子结果相同，库存与在借记录、评分聚合、派生统计一致"""
+    print("\n" + "=" * 50)
+    print("合成数据测试...")
+    print("=" * 50)
+
+    import sqlite3
+    import change_log
+    import datagen
+    import models
+    from fts import FTS_TABLE
+
+    directory = tempfile.mkdtemp()
+    databases = [os.path.join(directory, f'gen{i}.db') for i in range(2)]
+    saved_database = models.DATABASE
+    try:
+        counts = [datagen.generate(database, books=300, users=60, loans=1500, years=2, seed=11, verbose=False)
+                  for database in databases]
+        try:
+            datagen.generate(databases[0], books=10, users=5, loans=10, verbose=False)
+            assert False, '非空数据库应拒绝生成'
+        except ValueError:
+            pass
+    finally:
+        models.DATABASE = saved_database
+        change_log.reset()
+
+    def snapshot(conn):
+        # 日期以运行时刻为终点，比较与时间无关的列
+        books = conn.execute('SELECT id, title, author, category, total_quantity, available_quantity FROM books '
+                             'ORDER BY id').fetchall()
+        loans = conn.execute('SELECT user_id, book_id, status, rating FROM borrowing_records ORDER BY id').fetchall()
+        return books, loans
+
+    first, second = (sqlite3.connect(database) for database in databases)
+    assert counts[0] == counts[1] and snapshot(first) == snapshot(second), '同一参数与种子应生成相同数据'
+    second.close()
+
+    conn = first
+    assert conn.execute('SELECT COUNT(*) FROM books').fetchone()[0] == counts[0]['books'] == 300
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE role = 'reader'").fetchone()[0] == 60
+    assert conn.execute('SELECT COUNT(*) FROM borrowing_records').fetchone()[0] == counts[0]['borrowing_records']
+
+    active = "status IN ('borrowed', 'overdue')"
+    mismatched = conn.execute(f'''
+        SELECT b.id FROM books b
+        WHERE b.available_quantity != b.total_quantity
+              - (SELECT COUNT(*) FROM borrowing_records r WHERE r.book_id = b.id AND r.{active})
+           OR b.available_quantity < 0
+           OR b.rating_sum != (SELECT COALESCE(SUM(rating), 0) FROM borrowing_records r WHERE r.book_id = b.id)
+           OR b.rating_count != (SELECT COUNT(rating) FROM borrowing_records r WHERE r.book_id = b.id)
+    ''').fetchall()
+    assert mismatched == [], f'库存或评分聚合与借阅记录不一致: {mismatched[:5]}'
+    assert conn.execute(f'''
+        SELECT COUNT(*) FROM (SELECT 1 FROM borrowing_records WHERE {active}
+                              GROUP BY user_id, book_id HAVING COUNT(*) > 1)
+    ''').fetchone()[0] == 0, '同一读者不应同时在借两本同样的书'
+    assert conn.execute('''
+        SELECT COUNT(*) FROM borrowing_records
+        WHERE due_date <= borrow_date OR (return_date IS NOT NULL AND return_date < borrow_date)
+    ''').fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM borrowing_records WHERE status = 'overdue'").fetchone()[0] \
+        == counts[0]['overdue']
+    assert conn.execute(f'SELECT COUNT(*) FROM borrowing_records WHERE {active}').fetchone()[0] \
+        == counts[0]['active_loans']
+    assert conn.execute('SELECT current FROM borrowing_totals WHERE id = 1').fetchone()[0] \
+        == counts[0]['active_loans'], '借阅统计应按生成的数据重算'
+
+    # 借阅热度服从 Zipf：最热门的 10% 图书占借阅的大头
+    loans_per_book = [row[0] for row in conn.execute(
+        'SELECT COUNT(*) AS n FROM borrowing_records GROUP BY book_id ORDER BY n DESC')]
+    assert sum(loans_per_book[:30]) > 0.3 * sum(loans_per_book), loans_per_book[:30]
+
+    title = conn.execute('SELECT title FROM books WHERE id = 1').fetchone()[0]
+    hits = conn.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?',
+                        ('"{}"'.format(title.replace('"', '""')),)).fetchall()
+    assert (1,) in hits, '全文索引应在写入后重建'
+    conn.close()
+    print("✓ 生成结果可复现，库存、评分与统计数据一致")
+
+def run_test(name, test):
+    """在临时数据库中运行一个测试（pytest 下由 library_db 夹具提供），断言失败记为未通过"""
+    try:
+        with temp_library() as database:
+            test(database)
+    except AssertionError as e:
+        print(f"✗ {e}")
+        return name, False
+    return name, True
+
 def main():
     print("\n")
     print("╔" + "=" * 48 + "╗")
@@ -135,6 +1901,33 @@ def main():
     # 如果前面都通过，测试数据库
     if all(r[1] for r in results):
         results.append(("数据库测试", test_database()))
+        results.append(run_test("并发借还测试", test_concurrent_borrowing))
+        results.append(run_test("预约队列测试", test_hold_queue))
+        results.append(run_test("逾期检测测试", test_overdue_scheduler))
+        results.append(run_test("JSON 响应测试", test_json_responses))
+        results.append(run_test("变更日志同步测试", test_change_log_sync))
+        results.append(run_test("批量导入测试", test_bulk_import))
+        results.append(run_test("库存推送补发测试", test_availability_replay))
+        results.append(run_test("模糊检索测试", test_fuzzy_search))
+        results.append(run_test("响应压缩回退测试", test_compression_fallback))
+        results.append(run_test("批量操作保存点测试", test_batch_savepoints))
+        results.append(run_test("目录缓存测试", test_catalog_cache))
+        results.append(run_test("ETag 条件请求测试", test_etag_conditional))
+        results.append(run_test("借阅统计测试", test_borrow_statistics))
+        results.append(run_test("评分与高分榜测试", test_ratings))
+        results.append(run_test("数据导出测试", test_export_date_bounds))
+        results.append(run_test("拼音检索测试", test_pinyin_search))
+        results.append(run_test("搜索联想测试", test_suggest_ranking))
+        results.append(run_test("分面计数测试", test_facet_counts))
+        results.append(run_test("运行指标测试", test_metrics_output))
+        results.append(run_test("静态资源测试", test_static_assets))
+        results.append(run_test("索引构建期间同步测试", test_sync_during_index_build))
+        results.append(run_test("游标分页测试", test_cursor_pagination))
+        results.append(run_test("全文检索测试", test_full_text_search))
+        results.append(run_test("连接池测试", test_connection_pool))
+        results.append(run_test("结构迁移测试", test_schema_migrations))
+        results.append(run_test("压测工具测试", test_benchmark_harness))
+        results.append(run_test("合成数据测试", test_datagen_consistency))
 
     # 输出总结
     print("\n" + "=" * 50)